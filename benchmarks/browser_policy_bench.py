@@ -0,0 +1,69 @@
+"""
+Compares page weight, browser RSS and wall time of a full login and usage
+fetch with and without the lightweight Chrome flags and the request policy,
+each on its own and together, so the effect of each can be told apart.
+Needs real credentials and Chromium. Run from the repository root:
+
+    python -m benchmarks.browser_policy_bench <config file>
+"""
+import asyncio
+import sys
+import time
+
+from configobj import ConfigObj
+
+from coned_rtu import Config, Pyppeteer, RequestPolicy
+from coned_rtu.metrics import rss_bytes
+from coned_rtu.pyppeteer import launch
+
+
+# (label, lightweight Chrome flags, request policy)
+VARIANTS = [
+    ("baseline", False, False),
+    ("flags only", True, False),
+    ("policy only", False, True),
+    ("flags and policy", True, True),
+]
+
+
+async def scrape(config, lightweight, use_policy):
+    policy = RequestPolicy() if use_policy else None
+    browser = await launch(lightweight=lightweight)
+    coned = Pyppeteer(config, policy=policy)
+
+    start = time.perf_counter()
+    await coned.__ainit__(browser)
+    transferred = 0
+
+    def loaded(event):
+        nonlocal transferred
+        transferred += event.get("encodedDataLength", 0)
+
+    coned.page._client.on("Network.loadingFinished", loaded)
+    await coned.login()
+    readings = await coned.get_usage()
+    elapsed = time.perf_counter() - start
+    rss = rss_bytes(browser.process.pid)
+    await browser.close()
+
+    return {
+        "readings": len(readings),
+        "wall_s": round(elapsed, 2),
+        "transferred_kb": transferred // 1024,
+        "rss_mb": rss // (1024 * 1024),
+        "blocked_requests": policy.blocked if policy else 0,
+    }
+
+
+async def main(path):
+    config = Config.from_config_obj(ConfigObj(path))
+    for label, lightweight, use_policy in VARIANTS:
+        result = await scrape(config, lightweight, use_policy)
+        print(f"{label:<17} {result}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(f"Usage: {sys.argv[0]} <config file>")
+        sys.exit(1)
+    asyncio.run(main(sys.argv[1]))
@@ -0,0 +1,111 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+
+TOKEN = "fake-opower-token"
+COOKIE = "session=fake"
+
+LOGIN_HTML = """<!doctype html>
+<style>.hidden { display: none; }</style>
+<form onsubmit="return false">
+  <input id="form-login-email">
+  <input id="form-login-password" type="password">
+  <button class="submit-button" type="button" onclick="document.querySelector(
+    '.js-login-new-device-form-selector').classList.remove('hidden')">Log in</button>
+</form>
+<div class="js-login-new-device-form-selector hidden">
+  <form class="js-login-new-device-form" method="post" action="/mfa">
+    <input id="form-login-mfa-code" name="code">
+    <button class="button" type="submit">Continue</button>
+  </form>
+</div>
+"""
+
+DASHBOARD_HTML = """<!doctype html>
+<div class="popup">
+  <button class="popup__button-cta" onclick="this.parentNode.remove()">Close</button>
+</div>
+<script>
+  fetch("%(usage_path)s", {headers: {Authorization: "Bearer %(token)s"}});
+</script>
+"""
+
+
+class FakeConEdHandler(BaseHTTPRequestHandler):
+    """
+    Serves just enough of ConEd's login flow, dashboard and Opower usage API
+    for Pyppeteer to log in and fetch usage.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def _send(self, status, body=b"", content_type="text/html", headers=()):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path == "/en/login":
+            self._send(200, LOGIN_HTML.encode())
+        elif path == "/dashboard":
+            body = DASHBOARD_HTML % {
+                "usage_path": self.server.usage_path,
+                "token": TOKEN,
+            }
+            self._send(200, body.encode())
+        elif path == self.server.usage_path:
+            authorized = self.headers.get("Authorization") == f"Bearer {TOKEN}"
+            if not authorized and COOKIE not in self.headers.get("Cookie", ""):
+                self._send(401)
+                return
+            self.server.usage_requests += 1
+            self._send(200, self.server.payload, "application/json")
+        else:
+            self._send(404)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+        if self.path == "/mfa":
+            self._send(
+                303,
+                headers=[
+                    ("Location", "/dashboard"),
+                    ("Set-Cookie", COOKIE + "; Path=/"),
+                ],
+            )
+        else:
+            self._send(404)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeConEd:
+    """
+    FakeConEd runs a local stand-in for ConEd and Opower in a background
+    thread. Point a Coned at it with configure().
+    """
+
+    def __init__(self, payload: bytes, account_id="acct", meter=1):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeConEdHandler)
+        self.server.payload = payload
+        self.server.usage_path = f"/ei/edge/apis/cws-real-time-ami-v1/cws/cned/accounts/{account_id}/meters/{meter}/usage"  # noqa
+        self.server.usage_requests = 0
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def configure(self, coned):
+        coned.login_url = self.url + "/en/login"
+        coned.dashboard_url = self.url + "/dashboard"
+        coned.opower_url = self.url
+        return coned
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from coned_rtu import Reading
+
+TZ = timezone(timedelta(hours=-4))
+START = datetime(2021, 1, 1, tzinfo=TZ)
+INTERVAL = timedelta(minutes=15)
+
+# Each polling window re-requests this many reads from the previous one.
+LOOKBACK = 8
+
+
+def opower_payload(n, null_every=96, start=START):
+    """
+    Build a synthetic Opower usage payload with n reads of 15 minutes each.
+    Every null_every-th read has a null value, like the intervals Opower has
+    not published yet. start must have a fixed UTC offset.
+    """
+    suffix = start.isoformat()[-6:]
+    local = np.datetime64(start.replace(tzinfo=None), "ms") + np.arange(
+        n + 1
+    ) * np.timedelta64(INTERVAL)
+    stamps = [s + suffix for s in np.datetime_as_string(local, unit="ms").tolist()]
+    values = [repr(0.1 + k) for k in range(7)]
+
+    reads = []
+    for i in range(n):
+        value = "null" if null_every and i % null_every == 0 else values[i % 7]
+        reads.append(
+            f'{{"startTime": "{stamps[i]}", "endTime": "{stamps[i + 1]}", '
+            f'"value": {value}}}'
+        )
+    return ('{"unit": "KWH", "reads": [' + ", ".join(reads) + "]}").encode()
+
+
+def polling_batches(readings, window=96, lookback=LOOKBACK, reject_every=500):
+    """
+    Split readings into the batches a poller would fetch: windows of window
+    reads that each repeat the last lookback reads of the previous one. Every
+    reject_every-th read is followed by a revised copy shifted by five
+    minutes, which overlaps it and is rejected.
+    """
+    batches = []
+    step = window - lookback
+    for lo in range(0, len(readings), step):
+        hi = lo + window
+        batch = []
+        for i, r in enumerate(readings[lo:hi], lo):
+            batch.append(r)
+            if reject_every and i % reject_every == reject_every - 1:
+                shift = timedelta(minutes=5)
+                batch.append(
+                    Reading(r.start_time + shift, r.end_time + shift, "wh", r.wh)
+                )
+        batches.append(batch)
+        if hi >= len(readings):
+            break
+    return batches
@@ -0,0 +1,59 @@
+"""
+Times importing the package and its entry points in fresh interpreters,
+and lists the heavy third-party packages each import pulls in. Run from
+the repository root:
+
+    python -m benchmarks.import_bench
+"""
+import json
+import subprocess
+import sys
+
+STATEMENTS = {
+    "package": "import coned_rtu",
+    "store": "from coned_rtu import Reading, BucketList",
+    "parser": "from coned_rtu import parse_series",
+    "disk store": "from coned_rtu import DiskStore, resample",
+    "config": "from coned_rtu import Config",
+    "pyppeteer": "from coned_rtu import Pyppeteer",
+    "selenium": "from coned_rtu import Selenium",
+}
+
+HEAVY = ("selenium", "pyppeteer", "pydantic", "configobj", "dateutil", "requests")
+
+PROBE = """
+import sys, time
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+heavy = [m for m in {heavy!r} if m in sys.modules]
+print(repr((elapsed, heavy, len(sys.modules))))
+"""
+
+
+def measure(statement, repeat=5):
+    """Best of repeat fresh-interpreter imports of statement."""
+    runs = []
+    for _ in range(repeat):
+        out = subprocess.run(
+            [sys.executable, "-c", PROBE.format(statement=statement, heavy=HEAVY)],
+            capture_output=True,
+            text=True,
+        )
+        if out.returncode != 0:
+            return {"error": out.stderr.strip().splitlines()[-1]}
+        runs.append(eval(out.stdout))
+    elapsed, heavy, modules = min(runs)
+    return {"seconds": elapsed, "heavy": heavy, "modules": modules}
+
+
+def main():
+    results = {}
+    for name, statement in STATEMENTS.items():
+        results[name] = measure(statement)
+        print(f"{name:<12} {json.dumps(results[name])}", file=sys.stderr)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
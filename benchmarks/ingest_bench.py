@@ -0,0 +1,76 @@
+"""
+Times a process-pool backfill of Opower payload files against the same
+files parsed and inserted one by one, for a range of worker counts. Run
+from the repository root:
+
+    python -m benchmarks.ingest_bench --files 16 --reads 100000
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+from coned_rtu import BucketList, backfill_files, parse_series
+
+from .fixtures import INTERVAL, START, opower_payload
+
+
+def write_files(root, files, reads):
+    """Write files consecutive payloads of reads each, overlapping by a day."""
+    paths = []
+    for i in range(files):
+        start = START + i * (reads - 96) * INTERVAL
+        path = os.path.join(root, f"usage-{i}.json")
+        with open(path, "wb") as f:
+            f.write(opower_payload(reads, start=start))
+        paths.append(path)
+    return paths
+
+
+def serial(paths):
+    store = BucketList()
+    for path in paths:
+        with open(path, "rb") as f:
+            store.insert_many(parse_series(f).to_readings())
+    return store
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--files", type=int, default=16)
+    parser.add_argument("--reads", type=int, default=100_000)
+    parser.add_argument("--workers", type=int, nargs="+")
+    args = parser.parse_args(argv)
+
+    cores = os.cpu_count() or 1
+    workers = args.workers or sorted(
+        {1, 2, 4, 8, cores} - {w for w in (8,) if w > cores}
+    )
+    results = []
+    with tempfile.TemporaryDirectory() as root:
+        paths = write_files(root, args.files, args.reads)
+
+        start = time.perf_counter()
+        expected = len(serial(paths))
+        results.append({"name": "serial", "seconds": time.perf_counter() - start})
+
+        for n in workers:
+            store = BucketList()
+            start = time.perf_counter()
+            backfill_files(store, paths, workers=n)
+            elapsed = time.perf_counter() - start
+            assert len(store) == expected
+            results.append({"name": "pool", "workers": n, "seconds": elapsed})
+
+    for r in results:
+        r["reads_per_second"] = expected / r["seconds"]
+        print(json.dumps(r), file=sys.stderr)
+    print(
+        json.dumps({"cores": cores, "readings": expected, "results": results}, indent=2)
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""
+Compares json_to_readings against the streaming parser on synthetic Opower
+payloads. Run from the repository root:
+
+    python -m benchmarks.parse_bench
+"""
+import io
+import sys
+import time
+
+from coned_rtu import json_to_readings
+from coned_rtu.parser import iter_readings, parse_series
+
+from .fixtures import opower_payload
+
+
+def timed(f, *args):
+    start = time.perf_counter()
+    f(*args)
+    return time.perf_counter() - start
+
+
+def main(sizes):
+    for n in sizes:
+        payload = opower_payload(n)
+        results = {
+            "json_to_readings": timed(json_to_readings, payload),
+            "iter_readings": timed(
+                lambda p: list(iter_readings(io.BytesIO(p))), payload
+            ),
+            "parse_series": timed(lambda p: parse_series(io.BytesIO(p)), payload),
+        }
+        baseline = results["json_to_readings"]
+        for name, elapsed in results.items():
+            print(
+                f"{n:>9} reads  {name:<18} {elapsed:8.3f}s  {baseline / elapsed:5.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main([int(n) for n in sys.argv[1:]] or [100_000, 1_000_000])
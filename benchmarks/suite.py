@@ -0,0 +1,277 @@
+"""
+Times parsing, store operations, aggregation and an end-to-end Pyppeteer
+scrape against a local fake ConEd site, and writes the results as JSON.
+A benchmark regresses when it is slower per read than its threshold, or
+more than --tolerance times slower than the same benchmark in --baseline.
+Exits non-zero on any regression. Run from the repository root:
+
+    python -m benchmarks.suite --output results.json
+    python -m benchmarks.suite --sizes 1000 100000 --baseline results.json
+
+The 10M size needs several GB of memory and takes a while.
+"""
+import argparse
+import asyncio
+from datetime import timedelta
+import json
+import platform
+import sys
+import time
+
+from coned_rtu import (
+    BucketList,
+    Config,
+    OverlappingReadingError,
+    Pyppeteer,
+    json_to_readings,
+    resample,
+)
+from coned_rtu.parser import parse_series
+
+from .fake_coned import FakeConEd
+from .fixtures import opower_payload, polling_batches
+
+SIZES = (1_000, 100_000, 10_000_000)
+
+# Ceilings in microseconds per read. They are loose enough for slow CI
+# machines and catch accidental quadratic behavior.
+THRESHOLDS = {
+    "parse.json_to_readings": 60.0,
+    "parse.parse_series": 15.0,
+    "store.insert": 40.0,
+    "store.insert_many": 30.0,
+    "store.to_list": 2.0,
+    "store.range_last_day": 1.0,
+    "aggregate.resample_day": 20.0,
+}
+
+# Differences from the baseline smaller than this are noise, however large
+# the ratio.
+MIN_SLOWDOWN = 0.005
+
+# Reads served by the fake site for the end-to-end scrape: a week.
+SCRAPE_READS = 96 * 7
+
+
+def bench_parse_json(payload):
+    start = time.perf_counter()
+    json_to_readings(payload)
+    return time.perf_counter() - start, {}
+
+
+def bench_parse_series(payload):
+    start = time.perf_counter()
+    parse_series(payload)
+    return time.perf_counter() - start, {}
+
+
+def _ratios(batches, deduplicated, rejected):
+    fetched = sum(len(b) for b in batches)
+    return {
+        "fetched": fetched,
+        "dedup_ratio": deduplicated / fetched,
+        "reject_ratio": rejected / fetched,
+    }
+
+
+def bench_insert(batches):
+    store = BucketList()
+    deduplicated = rejected = 0
+    start = time.perf_counter()
+    for batch in batches:
+        for r in batch:
+            before = len(store)
+            try:
+                store.insert(r)
+            except OverlappingReadingError:
+                rejected += 1
+                continue
+            if len(store) == before:
+                deduplicated += 1
+    elapsed = time.perf_counter() - start
+    return elapsed, _ratios(batches, deduplicated, rejected)
+
+
+def bench_insert_many(batches):
+    store = BucketList()
+    deduplicated = rejected = 0
+    start = time.perf_counter()
+    for batch in batches:
+        result = store.insert_many(batch)
+        deduplicated += result.deduplicated
+        rejected += result.rejected
+    elapsed = time.perf_counter() - start
+    return elapsed, _ratios(batches, deduplicated, rejected)
+
+
+def bench_to_list(store):
+    start = time.perf_counter()
+    store.to_list()
+    return time.perf_counter() - start, {}
+
+
+def bench_range_last_day(store):
+    latest = store.latest()
+    start = time.perf_counter()
+    count = sum(
+        1 for _ in store.range(latest.end_time - timedelta(days=1), latest.end_time)
+    )
+    return time.perf_counter() - start, {"yielded": count}
+
+
+def bench_resample(store):
+    start = time.perf_counter()
+    resample(store, "day")
+    return time.perf_counter() - start, {}
+
+
+def run_sizes(sizes, repeat):
+    results = []
+
+    def record(name, n, bench, *args):
+        # best of repeat runs, each on fresh state
+        runs = [bench(*args) for _ in range(repeat if n <= 100_000 else 1)]
+        elapsed, extra = min(runs, key=lambda run: run[0])
+        results.append(
+            {
+                "name": name,
+                "size": n,
+                "seconds": elapsed,
+                "us_per_read": elapsed / n * 1e6,
+                **extra,
+            }
+        )
+        print(f"{n:>10} reads  {name:<26} {elapsed:9.4f}s", file=sys.stderr)
+
+    for n in sizes:
+        payload = opower_payload(n)
+        record("parse.json_to_readings", n, bench_parse_json, payload)
+        record("parse.parse_series", n, bench_parse_series, payload)
+
+        readings = json_to_readings(payload)
+        del payload
+        batches = polling_batches(readings)
+        del readings
+        record("store.insert", n, bench_insert, batches)
+        record("store.insert_many", n, bench_insert_many, batches)
+
+        store = BucketList()
+        for batch in batches:
+            store.insert_many(batch)
+        del batches
+        record("store.to_list", n, bench_to_list, store)
+        record("store.range_last_day", n, bench_range_last_day, store)
+        record("aggregate.resample_day", n, bench_resample, store)
+    return results
+
+
+async def scrape():
+    """Log in to the fake site and fetch a week of usage with Pyppeteer."""
+    from coned_rtu.pyppeteer import launch
+
+    config = Config(
+        CONED_USER="user",
+        CONED_PASS="pass",
+        CONED_TOTP="JBSWY3DPEHPK3PXP",
+        OPOWER_ACCOUNT_ID="acct",
+        OPOWER_METER=1,
+        CONED_MAID="maid",
+    )
+    site = FakeConEd(opower_payload(SCRAPE_READS))
+    browser = None
+    try:
+        browser = await launch()
+        coned = site.configure(Pyppeteer(config))
+        start = time.perf_counter()
+        await coned.__ainit__(browser)
+        await coned.login()
+        readings = await coned.get_usage()
+        elapsed = time.perf_counter() - start
+    finally:
+        if browser is not None:
+            await browser.close()
+        site.close()
+
+    return {
+        "name": "scrape.pyppeteer",
+        "size": SCRAPE_READS,
+        "seconds": elapsed,
+        "readings": len(readings),
+        "steps": coned.timer.as_dict(),
+    }
+
+
+def check(results, baseline, tolerance):
+    """Return a description of every regression in results."""
+    previous = {}
+    for r in (baseline or {}).get("results", []):
+        previous[(r["name"], r["size"])] = r
+
+    regressions = []
+    for r in results:
+        if "seconds" not in r:
+            continue
+        limit = THRESHOLDS.get(r["name"])
+        if limit is not None and r["us_per_read"] > limit:
+            regressions.append(
+                f"{r['name']} at {r['size']}: {r['us_per_read']:.2f}us/read > {limit}"
+            )
+        old = previous.get((r["name"], r["size"]))
+        if (
+            old is not None
+            and r["seconds"] > old["seconds"] * tolerance
+            and r["seconds"] - old["seconds"] > MIN_SLOWDOWN
+        ):
+            regressions.append(
+                f"{r['name']} at {r['size']}: {r['seconds']:.4f}s vs {old['seconds']:.4f}s"
+            )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--baseline", help="results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=1.25)
+    parser.add_argument("--no-scrape", action="store_true")
+    args = parser.parse_args(argv)
+
+    results = run_sizes(args.sizes, args.repeat)
+    if not args.no_scrape:
+        try:
+            results.append(asyncio.run(scrape()))
+        except Exception as e:
+            # no Chromium on this machine, most likely
+            results.append(
+                {"name": "scrape.pyppeteer", "size": SCRAPE_READS, "skipped": repr(e)}
+            )
+        print(json.dumps(results[-1]), file=sys.stderr)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    regressions = check(results, baseline, args.tolerance)
+
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results,
+        "regressions": regressions,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    for regression in regressions:
+        print(f"REGRESSION {regression}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,64 @@
 # flake8: noqa
-from .coned import Coned, Config, json_to_readings
-from .reading import Reading
-from .store import BucketList, OverlappingReadingError
-from .selenium import LoginFailedException, Selenium
-from .pyppeteer import Pyppeteer
+import importlib
+
+# Public names and the modules that define them. Modules are imported on
+# first use, so the data path (Reading, the stores, the parser) can be used
+# without loading pydantic or either browser automation stack.
+_EXPORTS = {
+    "Aggregate": ".aggregate",
+    "TouSchedule": ".aggregate",
+    "resample": ".aggregate",
+    "CodecError": ".codec",
+    "decode": ".codec",
+    "encode": ".codec",
+    "Coned": ".coned",
+    "Config": ".coned",
+    "fetch_window": ".coned",
+    "json_to_readings": ".coned",
+    "Daemon": ".daemon",
+    "DiskStore": ".diskstore",
+    "backfill_files": ".ingest",
+    "METRICS": ".metrics",
+    "Metrics": ".metrics",
+    "instrumented": ".metrics",
+    "UsageParseError": ".parser",
+    "iter_readings": ".parser",
+    "parse_series": ".parser",
+    "RequestPolicy": ".policy",
+    "Reading": ".reading",
+    "RollupCache": ".rollup",
+    "ReadingSeries": ".series",
+    "ReadingView": ".series",
+    "BrowserPool": ".scheduler",
+    "Scheduler": ".scheduler",
+    "meter_key": ".scheduler",
+    "SessionCache": ".session",
+    "CsvSink": ".sinks",
+    "LineProtocolSink": ".sinks",
+    "ParquetSink": ".sinks",
+    "Watermark": ".sinks",
+    "export": ".sinks",
+    "BucketList": ".store",
+    "InsertResult": ".store",
+    "OverlappingReadingError": ".store",
+    "Revision": ".store",
+    "Direct": ".direct",
+    "LoginFailedException": ".selenium",
+    "Selenium": ".selenium",
+    "Pyppeteer": ".pyppeteer",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,278 @@
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+import math
+from typing import Optional
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+PEAK = "peak"
+OFF_PEAK = "off_peak"
+
+_EPOCH = datetime(1970, 1, 1)
+_EPOCH_ORDINAL = _EPOCH.toordinal()
+
+
+@dataclass
+class Aggregate:
+    """
+    Aggregate summarizes the readings that start in [start, end): total and
+    mean energy per reading in Wh, and peak demand as the highest average
+    power of any one reading, in W. band is set when aggregating by
+    time-of-use.
+    """
+
+    start: datetime
+    end: datetime
+    total: float
+    mean: float
+    peak: float
+    count: int
+    band: Optional[str] = None
+
+
+class TouSchedule:
+    """
+    TouSchedule assigns local times to peak or off-peak bands. The default
+    is ConEd's residential time-of-use schedule: peak from 8 AM to midnight
+    on weekdays, except holidays, and off-peak otherwise.
+    """
+
+    def __init__(self, peak_start=8, peak_end=24, weekdays_only=True, holidays=()):
+        self.peak_start = peak_start
+        self.peak_end = peak_end
+        self.weekdays_only = weekdays_only
+        self.holidays = frozenset(holidays)
+
+    def is_peak(self, local: datetime) -> bool:
+        if self.weekdays_only and local.weekday() >= 5:
+            return False
+        if local.date() in self.holidays:
+            return False
+        return self.peak_start <= local.hour < self.peak_end
+
+    def peak_mask(self, local_seconds):
+        """Vectorized is_peak over local times given as seconds since 1970."""
+        days = local_seconds // 86400
+        hours = local_seconds % 86400 // 3600
+        mask = (hours >= self.peak_start) & (hours < self.peak_end)
+        if self.weekdays_only:
+            # 1970-01-01 was a Thursday
+            mask &= (days + 3) % 7 < 5
+        if self.holidays:
+            holidays = [d.toordinal() - _EPOCH_ORDINAL for d in self.holidays]
+            mask &= ~np.isin(days, holidays)
+        return mask
+
+
+def _window(freq):
+    """Return the fixed window length in seconds, or None for calendar months."""
+    if isinstance(freq, timedelta):
+        return int(freq.total_seconds())
+    if isinstance(freq, int):
+        return freq
+    if freq == "hour":
+        return 3600
+    if freq == "day":
+        return 86400
+    if freq == "month":
+        return None
+    raise ValueError(f"Unknown frequency: {freq}")
+
+
+def _period_bounds(window, key):
+    """Return the naive local start and end of a period key."""
+    if window is None:
+        year, month = divmod(key, 12)
+        start = datetime(1970 + year, month + 1, 1)
+        year, month = divmod(key + 1, 12)
+        return start, datetime(1970 + year, month + 1, 1)
+    start = _EPOCH + timedelta(seconds=key * window)
+    return start, start + timedelta(seconds=window)
+
+
+def _local_seconds(dt: datetime) -> int:
+    return (dt.replace(tzinfo=None) - _EPOCH) // timedelta(seconds=1)
+
+
+def _month_key(local_seconds: int) -> int:
+    d = date.fromordinal(local_seconds // 86400 + _EPOCH_ORDINAL)
+    return (d.year - 1970) * 12 + d.month - 1
+
+
+def resample(
+    readings,
+    freq="hour",
+    tz=None,
+    tou: Optional[TouSchedule] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+):
+    """
+    Aggregate readings into periods of freq: "hour", "day", "month", or a
+    fixed window given as a timedelta or seconds. Periods follow the local
+    time of tz, or the UTC offset each reading was reported in when tz is
+    None, so days and months line up with the meter's calendar. With a
+    TouSchedule, each period is further split into peak and off-peak bands.
+
+    readings may be a ReadingSeries, a store, or any iterable of Readings.
+    A reading counts toward the period its start falls in, and only readings
+    that start in [start, end) are aggregated when either bound is given.
+    Stores are read through range(), so a DiskStore is aggregated straight
+    from its records. Aggregation is vectorized with NumPy, falling back to
+    pure Python when it isn't installed.
+    """
+    window = _window(freq)
+    readings = _select(readings, start, end)
+    if np is None:
+        return _resample_python(readings, window, tz, tou)
+
+    from .series import ReadingSeries
+
+    if not isinstance(readings, ReadingSeries):
+        readings = ReadingSeries.from_readings(readings)
+    return _resample_series(readings, window, tz, tou)
+
+
+def _select(readings, start, end):
+    """Return the readings that start in [start, end); None is unbounded."""
+    if hasattr(readings, "range"):
+        if start is None:
+            start = _EPOCH.replace(tzinfo=timezone.utc)
+        if end is None:
+            latest = readings.latest()
+            if latest is None:
+                return []
+            end = latest.end_time
+        return readings.range(start, end)
+    if start is None and end is None:
+        return readings
+
+    lo = -math.inf if start is None else start.timestamp()
+    hi = math.inf if end is None else end.timestamp()
+    if np is not None:
+        from .series import ReadingSeries
+
+        if isinstance(readings, ReadingSeries):
+            mask = (readings.start >= lo) & (readings.start < hi)
+            return ReadingSeries._wrap(
+                readings.start[mask],
+                readings.end[mask],
+                readings.wh[mask],
+                readings.offset[mask],
+            )
+    return [r for r in readings if lo <= r.start < hi]
+
+
+def _resample_python(readings, window, tz, tou):
+    groups = {}
+    for r in readings:
+        start = r.start_time if tz is None else r.start_time.astimezone(tz)
+        local = _local_seconds(start)
+        key = _month_key(local) if window is None else local // window
+        band = None
+        if tou is not None:
+            band = PEAK if tou.is_peak(start) else OFF_PEAK
+        seconds = (r.end_time - r.start_time).total_seconds()
+        demand = r.wh * 3600 / seconds
+
+        group = groups.get((key, band))
+        if group is None:
+            groups[(key, band)] = [start.tzinfo, r.wh, demand, 1]
+        else:
+            group[1] += r.wh
+            group[2] = max(group[2], demand)
+            group[3] += 1
+
+    out = []
+    for (key, band), (tzinfo, total, peak, count) in sorted(
+        groups.items(), key=lambda item: (item[0][0], item[0][1] or "")
+    ):
+        start, end = _period_bounds(window, key)
+        out.append(
+            Aggregate(
+                start.replace(tzinfo=tzinfo),
+                end.replace(tzinfo=tzinfo),
+                total,
+                total / count,
+                peak,
+                count,
+                band,
+            )
+        )
+    return out
+
+
+def _utc_offsets(starts, tz):
+    """UTC offsets of tz at each start, computed once per distinct hour."""
+    hours, inverse = np.unique(starts // 3600, return_inverse=True)
+    offsets = np.array(
+        [
+            datetime.fromtimestamp(int(h) * 3600, tz).utcoffset().total_seconds()
+            for h in hours
+        ],
+        dtype=np.int64,
+    )
+    return offsets[inverse]
+
+
+def _resample_series(series, window, tz, tou):
+    from .series import _tz
+
+    if len(series) == 0:
+        return []
+
+    if tz is None:
+        offsets = series.offset.astype(np.int64)
+    else:
+        offsets = _utc_offsets(series.start, tz)
+    local = series.start + offsets
+
+    if window is None:
+        keys = local.astype("datetime64[s]").astype("datetime64[M]").astype(np.int64)
+    else:
+        keys = local // window
+
+    if tou is not None:
+        # off-peak sorts before peak within a period
+        keys = keys * 2 + tou.peak_mask(local)
+
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+    wh = series.wh[order]
+    demand = wh * 3600 / (series.end - series.start)[order]
+    first = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+
+    totals = np.add.reduceat(wh, first)
+    peaks = np.maximum.reduceat(demand, first)
+    counts = np.diff(np.r_[first, len(keys)])
+    group_offsets = offsets[order][first]
+
+    out = []
+    for key, total, peak, count, offset in zip(
+        keys[first].tolist(),
+        totals.tolist(),
+        peaks.tolist(),
+        counts.tolist(),
+        group_offsets.tolist(),
+    ):
+        band = None
+        if tou is not None:
+            key, is_peak = divmod(key, 2)
+            band = PEAK if is_peak else OFF_PEAK
+        tzinfo = tz if tz is not None else _tz(offset)
+        start, end = _period_bounds(window, key)
+        out.append(
+            Aggregate(
+                start.replace(tzinfo=tzinfo),
+                end.replace(tzinfo=tzinfo),
+                total,
+                total / count,
+                peak,
+                count,
+                band,
+            )
+        )
+    return out
@@ -0,0 +1,191 @@
+import struct
+
+import numpy as np
+
+from .series import ReadingSeries
+
+MAGIC = b"RTU"
+VERSION = 1
+# Values are quantized to at most this many decimal places.
+MAX_SCALE = 12
+# Scale marking a raw float64 Wh column.
+RAW = 0xFF
+# Units Wh values can be quantized in. Opower reports kWh, which don't
+# survive the conversion to Wh as short decimals.
+WH = 0
+KWH = 1
+
+# magic, version, unit, scale, count, base start, interval, and the byte
+# lengths of the gap, duration, offset and Wh columns
+_HEADER = struct.Struct("<3sBBBIqIIIII")
+
+
+class CodecError(ValueError):
+    pass
+
+
+def _zigzag(values):
+    values = values.astype(np.int64)
+    return ((values << 1) ^ (values >> 63)).view(np.uint64)
+
+
+def _unzigzag(values):
+    return (values >> np.uint64(1)).astype(np.int64) ^ -(values & np.uint64(1)).astype(
+        np.int64
+    )
+
+
+def encode_varints(values) -> bytes:
+    """Encode unsigned 64-bit integers as LEB128 varints."""
+    values = np.asarray(values, dtype=np.uint64)
+    # number of 7-bit groups each value needs
+    sizes = np.ones(len(values), dtype=np.int64)
+    for k in range(1, 10):
+        sizes += values >= np.uint64(1 << (7 * k))
+
+    ends = np.cumsum(sizes)
+    starts = ends - sizes
+    out = np.empty(int(ends[-1]) if len(values) else 0, dtype=np.uint8)
+    for k in range(int(sizes.max()) if len(values) else 0):
+        has = sizes > k
+        group = (values[has] >> np.uint64(7 * k)) & np.uint64(0x7F)
+        more = np.where(sizes[has] > k + 1, 0x80, 0).astype(np.uint64)
+        out[starts[has] + k] = (group | more).astype(np.uint8)
+    return out.tobytes()
+
+
+def decode_varints(buf, count: int):
+    """Decode count LEB128 varints from a buffer into a uint64 array."""
+    data = np.frombuffer(buf, dtype=np.uint8)
+    ends = np.flatnonzero(data < 0x80)
+    if len(ends) != count or (count and ends[-1] != len(data) - 1):
+        raise CodecError("Malformed varint column.")
+    if count == 0:
+        return np.empty(0, dtype=np.uint64)
+
+    starts = np.empty(count, dtype=np.int64)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    shifts = np.arange(len(data), dtype=np.uint64) - np.repeat(
+        starts, ends - starts + 1
+    ).astype(np.uint64)
+    groups = (data & 0x7F).astype(np.uint64) << (shifts * np.uint64(7))
+    return np.bitwise_or.reduceat(groups, starts)
+
+
+def _deltas(values):
+    """Return the first value followed by each value's change from the last."""
+    out = values.copy()
+    out[1:] -= values[:-1]
+    return out
+
+
+def _dequantize(q, unit: int, scale: int):
+    values = q / 10.0**scale
+    return values * 1000 if unit == KWH else values
+
+
+def _quantize(wh):
+    """Return (unit, scale, integers) representing wh exactly, or RAW."""
+    for unit, values in ((WH, wh), (KWH, wh / 1000)):
+        for scale in range(MAX_SCALE + 1):
+            q = np.round(values * 10.0**scale)
+            if not np.all(np.abs(q) < 2**53):
+                break
+            if np.array_equal(_dequantize(q, unit, scale), wh):
+                return unit, scale, q.astype(np.int64)
+    return WH, RAW, None
+
+
+def encode(readings) -> bytes:
+    """
+    Encode a ReadingSeries, or an iterable of Readings, sorted by start time.
+
+    Readings are regular, so each start time is stored as the gap after the
+    previous reading's end (almost always 0), each duration as its
+    difference from the batch's usual interval, and each UTC offset as its
+    change from the previous one. Wh values are quantized to the fewest
+    decimal places that represent all of them exactly and stored as deltas,
+    or stored as raw float64 if there are none. Every column except raw Wh
+    is zigzag varint encoded. Times are whole seconds, as Opower reports
+    them, so each reading decodes to an equal one.
+    """
+    if not isinstance(readings, ReadingSeries):
+        readings = ReadingSeries.from_readings(list(readings))
+    n = len(readings)
+    start, end = readings.start, readings.end
+    offset = readings.offset.astype(np.int64)
+
+    durations = end - start
+    if n:
+        lengths, counts = np.unique(durations, return_counts=True)
+        interval = int(lengths[np.argmax(counts)])
+    else:
+        interval = 0
+
+    gaps = np.empty(n, dtype=np.int64)
+    if n:
+        gaps[0] = 0
+        gaps[1:] = start[1:] - end[:-1]
+
+    columns = [
+        encode_varints(_zigzag(gaps)),
+        encode_varints(_zigzag(durations - interval)),
+        encode_varints(_zigzag(_deltas(offset))),
+    ]
+    unit, scale, q = _quantize(readings.wh)
+    if scale == RAW:
+        columns.append(readings.wh.astype("<f8").tobytes())
+    else:
+        columns.append(encode_varints(_zigzag(_deltas(q))))
+
+    header = _HEADER.pack(
+        MAGIC,
+        VERSION,
+        unit,
+        scale,
+        n,
+        int(start[0]) if n else 0,
+        interval,
+        *(len(c) for c in columns),
+    )
+    return header + b"".join(columns)
+
+
+def decode(buf) -> ReadingSeries:
+    """
+    Decode bytes produced by encode into a ReadingSeries. Decoding is
+    vectorized, and a raw Wh column is a view of buf rather than a copy.
+    """
+    view = memoryview(buf)
+    if len(view) < _HEADER.size:
+        raise CodecError("Truncated header.")
+    header = _HEADER.unpack_from(view)
+    magic, version, unit, scale, n, base, interval = header[:7]
+    sizes = header[7:]
+    if magic != MAGIC or version != VERSION:
+        raise CodecError("Not an encoded reading batch.")
+    if len(view) != _HEADER.size + sum(sizes):
+        raise CodecError("Truncated batch.")
+
+    columns = []
+    pos = _HEADER.size
+    for size in sizes:
+        stop = pos + size
+        columns.append(view[pos:stop])
+        pos = stop
+
+    gaps = _unzigzag(decode_varints(columns[0], n))
+    durations = _unzigzag(decode_varints(columns[1], n)) + interval
+    offset = np.cumsum(_unzigzag(decode_varints(columns[2], n))).astype(np.int32)
+    if scale == RAW:
+        wh = np.frombuffer(columns[3], dtype="<f8", count=n)
+    else:
+        q = np.cumsum(_unzigzag(decode_varints(columns[3], n)))
+        wh = _dequantize(q, unit, scale)
+
+    # each start is the previous end plus the gap
+    steps = gaps.copy()
+    steps[1:] += durations[:-1]
+    start = base + np.cumsum(steps)
+    return ReadingSeries._wrap(start, start + durations, wh, offset)
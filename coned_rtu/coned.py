@@ -1,17 +1,33 @@
 from __future__ import annotations
 from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
 from dateutil.parser import isoparse
+import functools
 import json
+import logging
+from typing import Optional
+from urllib.parse import urlencode
 
 from configobj import ConfigObj
 from pydantic import BaseModel, Field
 
+from .metrics import METRICS, instrumented
 from .reading import Reading
+from .store import InsertResult
+from .timing import StepTimer
 
 CONED_LOGIN_URL = "https://www.coned.com/en/login"
+OPOWER_URL = "https://cned.opower.com"
 CONED_USAGE_URL = "https://www.coned.com/en/accounts-billing/dashboard?tab1=billingandusage-1&tab2=sectionEnergyBillingUsage-1&tab3=sectionRealTimeData-3"
 
+# How far before the newest stored reading to re-request, so that intervals
+# Opower published late or revised are picked up again.
+DEFAULT_LOOKBACK = timedelta(hours=2)
+# Backfill fetches gaps closer together than this with a single request.
+BACKFILL_JOIN = timedelta(hours=6)
 
+
+@instrumented("json_to_readings")
 def json_to_readings(usage_json):
     readings = []
     usage = json.loads(usage_json)
@@ -31,6 +47,38 @@ def json_to_readings(usage_json):
     return readings
 
 
+def fetch_window(store, now: Optional[datetime] = None, lookback=DEFAULT_LOOKBACK):
+    """
+    Return the (since, until) window to request so that only intervals newer
+    than the store's newest reading, plus a short lookback, are fetched. since
+    is None when the store is empty, meaning Opower's default window.
+    """
+    until = now or datetime.now(timezone.utc)
+    latest = store.latest()
+    if latest is None:
+        return None, until
+    return min(latest.end_time - lookback, until), until
+
+
+def _screenshot_failure(f):
+    """Saves a screenshot if an error occurs. Only decorate Coned
+    coroutines, because we assume presence of self."""
+
+    @functools.wraps(f)
+    async def wrapper(self, *args, **kwargs):
+        try:
+            return await f(self, *args, **kwargs)
+        except Exception:
+            time = datetime.now().isoformat()
+            try:
+                await self.save_screenshot(f"screenshots/error-{time}.png")
+            except Exception:
+                logging.exception("Could not save failure screenshot.")
+            raise
+
+    return wrapper
+
+
 class Config(BaseModel):
     user: str = Field(alias="CONED_USER")
     password: str = Field(alias="CONED_PASS")
@@ -38,11 +86,24 @@ class Config(BaseModel):
     account_id: str = Field(alias="OPOWER_ACCOUNT_ID")
     meter: int = Field(alias="OPOWER_METER")
     maid: str = Field(alias="CONED_MAID")
+    session_file: Optional[str] = Field(None, alias="CONED_SESSION_FILE")
+    session_key: Optional[str] = Field(None, alias="CONED_SESSION_KEY")
 
     @classmethod
     def from_config_obj(cls, obj: ConfigObj) -> Config:
         return cls(**obj)
 
+    @classmethod
+    def all_from_config_obj(cls, obj: ConfigObj) -> list[Config]:
+        """
+        Return one Config per section of obj, with top-level values as
+        defaults for every section. Without sections, obj is a single Config.
+        """
+        if not obj.sections:
+            return [cls.from_config_obj(obj)]
+        defaults = {k: obj[k] for k in obj.scalars}
+        return [cls(**{**defaults, **obj[name]}) for name in obj.sections]
+
 
 class Coned(ABC):
     """
@@ -50,19 +111,51 @@ class Coned(ABC):
     the underlying opower API to fetch real-time usage data.
     """
 
+    # ConEd's login and usage dashboard pages and the base URL of the Opower
+    # API, overridable for testing.
+    login_url = CONED_LOGIN_URL
+    dashboard_url = CONED_USAGE_URL
+    opower_url = OPOWER_URL
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # time each backend's implementations of the scraping steps
+        for name in ("login", "get_usage", "save_screenshot"):
+            if name in cls.__dict__:
+                f = instrumented(f"coned.{name}", backend=cls.__name__)
+                setattr(cls, name, f(cls.__dict__[name]))
+
     @property
     def opower_usage_url(self):
-        return f"https://cned.opower.com/ei/edge/apis/cws-real-time-ami-v1/cws/cned/accounts/{self.cfg.account_id}/meters/{self.cfg.meter}/usage"  # noqa
+        return f"{self.opower_url}/ei/edge/apis/cws-real-time-ami-v1/cws/cned/accounts/{self.cfg.account_id}/meters/{self.cfg.meter}/usage"  # noqa
+
+    def usage_url(
+        self, since: Optional[datetime] = None, until: Optional[datetime] = None
+    ) -> str:
+        """
+        Return the Opower usage URL, limited to [since, until) when given.
+        Without bounds Opower returns its default window.
+        """
+        params = {}
+        if since is not None:
+            params["startDate"] = since.isoformat()
+        if until is not None:
+            params["endDate"] = until.isoformat()
+        if not params:
+            return self.opower_usage_url
+        return f"{self.opower_usage_url}?{urlencode(params)}"
 
     @abstractmethod
     def __init__(self, config: Config):
         self.cfg = config
+        # per-step wall-clock timings of the scrapes run so far
+        self.timer = StepTimer()
 
     @abstractmethod
     async def save_screenshot(self, filename: str):
         """
-        Saves a 1080p screenshot of the page with the given filename in
-        the screenshots folder. Doesn't reset the window size.
+        Saves a 1080p screenshot of the page to the given path, which is
+        usually in the screenshots folder. Doesn't reset the window size.
         """
         pass
 
@@ -71,5 +164,49 @@ class Coned(ABC):
         pass
 
     @abstractmethod
-    async def get_usage(self) -> list[Reading]:
+    async def get_usage(
+        self, since: Optional[datetime] = None, until: Optional[datetime] = None
+    ) -> list[Reading]:
         pass
+
+    async def sync(self, store, now: Optional[datetime] = None, upsert: bool = False):
+        """
+        Fetch only the window the store is missing and merge it in. Returns
+        the store's InsertResult. With upsert, values Opower has corrected
+        since they were stored replace the stored ones.
+        """
+        since, until = fetch_window(store, now)
+        readings = await self.get_usage(since, until)
+        with self.timer.step("store.insert"):
+            result = store.insert_many(readings, upsert=upsert)
+        if METRICS.enabled:
+            METRICS.inc("readings_fetched_total", len(readings))
+            METRICS.record_insert(result)
+        return result
+
+    async def backfill(
+        self, store, start: datetime, end: datetime, join=BACKFILL_JOIN
+    ) -> InsertResult:
+        """
+        Fetch only the gaps in the store's coverage of [start, end) and merge
+        them in. Gaps less than join apart are fetched with one request.
+        """
+        windows = []
+        for since, until in store.missing_ranges(start, end):
+            if windows and since - windows[-1][1] < join:
+                windows[-1][1] = until
+            else:
+                windows.append([since, until])
+
+        result = InsertResult()
+        for since, until in windows:
+            readings = await self.get_usage(since, until)
+            with self.timer.step("store.insert"):
+                inserted = store.insert_many(readings)
+            if METRICS.enabled:
+                METRICS.inc("readings_fetched_total", len(readings))
+                METRICS.record_insert(inserted)
+            result.inserted += inserted.inserted
+            result.deduplicated += inserted.deduplicated
+            result.rejected += inserted.rejected
+        return result
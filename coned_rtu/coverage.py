@@ -0,0 +1,86 @@
+import bisect
+from datetime import datetime, timezone
+
+
+def _epoch(dt: datetime) -> int:
+    return int(dt.timestamp())
+
+
+class CoverageIndex:
+    """
+    CoverageIndex tracks which spans of time have readings as a sorted list
+    of disjoint [start, end) ranges in epoch seconds. Ranges that touch are
+    merged, so a store without gaps is a single range however many readings
+    it holds.
+    """
+
+    def __init__(self):
+        # parallel sorted lists of range starts and ends
+        self._starts = []
+        self._ends = []
+
+    def __len__(self):
+        return len(self._starts)
+
+    def ranges(self):
+        return list(zip(self._starts, self._ends))
+
+    def add(self, start: int, end: int):
+        starts, ends = self._starts, self._ends
+        # fast path: readings usually arrive in order
+        if not ends or start > ends[-1]:
+            starts.append(start)
+            ends.append(end)
+            return
+        if start == ends[-1]:
+            ends[-1] = max(ends[-1], end)
+            return
+
+        # ranges that overlap or touch [start, end) are merged into it
+        i = bisect.bisect_left(ends, start)
+        j = bisect.bisect_right(starts, end)
+        if i < j:
+            start = min(start, starts[i])
+            end = max(end, ends[j - 1])
+        starts[i:j] = [start]
+        ends[i:j] = [end]
+
+    def add_reading(self, reading):
+        self.add(reading.start, reading.end)
+
+    def discard_before(self, t: int):
+        """Forget coverage before t."""
+        i = bisect.bisect_right(self._ends, t)
+        del self._starts[:i]
+        del self._ends[:i]
+        if self._starts and self._starts[0] < t:
+            self._starts[0] = t
+
+    def clear(self):
+        self._starts = []
+        self._ends = []
+
+    def missing(self, start: int, end: int) -> list:
+        """Return the uncovered [start, end) ranges within [start, end)."""
+        gaps = []
+        i = bisect.bisect_right(self._ends, start)
+        cursor = start
+        while i < len(self._starts) and self._starts[i] < end:
+            if self._starts[i] > cursor:
+                gaps.append((cursor, self._starts[i]))
+            cursor = max(cursor, self._ends[i])
+            i += 1
+        if cursor < end:
+            gaps.append((cursor, end))
+        return gaps
+
+    def missing_ranges(self, start: datetime, end: datetime) -> list:
+        """
+        Return the (start, end) datetime ranges within [start, end) that no
+        reading covers, in order, in O(log n + gaps).
+        """
+        tz = start.tzinfo or timezone.utc
+        return [
+            (datetime.fromtimestamp(s, tz), datetime.fromtimestamp(e, tz))
+            for s, e in self.missing(_epoch(start), _epoch(end))
+        ]
@@ -0,0 +1,214 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+import logging
+import math
+import signal
+import time
+import zlib
+
+from .coned import Config
+from .metrics import METRICS, sample_browser_rss
+from .scheduler import DEFAULT_POOL_SIZE, _Meters, meter_key
+
+# Meters report in 15 minute intervals, and Opower publishes each interval a
+# few minutes after it ends.
+INTERVAL = 15 * 60
+PUBLICATION_LAG = 5 * 60
+# Polls for different meters are spread over this many seconds.
+MAX_JITTER = 60
+# In-memory stores keep this much history.
+DEFAULT_RETENTION = timedelta(days=35)
+# Open a fresh page and context after this many polls, so a long-lived page
+# can't grow without bound.
+RECYCLE_AFTER = 96
+
+
+def next_poll(now: float, interval=INTERVAL, lag=PUBLICATION_LAG, jitter=0.0):
+    """
+    Return the first time after now, in epoch seconds, that is lag + jitter
+    seconds past an interval boundary.
+    """
+    offset = lag + jitter
+    return (math.floor((now - offset) / interval) + 1) * interval + offset
+
+
+def meter_jitter(key: str, max_jitter=MAX_JITTER) -> float:
+    """A stable per-meter delay in [0, max_jitter) seconds."""
+    if max_jitter <= 0:
+        return 0.0
+    return zlib.crc32(key.encode()) % 1000 / 1000 * max_jitter
+
+
+class Daemon(_Meters):
+    """
+    Daemon keeps one warm browser and a logged-in page per meter, and syncs
+    every meter just after each interval boundary plus Opower's publication
+    lag. A failed poll discards that meter's page so the next poll logs in
+    again, and a dead browser is relaunched. SIGINT and SIGTERM stop the
+    daemon once in-flight polls finish.
+
+    To keep memory bounded over weeks, pages are recycled every
+    recycle_after polls, step timings are reset after each poll, and stores
+    that support prune() keep only retention worth of history, revisions
+    included (None keeps everything).
+    """
+
+    def __init__(
+        self,
+        configs,
+        store_factory=None,
+        coned=None,
+        coned_options=None,
+        launch=None,
+        concurrency: int = DEFAULT_POOL_SIZE,
+        interval: float = INTERVAL,
+        lag: float = PUBLICATION_LAG,
+        max_jitter: float = MAX_JITTER,
+        retention: timedelta = DEFAULT_RETENTION,
+        recycle_after: int = RECYCLE_AFTER,
+        upsert: bool = False,
+    ):
+        super().__init__(configs, store_factory, coned, coned_options, upsert)
+        if launch is None:
+            from .pyppeteer import launch
+        self.concurrency = concurrency
+        self.interval = interval
+        self.lag = lag
+        self.max_jitter = max_jitter
+        self.retention = retention
+        self.recycle_after = recycle_after
+        self._launch = launch
+        self._browser = None
+        # meter key -> [browser context, coned, polls so far]
+        self._sessions = {}
+        self.polls = 0
+        self.failures = 0
+        self.restarts = 0
+        self._stop = None
+
+    def stop(self):
+        logging.info("Stopping after in-flight polls...")
+        if self._stop is not None:
+            self._stop.set()
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._browser_lock = asyncio.Lock()
+
+        signals = []
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self.stop)
+                signals.append(sig)
+            except (NotImplementedError, RuntimeError):
+                pass
+
+        try:
+            await asyncio.gather(*(self._meter_loop(c) for c in self.configs))
+        finally:
+            for sig in signals:
+                loop.remove_signal_handler(sig)
+            for key in list(self._sessions):
+                await self._discard(key)
+            await self._close_browser()
+
+    async def _sleep_until(self, when: float) -> bool:
+        """Sleep until when, returning True early if the daemon is stopping."""
+        try:
+            await asyncio.wait_for(self._stop.wait(), max(when - time.time(), 0))
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def _meter_loop(self, config: Config):
+        jitter = meter_jitter(meter_key(config), self.max_jitter)
+        while not self._stop.is_set():
+            when = next_poll(time.time(), self.interval, self.lag, jitter)
+            if await self._sleep_until(when):
+                return
+            async with self._slots:
+                await self.poll(config)
+
+    async def poll(self, config: Config):
+        """Sync one meter, returning its InsertResult or the exception raised."""
+        key = meter_key(config)
+        store = self.store_for(config)
+        self.polls += 1
+        coned = None
+        try:
+            coned = await self._coned_for(config)
+            result = await coned.sync(store, upsert=self.upsert)
+            logging.info(f"{key}: {result}, timings: {coned.timer.as_dict()}")
+        except Exception as e:
+            self.failures += 1
+            logging.exception(f"Polling {key} failed")
+            await self._discard(key)
+            if not self._browser_alive():
+                await self._restart_browser()
+            if METRICS.enabled:
+                METRICS.inc("polls_total", result="failed")
+            return e
+        finally:
+            # start every poll's timings afresh, even after a failed one
+            if coned is not None:
+                coned.timer.reset()
+        if METRICS.enabled:
+            METRICS.inc("polls_total", result="ok")
+            sample_browser_rss(self._browser)
+
+        session = self._sessions[key]
+        session[2] += 1
+        if session[2] >= self.recycle_after:
+            await self._discard(key)
+
+        prune = getattr(store, "prune", None)
+        if prune is not None and self.retention is not None:
+            prune(datetime.now(timezone.utc) - self.retention)
+        return result
+
+    async def _get_browser(self):
+        async with self._browser_lock:
+            if self._browser is None:
+                self._browser = await self._launch()
+            return self._browser
+
+    def _browser_alive(self) -> bool:
+        process = getattr(self._browser, "process", None)
+        return process is None or process.poll() is None
+
+    async def _restart_browser(self):
+        logging.warning("Browser died, relaunching...")
+        self.restarts += 1
+        for key in list(self._sessions):
+            await self._discard(key)
+        await self._close_browser()
+
+    async def _close_browser(self):
+        browser, self._browser = self._browser, None
+        if browser is not None:
+            try:
+                await browser.close()
+            except Exception:
+                logging.exception("Could not close browser")
+
+    async def _coned_for(self, config: Config):
+        key = meter_key(config)
+        if key not in self._sessions:
+            browser = await self._get_browser()
+            ctx = await browser.createIncognitoBrowserContext()
+            coned = self._new_coned(config)
+            self._sessions[key] = [ctx, coned, 0]
+            await coned.__ainit__(ctx)
+            await coned.login()
+        return self._sessions[key][1]
+
+    async def _discard(self, key: str):
+        session = self._sessions.pop(key, None)
+        if session is None:
+            return
+        try:
+            await session[0].close()
+        except Exception:
+            logging.exception(f"Could not close browser context for {key}")
@@ -0,0 +1,102 @@
+import asyncio
+from datetime import datetime
+import logging
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .coned import Coned, Config
+from .parser import iter_readings
+from .reading import Reading
+
+DEFAULT_TIMEOUT = 30
+DEFAULT_POOL_SIZE = 4
+
+
+class Unauthorized(Exception):
+    pass
+
+
+class Direct(Coned):
+    """
+    Direct logs in once through a browser backend, then calls the Opower
+    usage API itself over a pooled keep-alive HTTP session, using the
+    browser's cookies and the Opower bearer token. The browser backend must
+    provide auth_credentials(), as Pyppeteer does.
+    """
+
+    def __init__(
+        self,
+        config: Config,
+        browser: Coned,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        timeout: float = DEFAULT_TIMEOUT,
+    ):
+        super().__init__(config)
+        self.browser = browser
+        self.timeout = timeout
+
+        self.http = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.http.mount("https://", adapter)
+        self.http.mount("http://", adapter)
+        self.http.headers.update(
+            {"Accept": "application/json", "Accept-Encoding": "gzip, deflate"}
+        )
+
+    async def save_screenshot(self, filename: str):
+        await self.browser.save_screenshot(filename)
+
+    async def login(self):
+        await self.browser.login()
+        await self.refresh_credentials()
+
+    async def refresh_credentials(self):
+        """Copy the browser's cookies and Opower token into the HTTP session."""
+        creds = await self.browser.auth_credentials()
+        self.http.cookies.clear()
+        for c in creds["cookies"]:
+            self.http.cookies.set(
+                c["name"],
+                c["value"],
+                domain=c.get("domain", ""),
+                path=c.get("path", "/"),
+            )
+        if creds.get("token"):
+            self.http.headers["Authorization"] = f"Bearer {creds['token']}"
+        else:
+            self.http.headers.pop("Authorization", None)
+
+    def _get(self, url: str) -> bytes:
+        resp = self.http.get(url, timeout=self.timeout)
+        if resp.status_code in (401, 403):
+            raise Unauthorized
+        resp.raise_for_status()
+        # requests has already undone any gzip content encoding
+        return resp.content
+
+    async def fetch_usage(
+        self, since: Optional[datetime] = None, until: Optional[datetime] = None
+    ) -> bytes:
+        """Return the raw usage payload, refreshing credentials once if needed."""
+        loop = asyncio.get_running_loop()
+        url = self.usage_url(since, until)
+        try:
+            return await loop.run_in_executor(None, self._get, url)
+        except Unauthorized:
+            logging.info("Opower rejected our credentials, refreshing...")
+            await self.browser.authorize_opower()
+            await self.refresh_credentials()
+            return await loop.run_in_executor(None, self._get, url)
+
+    async def get_usage(
+        self, since: Optional[datetime] = None, until: Optional[datetime] = None
+    ) -> list[Reading]:
+        with self.timer.step("usage.fetch"):
+            raw = await self.fetch_usage(since, until)
+        with self.timer.step("usage.parse"):
+            return list(iter_readings(raw))
+
+    def close(self):
+        self.http.close()
@@ -0,0 +1,560 @@
+from datetime import timedelta
+import bisect
+import itertools
+import math
+import os
+
+import numpy as np
+
+from .coverage import CoverageIndex
+from .metrics import instrumented
+from .reading import Reading
+from .series import ReadingSeries, _hash_buckets, _merge_series, _spans
+from .store import (
+    BucketList,
+    ChangeNotifier,
+    InsertResult,
+    OverlappingReadingError,
+    Revision,
+)
+
+# Fixed-width record layout shared by every partition file. The CRC covers
+# the preceding fields and lets recovery detect torn appends.
+RECORD = np.dtype(
+    [
+        ("start", "<i8"),
+        ("end", "<i8"),
+        ("wh", "<f8"),
+        ("offset", "<i4"),
+        ("crc", "<u4"),
+    ]
+)
+
+
+# Compacted, sorted partition and its append-only log.
+DATA_SUFFIX = ".dat"
+LOG_SUFFIX = ".log"
+_TMP_SUFFIX = ".tmp"
+
+# The change log is a journal of records that also hold the wh of the
+# reading each one replaced, NaN for inserts. It is named after the sequence
+# number of the change before its first record.
+JOURNAL_RECORD = np.dtype(
+    [
+        ("start", "<i8"),
+        ("end", "<i8"),
+        ("wh", "<f8"),
+        ("offset", "<i4"),
+        ("old_wh", "<f8"),
+        ("crc", "<u4"),
+    ]
+)
+JOURNAL_PREFIX = "changes-"
+JOURNAL_SUFFIX = ".journal"
+# Journal records are turned into Readings this many at a time.
+_JOURNAL_CHUNK = 10_000
+
+
+def _crc_table():
+    table = np.arange(256, dtype=np.uint32)
+    for _ in range(8):
+        table = np.where(table & 1, (table >> 1) ^ 0xEDB88320, table >> 1)
+    return table.astype(np.uint32)
+
+
+_CRC_TABLE = _crc_table()
+
+
+def _crcs(records):
+    """
+    The zlib CRC-32 of each record's payload, everything but its trailing
+    crc field, computed a byte column at a time across all records.
+    """
+    size = records.dtype.itemsize
+    payload = np.ascontiguousarray(records).view(np.uint8)
+    payload = payload.reshape(len(records), size)
+    crc = np.full(len(records), 0xFFFFFFFF, dtype=np.uint32)
+    for i in range(size - 4):
+        crc = _CRC_TABLE[(crc ^ payload[:, i]) & 0xFF] ^ (crc >> 8)
+    return crc ^ np.uint32(0xFFFFFFFF)
+
+
+def _to_records(series: ReadingSeries, dtype=RECORD, old_wh=None):
+    records = np.empty(len(series), dtype=dtype)
+    records["start"] = series.start
+    records["end"] = series.end
+    records["wh"] = series.wh
+    records["offset"] = series.offset
+    if old_wh is not None:
+        records["old_wh"] = old_wh
+    records["crc"] = _crcs(records)
+    return records
+
+
+def _to_series(records) -> ReadingSeries:
+    return ReadingSeries._wrap(
+        records["start"], records["end"], records["wh"], records["offset"]
+    )
+
+
+def _day_keys(records):
+    """The hash_bucket of every record: its local start date."""
+    days = (records["start"] + records["offset"]) // 86400
+    return days.astype("datetime64[D]").astype(str)
+
+
+def _fsync_dir(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class DiskStore(ChangeNotifier):
+    """
+    DiskStore is a persistent BucketList. Each bucket is a pair of files
+    named after its hash_bucket key: a sorted partition that is memory-mapped
+    for reads, and an append-only log that new readings are written to.
+    compact() folds each log into its partition.
+
+    Appends are fsynced, and every record carries a CRC so that a torn write
+    at the end of a log is truncated away the next time the store is opened.
+    When a bucket has several records for the same interval, the last one
+    appended wins, which is how upserted corrections are stored.
+
+    Every appended record is first appended to a journal as well, with the
+    wh of the reading it replaced, if any. The journal is the store's change
+    log, so sequence numbers and revisions survive restarts, and
+    discard_changes() trims it.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._recover()
+
+        keys = set()
+        for name in os.listdir(root):
+            key, ext = os.path.splitext(name)
+            if ext in (DATA_SUFFIX, LOG_SUFFIX):
+                keys.add(key)
+        # ordered list of bucket keys that have files on disk
+        self._keys = sorted(keys)
+        self._journal_base = self._open_journal()
+        size = os.path.getsize(self._path(self._journal_key, JOURNAL_SUFFIX))
+        self._journal_len = size // JOURNAL_RECORD.itemsize
+        self._listeners = []
+        self._coverage = None
+
+    def _path(self, key: str, suffix: str) -> str:
+        return os.path.join(self.root, key + suffix)
+
+    def _recover(self):
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if name.endswith(_TMP_SUFFIX):
+                # compaction died before its rename; the originals are intact
+                os.remove(path)
+            elif name.endswith(LOG_SUFFIX):
+                self._recover_log(path, RECORD)
+            elif name.endswith(JOURNAL_SUFFIX):
+                self._recover_log(path, JOURNAL_RECORD)
+
+    def _open_journal(self) -> int:
+        """
+        Return the base of the journal, creating an empty one if there is
+        none. Only the journal with the highest base is kept: any other is
+        one that discard_changes() replaced but didn't get to remove.
+        """
+        bases = []
+        for name in os.listdir(self.root):
+            if name.startswith(JOURNAL_PREFIX) and name.endswith(JOURNAL_SUFFIX):
+                base = name.removeprefix(JOURNAL_PREFIX).removesuffix(JOURNAL_SUFFIX)
+                bases.append(int(base))
+        if not bases:
+            open(self._path(JOURNAL_PREFIX + "0", JOURNAL_SUFFIX), "ab").close()
+            _fsync_dir(self.root)
+            return 0
+        base = max(bases)
+        for stale in bases:
+            if stale != base:
+                os.remove(self._path(f"{JOURNAL_PREFIX}{stale}", JOURNAL_SUFFIX))
+        return base
+
+    @property
+    def _journal_key(self) -> str:
+        return f"{JOURNAL_PREFIX}{self._journal_base}"
+
+    def _recover_log(self, path: str, dtype):
+        size = os.path.getsize(path)
+        records = np.fromfile(path, dtype=dtype, count=size // dtype.itemsize)
+        bad = np.flatnonzero(_crcs(records) != records["crc"])
+        valid = int(bad[0]) if len(bad) else len(records)
+
+        if valid * dtype.itemsize != size:
+            with open(path, "r+b") as f:
+                f.truncate(valid * dtype.itemsize)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _read_file(self, key: str, suffix: str, mmap: bool, dtype=RECORD):
+        path = self._path(key, suffix)
+        try:
+            size = os.path.getsize(path)
+        except FileNotFoundError:
+            return None
+        if size < dtype.itemsize:
+            return None
+        if mmap:
+            return np.memmap(path, dtype=dtype, mode="r")
+        return np.fromfile(path, dtype=dtype)
+
+    def _read_bucket(self, key: str):
+        """
+        Return the records of a bucket, sorted by start time, keeping only
+        the last one appended for each interval.
+        """
+        data = self._read_file(key, DATA_SUFFIX, mmap=True)
+        log = self._read_file(key, LOG_SUFFIX, mmap=False)
+        if log is None:
+            return data if data is not None else np.empty(0, dtype=RECORD)
+
+        records = log if data is None else np.concatenate([data, log])
+        records = records[np.argsort(records["start"], kind="stable")]
+        # Later records for the same interval are corrections, or repeats
+        # replayed after a crash between compaction's rename and the log's
+        # removal.
+        keep = np.ones(len(records), dtype=bool)
+        keep[:-1] = (records["start"][:-1] != records["start"][1:]) | (
+            records["end"][:-1] != records["end"][1:]
+        )
+        return records[keep]
+
+    def bucket_keys(self, start: str = None, end: str = None):
+        """Return the bucket keys in [start, end), in order."""
+        lo = 0 if start is None else bisect.bisect_left(self._keys, start)
+        hi = len(self._keys) if end is None else bisect.bisect_left(self._keys, end)
+        return self._keys[lo:hi]
+
+    def get_bucket(self, key: str):
+        return self.bucket_series(key).to_readings()
+
+    def bucket_series(self, key: str) -> ReadingSeries:
+        """Return the readings of a bucket as a ReadingSeries, in start order."""
+        return _to_series(self._read_bucket(key))
+
+    def to_list(self):
+        out = []
+        for key in self._keys:
+            out.extend(self.get_bucket(key))
+        return out
+
+    def latest(self):
+        """Return the reading with the latest start time, or None if empty."""
+        for key in reversed(self._keys):
+            records = self._read_bucket(key)
+            if len(records):
+                return _to_series(records)[-1]
+        return None
+
+    @instrumented("store.range", store="DiskStore")
+    def range(self, start, end) -> ReadingSeries:
+        """
+        Return the readings that start in [start, end) as a ReadingSeries.
+        Only the buckets around that window are read, and compacted
+        partitions are sliced straight out of their memory map.
+        """
+        lo = bisect.bisect_left(self._keys, str((start - timedelta(days=1)).date()))
+        hi = bisect.bisect_right(self._keys, str((end + timedelta(days=1)).date()))
+        first = int(start.timestamp())
+        last = int(end.timestamp())
+
+        parts = []
+        for key in self._keys[lo:hi]:
+            records = self._read_bucket(key)
+            starts = records["start"]
+            i = np.searchsorted(starts, first, side="left")
+            j = np.searchsorted(starts, last, side="left")
+            if i < j:
+                parts.append(_to_series(records[i:j]))
+        return ReadingSeries.concat(parts)
+
+    @property
+    def coverage(self) -> CoverageIndex:
+        """The store's CoverageIndex, built from disk on first use."""
+        if self._coverage is None:
+            coverage = CoverageIndex()
+            for key in self._keys:
+                records = self._read_bucket(key)
+                for start, end in zip(
+                    records["start"].tolist(), records["end"].tolist()
+                ):
+                    coverage.add(start, end)
+            self._coverage = coverage
+        return self._coverage
+
+    def missing_ranges(self, start, end) -> list:
+        """Return the (start, end) ranges within [start, end) with no readings."""
+        return self.coverage.missing_ranges(start, end)
+
+    def _neighbors(self, keys):
+        """Return the stored bucket keys needed to check inserts into keys."""
+        needed = set()
+        for key in keys:
+            i = bisect.bisect_left(self._keys, key)
+            lo, hi = max(i - 1, 0), i + 2
+            needed.update(self._keys[lo:hi])
+        return needed
+
+    def insert(self, reading: Reading):
+        result = self.insert_many([reading])
+        if result.rejected:
+            raise OverlappingReadingError
+
+    def upsert(self, reading: Reading):
+        """
+        Insert a reading, or replace the stored reading with the same
+        interval if its wh differs and return it, like BucketList.upsert.
+        """
+        seq = self.seq
+        result = self.insert_many([reading], upsert=True)
+        if result.rejected:
+            raise OverlappingReadingError
+        revisions = self.revisions_since(seq)
+        if revisions:
+            return revisions[-1].old
+        return None
+
+    @instrumented("store.insert_many", store="DiskStore")
+    def insert_many(self, readings, upsert: bool = False) -> InsertResult:
+        """
+        Insert a batch of readings with the same dedup, overlap and upsert
+        rules as BucketList.insert_many, appending the accepted ones and any
+        corrections to the logs of their buckets.
+        """
+        readings = list(readings)
+        touched = {r.hash_bucket() for r in readings}
+
+        # Load just the buckets the batch touches, plus their neighbors for
+        # readings that span midnight, and let BucketList do the checks.
+        stored = BucketList()
+        for key in sorted(self._neighbors(touched)):
+            stored._load(key, self.get_bucket(key))
+        before = set(stored)
+
+        result = stored.insert_many(readings, upsert=upsert)
+        # a correction is kept in the bucket its interval was stored in,
+        # whatever UTC offset it was reported in
+        added, keys = [], []
+        for key in stored.bucket_keys():
+            for r in stored.get_bucket(key):
+                if r not in before:
+                    added.append(r)
+                    keys.append(key)
+        replaced = {(c.new.start, c.new.end): c.old.wh for c in stored.revisions}
+        if added:
+            series = ReadingSeries.from_readings(added)
+            old_wh = [replaced.get((r.start, r.end), np.nan) for r in added]
+            self._append(
+                _to_records(series),
+                _to_records(series, JOURNAL_RECORD, old_wh),
+                np.array(keys),
+            )
+            if self._coverage is not None:
+                for r in added:
+                    self._coverage.add_reading(r)
+
+        revised = set()
+        for key, r in zip(keys, added):
+            if (r.start, r.end) in replaced:
+                revised.add(key)
+        for key, group in itertools.groupby(zip(keys, added), key=lambda kr: kr[0]):
+            self._notify(key, None if key in revised else [r for _, r in group])
+        return result
+
+    @instrumented("store.insert_series", store="DiskStore")
+    def insert_series(self, series: ReadingSeries) -> InsertResult:
+        """
+        Insert a ReadingSeries with the dedup and overlap rules of
+        insert_many, without building Readings. The series is checked
+        against the records of the buckets it touches, then against itself
+        in start order, and what is left is appended as records.
+        """
+        result = InsertResult()
+        if not len(series):
+            return result
+        touched = set(_hash_buckets(series))
+        parts = [self._read_bucket(key) for key in sorted(self._neighbors(touched))]
+        start, end, wh = series.start, series.end, series.wh
+        copy = np.zeros(len(series), dtype=bool)
+        overlap = np.zeros(len(series), dtype=bool)
+        stored = np.concatenate(parts) if parts else np.empty(0, dtype=RECORD)
+        n = len(stored)
+        if n:
+            # Stored readings never overlap, so a new one can only copy or
+            # overlap the stored readings right before and after its start.
+            stored = stored[np.argsort(stored["start"], kind="stable")]
+            i = np.searchsorted(stored["start"], start, side="left")
+            has_before, has_after = i > 0, i < n
+            before, after = np.maximum(i - 1, 0), np.minimum(i, n - 1)
+            copy = (
+                has_after
+                & (stored["start"][after] == start)
+                & (stored["end"][after] == end)
+                & (stored["wh"][after] == wh)
+            )
+            overlap = (has_before & (stored["end"][before] > start)) | (
+                has_after & (stored["start"][after] < end)
+            )
+            overlap &= ~copy
+        result.deduplicated = int(copy.sum())
+        result.rejected = int(overlap.sum())
+
+        keep = ~(copy | overlap)
+        series = ReadingSeries._wrap(
+            start[keep], end[keep], wh[keep], series.offset[keep]
+        )
+        series, deduplicated, rejected = _merge_series(series)
+        result.deduplicated += deduplicated
+        result.rejected += rejected
+        result.inserted = len(series)
+        if not len(series):
+            return result
+
+        records = _to_records(series)
+        self._append(records, _to_records(series, JOURNAL_RECORD, np.nan))
+        if self._coverage is not None:
+            for start, end in _spans(series):
+                self._coverage.add(start, end)
+        if self._listeners:
+            keys = _day_keys(records).tolist()
+            lo = 0
+            for key, group in itertools.groupby(keys):
+                hi = lo + sum(1 for _ in group)
+                self._notify(key, list(series[lo:hi]))
+                lo = hi
+        return result
+
+    @property
+    def seq(self) -> int:
+        """The sequence number of the last change stored, or 0."""
+        return self._journal_base + self._journal_len
+
+    def _journal_chunks(self, seq: int):
+        """
+        Yield the sequence number of each chunk's first change and its
+        journal records, for the changes after seq, reading the journal as
+        it was when iteration started.
+        """
+        records = self._read_file(
+            self._journal_key, JOURNAL_SUFFIX, mmap=True, dtype=JOURNAL_RECORD
+        )
+        if records is None:
+            return
+        base = self._journal_base
+        for lo in range(max(seq - base, 0), len(records), _JOURNAL_CHUNK):
+            hi = lo + _JOURNAL_CHUNK
+            yield base + lo + 1, records[lo:hi]
+
+    def changes_since(self, seq: int = 0):
+        """
+        Yield the changes after sequence number seq, oldest first, reading
+        the journal as it was when iteration started, a chunk at a time.
+        """
+        for first, chunk in self._journal_chunks(seq):
+            readings = _to_series(chunk).to_readings()
+            olds = chunk["old_wh"].tolist()
+            for i, (new, old_wh) in enumerate(zip(readings, olds), first):
+                old = None
+                if not math.isnan(old_wh):
+                    old = Reading._from_epoch(
+                        new.start_time, new.end_time, old_wh, new.start, new.end
+                    )
+                yield Revision(i, old, new)
+
+    def series_since(self, seq: int = 0):
+        """
+        Yield the readings stored after sequence number seq, oldest first,
+        as ReadingSeries of a journal chunk each, together with the sequence
+        number of every row. No Readings are built.
+        """
+        for first, chunk in self._journal_chunks(seq):
+            yield _to_series(chunk), np.arange(first, first + len(chunk))
+
+    def discard_changes(self, seq: int):
+        """
+        Forget the changes up to and including sequence number seq. The rest
+        of the journal is copied to a new journal named after its new base,
+        which replaces the old one once it is complete.
+        """
+        n = min(seq - self._journal_base, self._journal_len)
+        if n <= 0:
+            return
+        old_path = self._path(self._journal_key, JOURNAL_SUFFIX)
+        records = np.fromfile(old_path, dtype=JOURNAL_RECORD)
+        new_path = self._path(
+            f"{JOURNAL_PREFIX}{self._journal_base + n}", JOURNAL_SUFFIX
+        )
+        tmp_path = new_path + _TMP_SUFFIX
+        with open(tmp_path, "wb") as f:
+            f.write(records[n:].tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, new_path)
+        _fsync_dir(self.root)
+        os.remove(old_path)
+        self._journal_base += n
+        self._journal_len -= n
+
+    def merge(self, other) -> InsertResult:
+        return self.insert_many(other.to_list())
+
+    def _append(self, records, journal, keys=None):
+        # Journal first: a crash before the bucket logs are written leaves a
+        # change that is exported twice rather than a reading never exported.
+        with open(self._path(self._journal_key, JOURNAL_SUFFIX), "ab") as f:
+            f.write(journal.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        self._journal_len += len(journal)
+
+        if keys is None:
+            keys = _day_keys(records)
+        for key in np.unique(keys).tolist():
+            path = self._path(key, LOG_SUFFIX)
+            created = not os.path.exists(path)
+            with open(path, "ab") as f:
+                f.write(records[keys == key].tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            if created:
+                _fsync_dir(self.root)
+            i = bisect.bisect_left(self._keys, key)
+            if i == len(self._keys) or self._keys[i] != key:
+                self._keys.insert(i, key)
+
+    @instrumented("store.compact", store="DiskStore")
+    def compact(self):
+        """
+        Merge every bucket's append log into its sorted partition. The new
+        partition is written to a temporary file and renamed over the old
+        one, so a crash leaves either the old or the new partition in place.
+        Days are never merged with each other: partitions stay one per
+        hash_bucket key, so a bucket is always a single file lookup.
+        """
+        for key in self._keys:
+            log_path = self._path(key, LOG_SUFFIX)
+            if not os.path.exists(log_path):
+                continue
+
+            records = self._read_bucket(key)
+            data_path = self._path(key, DATA_SUFFIX)
+            tmp_path = data_path + _TMP_SUFFIX
+            with open(tmp_path, "wb") as f:
+                f.write(records.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, data_path)
+            _fsync_dir(self.root)
+            os.remove(log_path)
@@ -0,0 +1,107 @@
+from concurrent.futures import ProcessPoolExecutor
+import os
+
+import numpy as np
+
+from .codec import decode, encode
+from .metrics import instrumented
+from .parser import parse_series
+from .series import ReadingSeries, _merge_series
+from .store import InsertResult
+
+# Readings are partitioned into runs of this many days, aligned to the
+# epoch, and each partition is keyed by the hash_bucket of its first day.
+# Fewer, larger partitions keep the cost of encoding them small.
+PARTITION_DAYS = 32
+
+# Partitions are merged in about this many tasks per worker, so a slow
+# task doesn't hold up the rest and small partitions don't each pay for a round
+# trip to the pool.
+TASKS_PER_WORKER = 4
+
+
+def parse_partitions(source) -> dict:
+    """
+    Parse one Opower usage payload, given as a path or as bytes, and split
+    it into partitions of PARTITION_DAYS days by hash_bucket. Returns the
+    codec encoding of each partition's readings, in start order, keyed by
+    its first day.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            series = parse_series(f)
+    else:
+        series = parse_series(source)
+    if not len(series):
+        return {}
+
+    days = (series.start + series.offset) // 86400
+    days -= days % PARTITION_DAYS
+    order = np.lexsort((series.start, days))
+    days = days[order]
+    series = ReadingSeries._wrap(
+        series.start[order], series.end[order], series.wh[order], series.offset[order]
+    )
+
+    bounds = np.flatnonzero(np.diff(days)) + 1
+    firsts = np.concatenate(([0], bounds))
+    lasts = np.concatenate((bounds, [len(days)]))
+    keys = days[firsts].astype("datetime64[D]").astype(str)
+    return {
+        key: encode(series[lo:hi])
+        for key, lo, hi in zip(keys.tolist(), firsts.tolist(), lasts.tolist())
+    }
+
+
+def merge_partitions(partitions) -> list:
+    """
+    Merge what each payload had for the same partitions. partitions holds
+    (key, encodings) pairs, and each result is (key, encoding,
+    deduplicated, rejected).
+    """
+    merged = []
+    for key, blobs in partitions:
+        series = ReadingSeries.concat(decode(blob) for blob in blobs)
+        series, deduplicated, rejected = _merge_series(series)
+        merged.append((key, encode(series), deduplicated, rejected))
+    return merged
+
+
+def _groups(items, n: int):
+    """Split items into at most n contiguous runs of about equal length."""
+    size = max(1, -(-len(items) // n))
+    groups = []
+    for lo in range(0, len(items), size):
+        hi = lo + size
+        groups.append(items[lo:hi])
+    return groups
+
+
+@instrumented("ingest.backfill_files")
+def backfill_files(store, sources, workers: int = None) -> InsertResult:
+    """
+    Load a backfill of Opower usage payloads, given as paths or bytes, into
+    store. Payloads are parsed in a pool of worker processes (one per core
+    by default), which split them into partitions by day and send them back
+    codec encoded. Each partition's pieces are then merged in the pool, with
+    the dedup and overlap rules of insert_many, and each merged partition is
+    inserted into store with insert_series, in order, while the pool merges
+    the next ones.
+    """
+    workers = workers or os.cpu_count() or 1
+    partitions = {}
+    result = InsertResult()
+    with ProcessPoolExecutor(workers) as pool:
+        for parsed in pool.map(parse_partitions, sources):
+            for key, blob in parsed.items():
+                partitions.setdefault(key, []).append(blob)
+
+        tasks = _groups(sorted(partitions.items()), workers * TASKS_PER_WORKER)
+        del partitions
+        for group in pool.map(merge_partitions, tasks):
+            for _, blob, deduplicated, rejected in group:
+                inserted = store.insert_series(decode(blob))
+                result.inserted += inserted.inserted
+                result.deduplicated += inserted.deduplicated + deduplicated
+                result.rejected += inserted.rejected + rejected
+    return result
@@ -0,0 +1,302 @@
+import bisect
+from collections import deque
+import functools
+import inspect
+import os
+import threading
+import time
+
+# Latency histogram bucket bounds, in seconds.
+DEFAULT_BUCKETS = (
+    0.0001,
+    0.0005,
+    0.001,
+    0.005,
+    0.01,
+    0.05,
+    0.1,
+    0.5,
+    1.0,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+# The trace keeps this many of the latest events.
+MAX_TRACE = 10_000
+
+PREFIX = "coned_rtu_"
+
+
+def _key(name: str, labels: dict):
+    return name, tuple(sorted(labels.items()))
+
+
+def _format_labels(labels, extra=()) -> str:
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    inner = ",".join(
+        '{}="{}"'.format(
+            k, str(v).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+        )
+        for k, v in items
+    )
+    return "{" + inner + "}"
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        i = bisect.bisect_left(self.buckets, value)
+        if i < len(self.counts):
+            self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """
+    Metrics collects counters, gauges and latency histograms, plus a trace
+    of the latest timed calls, and renders them in the Prometheus text
+    format. It starts disabled, and instrumented code checks enabled before
+    doing any work, so collection costs next to nothing until it's turned
+    on. Values are recorded from the event loop and may be read from the
+    metrics endpoint's thread.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, max_trace: int = MAX_TRACE):
+        self.enabled = False
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self.trace = deque(maxlen=max_trace)
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+            self.trace.clear()
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels):
+        with self._lock:
+            self._gauges[_key(name, labels)] = value
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def value(self, name: str, **labels):
+        """Return a counter or gauge, or None if it hasn't been recorded."""
+        key = _key(name, labels)
+        with self._lock:
+            if key in self._counters:
+                return self._counters[key]
+            return self._gauges.get(key)
+
+    def histogram(self, name: str, **labels):
+        with self._lock:
+            return self._histograms.get(_key(name, labels))
+
+    def record_call(self, op: str, started: float, seconds: float, ok: bool, **labels):
+        """Record one timed call in the latency histogram and the trace."""
+        self.observe("call_seconds", seconds, op=op, **labels)
+        if not ok:
+            self.inc("call_errors_total", op=op, **labels)
+        self.trace.append(
+            {"op": op, "start": started, "seconds": seconds, "ok": ok, **labels}
+        )
+
+    def record_insert(self, result):
+        """Count what happened to each reading of an InsertResult."""
+        self.inc("readings_total", result.inserted, result="inserted")
+        self.inc("readings_total", result.deduplicated, result="deduplicated")
+        self.inc("readings_total", result.rejected, result="rejected")
+        self.inc("readings_total", result.replaced, result="replaced")
+
+    def trace_events(self) -> list:
+        with self._lock:
+            return list(self.trace)
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format."""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            gauges = sorted(self._gauges.items())
+            histograms = sorted(
+                (key, (list(h.counts), h.sum, h.count))
+                for key, h in self._histograms.items()
+            )
+
+        lines = []
+        typed = set()
+
+        def declare(name, kind):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {PREFIX}{name} {kind}")
+
+        for (name, labels), value in counters:
+            declare(name, "counter")
+            lines.append(f"{PREFIX}{name}{_format_labels(labels)} {value}")
+        for (name, labels), value in gauges:
+            declare(name, "gauge")
+            lines.append(f"{PREFIX}{name}{_format_labels(labels)} {value}")
+        for (name, labels), (counts, total, count) in histograms:
+            declare(name, "histogram")
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                le = _format_labels(labels, [("le", repr(bound))])
+                lines.append(f"{PREFIX}{name}_bucket{le} {cumulative}")
+            le = _format_labels(labels, [("le", "+Inf")])
+            lines.append(f"{PREFIX}{name}_bucket{le} {count}")
+            lines.append(f"{PREFIX}{name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{PREFIX}{name}_count{_format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int, host: str = "127.0.0.1"):
+        """
+        Serve /metrics in the Prometheus text format and /trace as JSON from
+        a background thread, and return the server. Port 0 picks a free port.
+        """
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        import json
+
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body = metrics.render().encode()
+                    content_type = "text/plain; version=0.0.4"
+                elif self.path == "/trace":
+                    body = json.dumps(metrics.trace_events()).encode()
+                    content_type = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+# The process-wide registry instrumented code records to.
+METRICS = Metrics()
+
+
+def instrumented(op: str, **labels):
+    """
+    Time every call of the decorated function or coroutine function into
+    METRICS under op, while METRICS is enabled.
+    """
+
+    def decorate(f):
+        if inspect.iscoroutinefunction(f):
+
+            @functools.wraps(f)
+            async def wrapper(*args, **kwargs):
+                if not METRICS.enabled:
+                    return await f(*args, **kwargs)
+                started = time.time()
+                start = time.perf_counter()
+                ok = False
+                try:
+                    result = await f(*args, **kwargs)
+                    ok = True
+                    return result
+                finally:
+                    elapsed = time.perf_counter() - start
+                    METRICS.record_call(op, started, elapsed, ok, **labels)
+
+        else:
+
+            @functools.wraps(f)
+            def wrapper(*args, **kwargs):
+                if not METRICS.enabled:
+                    return f(*args, **kwargs)
+                started = time.time()
+                start = time.perf_counter()
+                ok = False
+                try:
+                    result = f(*args, **kwargs)
+                    ok = True
+                    return result
+                finally:
+                    elapsed = time.perf_counter() - start
+                    METRICS.record_call(op, started, elapsed, ok, **labels)
+
+        return wrapper
+
+    return decorate
+
+
+def rss_bytes(pid: int) -> int:
+    """Resident memory of a process and all of its descendants (Linux only)."""
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+
+    total = 0
+    pending = [pid]
+    while pending:
+        p = pending.pop()
+        pending.extend(children.get(p, []))
+        try:
+            with open(f"/proc/{p}/statm") as f:
+                total += int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except OSError:
+            pass
+    return total
+
+
+def sample_browser_rss(browser):
+    """Record the resident memory of a launched browser, if it has a process."""
+    process = getattr(browser, "process", None)
+    if process is None:
+        return
+    try:
+        METRICS.set("browser_rss_bytes", rss_bytes(process.pid))
+    except OSError:
+        pass
@@ -0,0 +1,326 @@
+import codecs
+from datetime import date
+import json
+import re
+
+import numpy as np
+
+from .reading import Reading
+from .series import ReadingSeries, _to_datetime
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+# Opower reports times like 2021-08-29T00:30:00.000-04:00. Anything else goes
+# through dateutil.
+_OPOWER_TIME = re.compile(
+    r"(\d{4})-(\d\d)-(\d\d)T(\d\d):(\d\d):(\d\d)(?:\.0+)?(?:Z|([+-])(\d\d):?(\d\d))\Z"
+)
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+_SEPARATOR = re.compile(r"[ \t\r\n,]*")
+
+# parser states
+_START, _KEY, _COLON, _VALUE, _READS, _DONE = range(6)
+
+
+class UsageParseError(ValueError):
+    pass
+
+
+_day_cache = {}
+
+
+def parse_time(s):
+    """
+    Parse an ISO-8601 timestamp into (epoch seconds, UTC offset seconds).
+    Sub-second precision is dropped.
+    """
+    m = _OPOWER_TIME.match(s)
+    if m is None:
+        return _parse_time_slow(s)
+
+    day = s[:10]
+    days = _day_cache.get(day)
+    if days is None:
+        days = date(int(m[1]), int(m[2]), int(m[3])).toordinal() - _EPOCH_ORDINAL
+        _day_cache[day] = days
+
+    offset = 0
+    if m[7] is not None:
+        offset = int(m[8]) * 3600 + int(m[9]) * 60
+        if m[7] == "-":
+            offset = -offset
+
+    seconds = int(m[4]) * 3600 + int(m[5]) * 60 + int(m[6])
+    return days * 86400 + seconds - offset, offset
+
+
+def parse_times(strings):
+    """
+    Parse a sequence of ISO-8601 timestamps into arrays of epoch seconds and
+    UTC offset seconds. When every timestamp has Opower's fixed layout the
+    whole batch is converted by NumPy; otherwise each one is parsed on its own.
+    """
+    arr = np.asarray(strings, dtype=str)
+    if len(arr) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int32)
+
+    width = arr.dtype.itemsize // 4
+    if width in (25, 29):
+        codes = arr.view(np.uint32).reshape(len(arr), width)
+        tail = codes[:, -6:]
+        fixed = (
+            (codes[:, 10] == ord("T"))
+            & (tail[:, 3] == ord(":"))
+            & ((tail[:, 0] == ord("+")) | (tail[:, 0] == ord("-")))
+        )
+        if width == 29:
+            fixed &= (codes[:, 19] == ord(".")) & np.all(
+                codes[:, 20:23] == ord("0"), axis=1
+            )
+        # shorter strings are zero padded, so this also checks the length
+        fixed &= codes[:, width - 1] != 0
+
+        if fixed.all():
+            digits = tail.astype(np.int32) - ord("0")
+            offset = (digits[:, 1] * 10 + digits[:, 2]) * 3600 + (
+                digits[:, 4] * 10 + digits[:, 5]
+            ) * 60
+            offset = np.where(tail[:, 0] == ord("-"), -offset, offset).astype(np.int32)
+            local = arr.astype("U19").astype("datetime64[s]").astype(np.int64)
+            return local - offset, offset
+
+    epochs, offsets = zip(*map(parse_time, arr.tolist()))
+    return np.array(epochs, dtype=np.int64), np.array(offsets, dtype=np.int32)
+
+
+def _parse_time_slow(s):
+    from dateutil.parser import isoparse
+
+    dt = isoparse(s)
+    offset = dt.utcoffset()
+    if offset is None:
+        raise UsageParseError(f"Timestamp has no UTC offset: {s}")
+    return int(dt.timestamp()), int(offset.total_seconds())
+
+
+class OpowerParser:
+    """
+    OpowerParser incrementally parses an Opower usage payload. Feed it chunks
+    of bytes or text as they arrive and it returns the reads completed so far
+    as (startTime, endTime, value) tuples, skipping null intervals. The unit
+    is available as parser.unit once the "unit" key has been seen, which may
+    be before or after the reads.
+    """
+
+    def __init__(self):
+        self.unit = None
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._json = json.JSONDecoder()
+        self._buf = ""
+        self._pos = 0
+        self._state = _START
+        self._key = None
+
+    def feed(self, chunk):
+        if isinstance(chunk, (bytes, bytearray, memoryview)):
+            chunk = self._decoder.decode(chunk)
+        pos = self._pos
+        if pos:
+            self._buf = self._buf[pos:]
+            self._pos = 0
+        self._buf += chunk
+        return self._parse(final=False)
+
+    def close(self):
+        pos = self._pos
+        self._buf = self._buf[pos:] + self._decoder.decode(b"", final=True)
+        self._pos = 0
+        rows = self._parse(final=True)
+        if self._state != _DONE:
+            raise UsageParseError("Truncated usage payload.")
+        return rows
+
+    def _skip_ws(self):
+        buf, pos = self._buf, self._pos
+        n = len(buf)
+        while pos < n and buf[pos] in " \t\r\n":
+            pos += 1
+        self._pos = pos
+        return pos < n
+
+    def _decode_value(self, final):
+        """
+        Decode the JSON value at the current position, or return (None, False)
+        if more input is needed to be sure the value is complete.
+        """
+        try:
+            value, end = self._json.raw_decode(self._buf, self._pos)
+        except json.JSONDecodeError:
+            if final:
+                raise UsageParseError("Malformed usage payload.")
+            return None, False
+
+        # A number at the very end of the buffer may still be growing.
+        if end == len(self._buf) and not final:
+            return None, False
+
+        self._pos = end
+        return value, True
+
+    def _expect(self, chars):
+        c = self._buf[self._pos]
+        if c not in chars:
+            raise UsageParseError(f"Unexpected {c!r} in usage payload.")
+        self._pos += 1
+        return c
+
+    def _parse_reads(self, rows, final):
+        """
+        Consume reads from the current position until the end of the reads
+        array or of the buffer. Returns False if more input is needed.
+        """
+        buf, pos = self._buf, self._pos
+        n = len(buf)
+        scan = self._json.scan_once
+        separator = _SEPARATOR.match
+        while True:
+            pos = separator(buf, pos).end()
+            if pos == n:
+                self._pos = pos
+                return False
+            if buf[pos] == "]":
+                self._pos = pos + 1
+                self._state = _KEY
+                return True
+            try:
+                read, pos = scan(buf, pos)
+            except (StopIteration, json.JSONDecodeError):
+                if final:
+                    raise UsageParseError("Malformed usage payload.")
+                return False
+            self._pos = pos
+
+            # Opower gives readings with null value for intervals that don't
+            # have data yet, so skip them.
+            value = read["value"]
+            if value is not None:
+                rows.append((read["startTime"], read["endTime"], value))
+
+    def _parse(self, final):
+        rows = []
+        while self._state != _DONE and self._skip_ws():
+            state = self._state
+            if state == _START:
+                self._expect("{")
+                self._state = _KEY
+            elif state == _KEY:
+                if self._buf[self._pos] in ",}":
+                    if self._expect(",}") == "}":
+                        self._state = _DONE
+                    continue
+                key, ok = self._decode_value(final)
+                if not ok:
+                    break
+                self._key = key
+                self._state = _COLON
+            elif state == _COLON:
+                self._expect(":")
+                self._state = _VALUE
+            elif state == _VALUE:
+                if self._key == "reads":
+                    self._expect("[")
+                    self._state = _READS
+                    continue
+                value, ok = self._decode_value(final)
+                if not ok:
+                    break
+                if self._key == "unit":
+                    self.unit = value
+                self._state = _KEY
+            elif state == _READS:
+                if not self._parse_reads(rows, final):
+                    break
+        return rows
+
+
+def _chunks(source, chunk_size):
+    if isinstance(source, (str, bytes, bytearray, memoryview)):
+        yield source
+    elif hasattr(source, "read"):
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    else:
+        yield from source
+
+
+def iter_rows(source, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yield (unit, startTime, endTime, value) for every non-null read in an
+    Opower usage payload. source may be bytes, text, a file object or an
+    iterable of chunks.
+    """
+    parser = OpowerParser()
+    pending = []
+    for chunk in _chunks(source, chunk_size):
+        rows = parser.feed(chunk)
+        if parser.unit is None:
+            pending.extend(rows)
+            continue
+        if pending:
+            rows = pending + rows
+            pending = []
+        for row in rows:
+            yield (parser.unit,) + row
+
+    rows = pending + parser.close()
+    if rows and parser.unit is None:
+        raise UsageParseError("Usage payload has no unit.")
+    for row in rows:
+        yield (parser.unit,) + row
+
+
+def iter_readings(source, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield a Reading for every non-null read in an Opower usage payload."""
+    for unit, start_time, end_time, value in iter_rows(source, chunk_size):
+        start, offset = parse_time(start_time)
+        end, _ = parse_time(end_time)
+        yield Reading(
+            _to_datetime(start, offset), _to_datetime(end, offset), unit, value
+        )
+
+
+def _to_columns(rows):
+    start_times, end_times, values = zip(*rows)
+    start, offset = parse_times(start_times)
+    end, _ = parse_times(end_times)
+    return start, end, np.array(values, dtype=np.float64), offset
+
+
+def parse_series(source, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Parse an Opower usage payload into a ReadingSeries. Timestamps are
+    converted one chunk at a time, so only the raw strings of the current
+    chunk are held in memory.
+    """
+    parser = OpowerParser()
+    columns = []
+    for chunk in _chunks(source, chunk_size):
+        rows = parser.feed(chunk)
+        if rows:
+            columns.append(_to_columns(rows))
+    rows = parser.close()
+    if rows:
+        columns.append(_to_columns(rows))
+
+    if not columns:
+        return ReadingSeries.empty()
+    if parser.unit is None:
+        raise UsageParseError("Usage payload has no unit.")
+
+    start, end, wh, offset = (np.concatenate(c) for c in zip(*columns))
+    return ReadingSeries(start, end, wh, unit=parser.unit, offset=offset)
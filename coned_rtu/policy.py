@@ -0,0 +1,58 @@
+from urllib.parse import urlsplit
+
+# Hosts (and their subdomains) that login and the Opower widget need.
+DEFAULT_ALLOWED_HOSTS = ("coned.com", "opower.com")
+
+# Resource types the scraper never looks at.
+DEFAULT_BLOCKED_TYPES = ("image", "media", "font")
+
+
+class RequestPolicy:
+    """
+    RequestPolicy decides which browser requests are worth making: only
+    requests to allowed hosts, and never for blocked resource types. Counts
+    of allowed and blocked requests are kept for reporting.
+    """
+
+    def __init__(
+        self,
+        allowed_hosts=DEFAULT_ALLOWED_HOSTS,
+        blocked_types=DEFAULT_BLOCKED_TYPES,
+    ):
+        self.allowed_hosts = tuple(h.lower().lstrip(".") for h in allowed_hosts)
+        self.blocked_types = frozenset(blocked_types)
+        self.allowed = 0
+        self.blocked = 0
+
+    def allows_host(self, host: str) -> bool:
+        host = host.lower()
+        return any(host == h or host.endswith("." + h) for h in self.allowed_hosts)
+
+    def allows(self, url: str, resource_type: str) -> bool:
+        if url.startswith(("data:", "blob:")):
+            return True
+        if resource_type in self.blocked_types:
+            return False
+        return self.allows_host(urlsplit(url).hostname or "")
+
+    def check(self, url: str, resource_type: str) -> bool:
+        """Like allows, but counts the decision."""
+        ok = self.allows(url, resource_type)
+        if ok:
+            self.allowed += 1
+        else:
+            self.blocked += 1
+        return ok
+
+    def chrome_args(self) -> list:
+        """
+        Chrome flags that apply the policy for backends that can't intercept
+        requests: unknown hosts fail to resolve and images are not loaded.
+        """
+        rules = ["MAP * ~NOTFOUND"]
+        for h in self.allowed_hosts:
+            rules += [f"EXCLUDE {h}", f"EXCLUDE *.{h}"]
+        args = [f"--host-resolver-rules={', '.join(rules)}"]
+        if "image" in self.blocked_types:
+            args.append("--blink-settings=imagesEnabled=false")
+        return args
@@ -1,96 +1,368 @@
 import asyncio
-import json
+from datetime import datetime, timedelta, timezone
 import logging
+from typing import Optional
+
 import pyotp
 import pyppeteer
+import pyppeteer.errors
+import pyppeteer.helper
 
-from .coned import Coned, Config, CONED_LOGIN_URL, CONED_USAGE_URL
+from .coned import Coned, Config, _screenshot_failure
+from .parser import iter_readings
+from .policy import RequestPolicy
 from .reading import Reading
+from .session import SessionCache
+
+# Timeouts for page waits, in milliseconds.
+DEFAULT_TIMEOUT = 30_000
+POPUP_TIMEOUT = 2_000
+
+USAGE_MODES = ("fetch", "intercept", "navigate")
+
+# Requests usage from inside the page, with the page's cookies and the bearer
+# token the widget uses, and returns the raw body.
+FETCH_USAGE_JS = """
+async (url, token) => {
+    const headers = token ? {Authorization: `Bearer ${token}`} : {};
+    const resp = await fetch(url, {credentials: "include", headers});
+    if (!resp.ok) {
+        throw new Error(`Opower usage request failed: ${resp.status}`);
+    }
+    return await resp.text();
+}
+"""
+
+# Origins whose local storage is part of an authenticated session.
+SESSION_ORIGINS = ("https://www.coned.com", "https://cned.opower.com")
+
+# Restores saved local storage for the matching origin before any page script
+# runs.
+RESTORE_LOCAL_STORAGE_JS = """
+(storage) => {
+    const items = storage[window.location.origin];
+    if (items) {
+        for (const [k, v] of Object.entries(items)) {
+            window.localStorage.setItem(k, v);
+        }
+    }
+}
+"""
+
+
+# Chrome features a scrape never uses.
+LIGHTWEIGHT_ARGS = [
+    "--disable-extensions",
+    "--disable-gpu",
+    "--mute-audio",
+    "--no-default-browser-check",
+]
+
+
+async def launch(lightweight=True):
+    args = ["--no-sandbox"]
+    if lightweight:
+        args += LIGHTWEIGHT_ARGS
+    browser_launch_config = {
+        "defaultViewport": {"width": 1920, "height": 1080},
+        "dumpio": False,
+        "args": args,
+    }
+    return await pyppeteer.launch(browser_launch_config)
 
 
 class Pyppeteer(Coned):
-    def __init__(self, config: Config):
+    """
+    Pyppeteer drives headless Chromium. usage_mode picks how get_usage gets
+    the Opower payload once the dashboard has authenticated:
+
+    - "fetch" calls the usage API with fetch() from inside the page.
+    - "intercept" captures the response to the request the real-time widget
+      makes anyway, limited to the window asked for. The widget only covers
+      its default window, so windows starting before it fall back to "fetch".
+    - "navigate" opens the usage API URL and reads the JSON out of the page.
+
+    A RequestPolicy, if given, aborts every request it doesn't allow.
+    Screenshots are only taken when a step fails, unless screenshots is set.
+    """
+
+    def __init__(
+        self,
+        config: Config,
+        session: Optional[SessionCache] = None,
+        usage_mode: str = "fetch",
+        policy: Optional[RequestPolicy] = None,
+        screenshots: bool = False,
+    ):
         super().__init__(config)
+        if usage_mode not in USAGE_MODES:
+            raise ValueError(f"Unknown usage mode: {usage_mode}")
+        self.session = session
+        self.usage_mode = usage_mode
+        self.policy = policy
+        self.screenshots = screenshots
+        # local storage captured so far, by origin
+        self._local_storage = {}
+        self.opower_token = None
 
-    async def __ainit__(self):
-        browser_launch_config = {
-            "defaultViewport": {"width": 1920, "height": 1080},
-            "dumpio": False,
-            "args": ["--no-sandbox"],
-        }
-        browser = await pyppeteer.launch(browser_launch_config)
-        self.page = await browser.newPage()
+    async def __ainit__(self, context=None):
+        """
+        Open a page in context, a browser or browser context to share, or in
+        a newly launched browser.
+        """
+        if context is None:
+            context = await launch()
+        self.page = await context.newPage()
+        self.page.on("request", self._capture_token)
+        if self.policy is not None:
+            await self.page.setRequestInterception(True)
+            self.page.on(
+                "request", lambda r: asyncio.ensure_future(self._filter_request(r))
+            )
+
+    async def _filter_request(self, request):
+        if self.policy.check(request.url, request.resourceType):
+            await request.continue_()
+        else:
+            await request.abort()
+
+    def _capture_token(self, request):
+        """Remember the bearer token the Opower widget authenticates with."""
+        if not request.url.startswith(self.opower_url):
+            return
+        scheme, _, token = request.headers.get("authorization", "").partition(" ")
+        if scheme.lower() == "bearer" and token:
+            self.opower_token = token
 
     async def save_screenshot(self, filename: str):
         await self.page.screenshot(path=filename)
 
+    @_screenshot_failure
     async def login(self):
-        await self.page.goto(CONED_LOGIN_URL, {"waitUntil": "domcontentloaded"})
-        await self.page.querySelector("#form-login-email")
-        logging.info("Authenticating...")
+        if self.session is not None and await self.restore_session():
+            logging.info("Reusing saved session.")
+            return
+
+        await self.full_login()
 
-        await self.page.type("#form-login-email", self.cfg.user)
-        await self.page.type("#form-login-password", self.cfg.password)
-        await self.page.click(".submit-button"),
+        if self.session is not None:
+            await self.save_session()
 
-        mfa_form = await fetch_element(
-            self.page, ".js-login-new-device-form-selector:not(.hidden)"
+    async def save_session(self):
+        """Save the browser's cookies and session local storage."""
+        cookies = await self.page._client.send("Network.getAllCookies")
+        for origin in SESSION_ORIGINS:
+            if self.page.url.startswith(origin):
+                self._local_storage[origin] = await self.page.evaluate(
+                    "() => Object.assign({}, window.localStorage)"
+                )
+        self.session.save(
+            {"cookies": cookies["cookies"], "local_storage": self._local_storage}
         )
-        if mfa_form is None:
-            logging.error("Never got MFA prompt. Aborting!")
-            return
 
-        logging.info("Entering MFA code...")
-        mfa = await fetch_element(self.page, "#form-login-mfa-code")
-        mfa_code = pyotp.TOTP(self.cfg.totp).now()
-        await mfa.type(mfa_code)
-        await asyncio.gather(
-            self.page.waitForNavigation(),
-            self.page.click(".js-login-new-device-form .button"),
+    async def restore_session(self) -> bool:
+        """
+        Load a saved session into the browser and check that Opower still
+        accepts it by requesting the last interval of usage.
+        """
+        state = self.session.load()
+        if state is None:
+            return False
+
+        self._local_storage = state["local_storage"]
+        if state["cookies"]:
+            await self.page.setCookie(*state["cookies"])
+        # Page.evaluateOnNewDocument doesn't return the script's identifier,
+        # which is needed to remove it again.
+        injected = await self.page._client.send(
+            "Page.addScriptToEvaluateOnNewDocument",
+            {
+                "source": pyppeteer.helper.evaluationString(
+                    RESTORE_LOCAL_STORAGE_JS, self._local_storage
+                )
+            },
+        )
+
+        until = datetime.now(timezone.utc)
+        response = await self.page.goto(
+            self.usage_url(until - timedelta(minutes=15), until)
+        )
+        if response is None or not response.ok:
+            logging.info("Saved session has expired.")
+            self.session.record_expired()
+            await self._clear_session(injected["identifier"])
+            return False
+
+        self.session.record_hit()
+        return True
+
+    async def _clear_session(self, script_id):
+        """
+        Drop a restored session's cookies, local storage and the script that
+        injects it, so a full login starts from a clean browser.
+        """
+        await self.page._client.send(
+            "Page.removeScriptToEvaluateOnNewDocument", {"identifier": script_id}
         )
+        await self.page._client.send("Network.clearBrowserCookies")
+        await self.page.evaluate("() => window.localStorage.clear()")
+        self._local_storage = {}
 
-        logging.info("Pausing for auth...")
-        await self.page.waitFor(5000)
+    async def full_login(self):
+        with self.timer.step("login.form"):
+            await self.page.goto(self.login_url, {"waitUntil": "domcontentloaded"})
+            await fetch_element(self.page, "#form-login-email")
+            logging.info("Authenticating...")
 
-    async def get_usage(self) -> list[Reading]:
-        logging.info("Accessing usage page to trigger opower auth...")
-        await self.page.goto(CONED_USAGE_URL)
-        await self.page.waitFor(5000)
+            await self.page.type("#form-login-email", self.cfg.user)
+            await self.page.type("#form-login-password", self.cfg.password)
+            await self.page.click(".submit-button")
 
-        logging.info("Dismissing What's new? popup...")
-        try:
-            close_button = await fetch_element(self.page, ".popup__button-cta")
-            await close_button.click()
-        except ElementNotFound:
-            pass
+        with self.timer.step("login.mfa"):
+            try:
+                await fetch_element(
+                    self.page, ".js-login-new-device-form-selector:not(.hidden)"
+                )
+            except ElementNotFound as e:
+                logging.error("Never got MFA prompt. Aborting!")
+                raise LoginFailedException("never got MFA prompt") from e
 
-        logging.info("Fetching readings JSON...")
-        url = self.opower_usage_url
-        await self.page.goto(url)
-        await self.save_screenshot("screenshots/loggedin.png")
+            logging.info("Entering MFA code...")
+            mfa = await fetch_element(self.page, "#form-login-mfa-code")
+            mfa_code = pyotp.TOTP(self.cfg.totp).now()
+            await mfa.type(mfa_code)
 
-        data_elem = await self.page.querySelector("pre")
-        raw_data = await self.page.evaluate("(el) => el.textContent", data_elem)
-        data = json.loads(raw_data)
+            # The dashboard keeps authenticating in the background after the
+            # navigation, so wait for the network to settle.
+            logging.info("Waiting for auth...")
+            await asyncio.gather(
+                self.page.waitForNavigation(
+                    {"waitUntil": "networkidle2", "timeout": DEFAULT_TIMEOUT}
+                ),
+                self.page.click(".js-login-new-device-form .button"),
+            )
+
+    async def auth_credentials(self) -> dict:
+        """
+        Return what an HTTP client needs to call Opower directly: every
+        browser cookie and the Opower bearer token, if one has been seen.
+        """
+        if self.opower_token is None:
+            await self.authorize_opower()
+        cookies = await self.page._client.send("Network.getAllCookies")
+        return {"cookies": cookies["cookies"], "token": self.opower_token}
+
+    async def authorize_opower(self):
+        with self.timer.step("opower.auth"):
+            logging.info("Accessing usage page to trigger opower auth...")
+            # The real-time widget calls Opower once it has authenticated.
+            await asyncio.gather(
+                self.page.waitForResponse(
+                    lambda r: r.url.startswith(self.opower_url),
+                    {"timeout": DEFAULT_TIMEOUT},
+                ),
+                self.page.goto(self.dashboard_url, {"waitUntil": "domcontentloaded"}),
+            )
+
+            logging.info("Dismissing What's new? popup...")
+            try:
+                close_button = await fetch_element(
+                    self.page, ".popup__button-cta", timeout=POPUP_TIMEOUT
+                )
+                await close_button.click()
+            except ElementNotFound:
+                pass
+
+    async def _limit_intercepted(
+        self,
+        readings: list[Reading],
+        since: Optional[datetime],
+        until: Optional[datetime],
+    ) -> list[Reading]:
+        """
+        Limit the readings the widget asked for to those overlapping [since,
+        until). The widget only ever asks for its own default window, so when
+        that starts after since the window is fetched from the page instead.
+        """
+        if since is not None and (
+            not readings or min(r.start_time for r in readings) > since
+        ):
+            with self.timer.step("usage.fetch"):
+                logging.info("Fetching readings JSON (fetch)...")
+                raw_data = await self.page.evaluate(
+                    FETCH_USAGE_JS, self.usage_url(since, until), self.opower_token
+                )
+            with self.timer.step("usage.parse"):
+                return list(iter_readings(raw_data))
+        return [
+            r
+            for r in readings
+            if (since is None or r.end_time > since)
+            and (until is None or r.start_time < until)
+        ]
+
+    @_screenshot_failure
+    async def get_usage(
+        self, since: Optional[datetime] = None, until: Optional[datetime] = None
+    ) -> list[Reading]:
+        mode = self.usage_mode
+        if mode == "intercept":
+            # Catch the usage response the real-time widget requests while
+            # the dashboard loads, instead of asking for it again.
+            response, _ = await asyncio.gather(
+                self.page.waitForResponse(
+                    lambda r: r.url.startswith(self.opower_usage_url),
+                    {"timeout": DEFAULT_TIMEOUT},
+                ),
+                self.authorize_opower(),
+            )
+        else:
+            await self.authorize_opower()
+
+        with self.timer.step("usage.fetch"):
+            logging.info(f"Fetching readings JSON ({mode})...")
+            if mode == "intercept":
+                raw_data = await response.buffer()
+            elif mode == "fetch":
+                raw_data = await self.page.evaluate(
+                    FETCH_USAGE_JS, self.usage_url(since, until), self.opower_token
+                )
+            else:
+                await self.page.goto(self.usage_url(since, until))
+                if self.screenshots:
+                    await self.save_screenshot("screenshots/loggedin.png")
+                data_elem = await self.page.querySelector("pre")
+                raw_data = await self.page.evaluate("(el) => el.textContent", data_elem)
+
+        with self.timer.step("usage.parse"):
+            readings = list(iter_readings(raw_data))
+        if mode == "intercept" and (since is not None or until is not None):
+            readings = await self._limit_intercepted(readings, since, until)
+
+        # Opower's cookies only exist once its auth has run, so save again.
+        if self.session is not None:
+            await self.save_session()
 
         # await self.browser.close()
         logging.info("Done!")
 
-        return data
+        return readings
 
 
 class ElementNotFound(Exception):
     pass
 
 
-async def fetch_element(page, selector, max_tries=10):
-    tries = 0
-    el = None
-    while el is None and tries < max_tries:
-        el = await page.querySelector(selector)
-        await page.waitFor(1000)
+class LoginFailedException(Exception):
+    pass
 
-    if el is None:
-        raise ElementNotFound
 
-    return el
+async def fetch_element(page, selector, timeout=DEFAULT_TIMEOUT):
+    """
+    Wait up to timeout milliseconds for selector to appear on the page and
+    return it, or raise ElementNotFound.
+    """
+    try:
+        return await page.waitForSelector(selector, {"timeout": timeout})
+    except pyppeteer.errors.TimeoutError:
+        raise ElementNotFound(selector)
@@ -5,22 +5,57 @@ class Reading:
     """
     Reading represents an energy reading over an interval. It is essentially
     the same in concept as an ESPI IntervalBlock.
+
+    Alongside its datetimes, a Reading keeps its bounds as whole seconds
+    since the epoch in start and end, which is what it is compared, hashed
+    and checked for overlaps by, so the datetimes must be timezone-aware and
+    fall on a whole second. Readings are treated as immutable, so the
+    hash and bucket key are computed once.
     """
 
+    __slots__ = ("start_time", "end_time", "wh", "start", "end", "_hash", "_bucket")
+
     def __init__(self, start_time, end_time, unit, value):
+        for t in (start_time, end_time):
+            # start and end are whole epoch seconds, which need a fixed
+            # instant that falls on a second
+            if t.utcoffset() is None:
+                raise ValueError("start_time and end_time must be timezone-aware.")
+            if t.microsecond:
+                raise ValueError("start_time and end_time must be whole seconds.")
+
         if start_time >= end_time:
             raise ValueError("end_time must be after start_time.")
 
-        self.start_time = start_time
-        self.end_time = end_time
-
         if unit.lower() not in ENERGY_UNITS:
             raise ValueError("Invalid unit: use only Wh or kWh.")
 
         if unit.lower() == "kwh":
             value = value * 1000
 
+        self.start_time = start_time
+        self.end_time = end_time
         self.wh = value
+        self.start = int(start_time.timestamp())
+        self.end = int(end_time.timestamp())
+        self._hash = None
+        self._bucket = None
+
+    @classmethod
+    def _from_epoch(cls, start_time, end_time, wh, start: int, end: int):
+        """
+        Build a Reading in Wh whose epoch bounds are already known, skipping
+        validation.
+        """
+        reading = cls.__new__(cls)
+        reading.start_time = start_time
+        reading.end_time = end_time
+        reading.wh = wh
+        reading.start = start
+        reading.end = end
+        reading._hash = None
+        reading._bucket = None
+        return reading
 
     @classmethod
     def combine(cls, a, b):
@@ -35,27 +70,38 @@ class Reading:
         return self.end_time - self.start_time
 
     def overlaps(self, other):
+        start, end = self.start, self.end
+        other_start, other_end = other.start, other.end
         return (
-            (self.start_time < other.start_time and self.end_time > other.start_time)
-            or (other.start_time < self.start_time and other.end_time > self.start_time)
-            or (self.start_time == other.start_time or self.end_time == other.end_time)
+            start == other_start
+            or end == other_end
+            or start < other_start < end
+            or other_start < start < other_end
         )
 
     def hash_bucket(self):
-        return str(self.start_time.date())
+        bucket = self._bucket
+        if bucket is None:
+            bucket = self._bucket = str(self.start_time.date())
+        return bucket
 
     def __eq__(self, them):
         return (
-            isinstance(them, type(self))
-            and self.__equality_set__() == them.__equality_set__()
+            isinstance(them, Reading)
+            and self.start == them.start
+            and self.end == them.end
+            and self.wh == them.wh
         )
 
     def __equality_set__(self):
         """Return the set of values that define my difference from others."""
-        return (self.start_time, self.end_time, self.wh)
+        return (self.start, self.end, self.wh)
 
     def __hash__(self):
-        return hash((self.start_time, self.end_time, self.wh))
+        h = self._hash
+        if h is None:
+            h = self._hash = hash((self.start, self.end, self.wh))
+        return h
 
     def __str__(self):
         return f"Reading @ {self.start_time} ({self.duration()}): {self.wh} Wh"
@@ -0,0 +1,146 @@
+from collections import OrderedDict
+from datetime import timedelta
+
+from .aggregate import Aggregate
+
+# Roughly a year and a month of days, so the current and previous billing
+# periods stay warm.
+DEFAULT_MAX_DAYS = 400
+
+
+def _add(agg: Aggregate, wh: float, demand: float):
+    agg.total += wh
+    agg.count += 1
+    agg.mean = agg.total / agg.count
+    agg.peak = max(agg.peak, demand)
+
+
+class DayRollup:
+    """DayRollup holds the totals of one bucket: the whole day and each hour."""
+
+    __slots__ = ("day", "hours")
+
+    def __init__(self):
+        self.day = None
+        # hour start -> Aggregate
+        self.hours = {}
+
+    def add(self, reading):
+        wh = reading.wh
+        demand = wh * 3600 / (reading.end_time - reading.start_time).total_seconds()
+
+        hour = reading.start_time.replace(minute=0, second=0, microsecond=0)
+        agg = self.hours.get(hour)
+        if agg is None:
+            self.hours[hour] = Aggregate(
+                hour, hour + timedelta(hours=1), wh, wh, demand, 1
+            )
+        else:
+            _add(agg, wh, demand)
+
+        if self.day is None:
+            midnight = hour.replace(hour=0)
+            self.day = Aggregate(
+                midnight, midnight + timedelta(days=1), wh, wh, demand, 1
+            )
+        else:
+            _add(self.day, wh, demand)
+
+
+class RollupCache:
+    """
+    RollupCache keeps hourly and daily totals for a store's buckets, and
+    derives monthly totals from them, so repeated dashboard queries don't
+    rescan raw readings. Days are computed from the store on first use and
+    then kept up to date from the store's change notifications: inserted
+    readings, including ones Opower had previously reported as null, are
+    folded into the cached day, and any other change to a bucket drops it.
+    At most max_days days are cached, evicting the least recently used.
+
+    Periods follow the UTC offset readings were reported in, like
+    hash_bucket and resample() with no tz.
+    """
+
+    def __init__(self, store, max_days: int = DEFAULT_MAX_DAYS):
+        self.store = store
+        self.max_days = max_days
+        # bucket key -> DayRollup, least recently used first
+        self._days = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        store.subscribe(self._on_change)
+
+    def _on_change(self, key: str, added):
+        rollup = self._days.get(key)
+        if rollup is None:
+            return
+        if added is None:
+            del self._days[key]
+            return
+        for r in added:
+            rollup.add(r)
+
+    def _get(self, key: str) -> DayRollup:
+        rollup = self._days.get(key)
+        if rollup is not None:
+            self.hits += 1
+            self._days.move_to_end(key)
+            return rollup
+
+        self.misses += 1
+        rollup = DayRollup()
+        for r in self.store.get_bucket(key):
+            rollup.add(r)
+        self._days[key] = rollup
+        while len(self._days) > self.max_days:
+            self._days.popitem(last=False)
+        return rollup
+
+    def _has(self, key: str) -> bool:
+        return key in self._days or self.store.bucket_keys(key, key + "\0") == [key]
+
+    def day(self, key: str):
+        """Return the Aggregate of the day with bucket key, or None."""
+        if not self._has(key):
+            return None
+        return self._get(key).day
+
+    def hourly(self, key: str) -> list:
+        """Return the hourly Aggregates of the day with bucket key, in order."""
+        if not self._has(key):
+            return []
+        hours = self._get(key).hours
+        return [hours[h] for h in sorted(hours)]
+
+    def daily(self, month: str) -> list:
+        """
+        Return the daily Aggregates of a month given as "YYYY-MM", in order.
+        This costs one lookup per day with readings.
+        """
+        out = []
+        for key in self.store.bucket_keys(month, month + "-32"):
+            agg = self._get(key).day
+            if agg is not None:
+                out.append(agg)
+        return out
+
+    def monthly(self, month: str):
+        """Return the Aggregate of a month given as "YYYY-MM", or None."""
+        days = self.daily(month)
+        if not days:
+            return None
+        first = days[0].start
+        next_month = (first.replace(day=28) + timedelta(days=4)).replace(day=1)
+        total = sum(d.total for d in days)
+        count = sum(d.count for d in days)
+        return Aggregate(
+            first.replace(day=1),
+            next_month,
+            total,
+            total / count,
+            max(d.peak for d in days),
+            count,
+        )
+
+    def stats(self) -> dict:
+        return {"days": len(self._days), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,142 @@
+import asyncio
+from contextlib import asynccontextmanager
+import logging
+
+from .coned import Config
+from .metrics import METRICS, sample_browser_rss
+from .session import SessionCache
+from .store import BucketList
+
+DEFAULT_POOL_SIZE = 4
+
+
+class BrowserPool:
+    """
+    BrowserPool shares one browser between scrapers. Each scraper gets its
+    own incognito context, so cookies and storage never leak between
+    accounts, and at most size contexts are open at once. Create it inside
+    the event loop that will use it.
+    """
+
+    def __init__(self, size: int = DEFAULT_POOL_SIZE, launch=None):
+        if launch is None:
+            from .pyppeteer import launch
+        self.size = size
+        self._launch = launch
+        self._browser = None
+        self._lock = asyncio.Lock()
+        self._slots = asyncio.Semaphore(size)
+
+    async def _get_browser(self):
+        async with self._lock:
+            if self._browser is None:
+                self._browser = await self._launch()
+            return self._browser
+
+    @asynccontextmanager
+    async def context(self):
+        async with self._slots:
+            browser = await self._get_browser()
+            ctx = await browser.createIncognitoBrowserContext()
+            try:
+                yield ctx
+            finally:
+                if METRICS.enabled:
+                    sample_browser_rss(browser)
+                await ctx.close()
+
+    async def close(self):
+        async with self._lock:
+            if self._browser is not None:
+                await self._browser.close()
+                self._browser = None
+
+
+def meter_key(config: Config) -> str:
+    return f"{config.account_id}-{config.meter}"
+
+
+class _Meters:
+    """
+    _Meters holds what Scheduler and Daemon share: the configured meters,
+    each meter's store, and how to build and sync a Coned for a meter. With
+    upsert, corrections Opower publishes for intervals in the sync lookback
+    replace the stored values.
+    """
+
+    def __init__(
+        self,
+        configs,
+        store_factory=None,
+        coned=None,
+        coned_options=None,
+        upsert: bool = False,
+    ):
+        if coned is None:
+            from .pyppeteer import Pyppeteer as coned
+        self.configs = list(configs)
+        # extra keyword arguments for every Coned, such as a RequestPolicy
+        self.coned_options = coned_options or {}
+        self._store_factory = store_factory or (lambda config: BucketList())
+        self._coned = coned
+        self.upsert = upsert
+        # meter key -> store
+        self.stores = {}
+
+    def store_for(self, config: Config):
+        key = meter_key(config)
+        if key not in self.stores:
+            self.stores[key] = self._store_factory(config)
+        return self.stores[key]
+
+    def _new_coned(self, config: Config):
+        return self._coned(
+            config, SessionCache.from_config(config), **self.coned_options
+        )
+
+
+class Scheduler(_Meters):
+    """
+    Scheduler scrapes several accounts and meters concurrently through a
+    shared BrowserPool, syncing each meter into its own store. A failure in
+    one account does not affect the others. Each policy passed through
+    coned_options is shared, so its counts cover every scrape.
+    """
+
+    def __init__(
+        self,
+        configs,
+        pool: BrowserPool,
+        store_factory=None,
+        coned=None,
+        coned_options=None,
+        upsert: bool = False,
+    ):
+        super().__init__(configs, store_factory, coned, coned_options, upsert)
+        self.pool = pool
+
+    async def scrape(self, config: Config):
+        async with self.pool.context() as ctx:
+            coned = self._new_coned(config)
+            await coned.__ainit__(ctx)
+            try:
+                await coned.login()
+                return await coned.sync(self.store_for(config), upsert=self.upsert)
+            finally:
+                logging.info(f"{meter_key(config)} timings: {coned.timer.as_dict()}")
+
+    async def run_once(self) -> dict:
+        """
+        Scrape every configured meter once. Returns each meter's InsertResult,
+        or the exception its scrape raised, keyed by meter key.
+        """
+        results = await asyncio.gather(
+            *(self.scrape(c) for c in self.configs), return_exceptions=True
+        )
+        out = {}
+        for config, result in zip(self.configs, results):
+            key = meter_key(config)
+            if isinstance(result, BaseException):
+                logging.error(f"Scraping {key} failed: {result!r}")
+            out[key] = result
+        return out
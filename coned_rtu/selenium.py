@@ -1,6 +1,7 @@
-import time
+import asyncio
 import datetime
 import functools
+from typing import Optional
 
 import pyotp
 from selenium import webdriver
@@ -9,33 +10,22 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import WebDriverWait
 
-from .coned import Coned, Config, CONED_USAGE_URL
+from .coned import Coned, Config, _screenshot_failure
+from .parser import iter_readings
+from .policy import RequestPolicy
+from .reading import Reading
 
 DEFAULT_TIMEOUT = 120
+# How often to re-check a wait condition, in seconds.
+POLL_FREQUENCY = 0.25
 
 
 class LoginFailedException(Exception):
     pass
 
 
-def _screenshot_failure(f):
-    """Saves a screenshot if an error occurs. Only decorate Coned instance
-    functions, because we assume presence of self."""
-
-    @functools.wraps(f)
-    def wrapper(*args, **kwargs):
-        try:
-            return f(*args, **kwargs)
-        except Exception as e:
-            self = args[0]
-            self.save_screenshot("error.png")
-            raise e
-
-    return wrapper
-
-
 class Selenium(Coned):
-    def __init__(self, config: Config):
+    def __init__(self, config: Config, policy: Optional[RequestPolicy] = None):
         super().__init__(config)
 
         options = webdriver.ChromeOptions()
@@ -50,152 +40,146 @@ class Selenium(Coned):
         # https://stackoverflow.com/a/53970825
         options.add_argument("--disable-dev-shm-usage")
 
+        # Selenium can't intercept requests, so apply the policy through
+        # Chrome's host resolver and content settings instead.
+        if policy is not None:
+            for arg in policy.chrome_args():
+                options.add_argument(arg)
+
         self.driver = webdriver.Chrome(chrome_options=options)
 
     async def save_screenshot(self, filename):
-        time = datetime.datetime.now().isoformat()
-        path = f"screenshots/{filename}-{time}.png"
         self.driver.set_window_size(1920, 1080)
-        self.driver.save_screenshot(path)
+        self.driver.save_screenshot(filename)
 
     @_screenshot_failure
     async def login(self):
         # Try to load the Billing and Usage page. If we find ourselves at the
         # login page, then we need to login. If not, we have nothing to do.
-        self.driver.get(CONED_USAGE_URL)
-        if not self.at_login_page():
+        await self._run(self.driver.get, self.dashboard_url)
+        if not await self._run(self.at_login_page):
             return
 
         # Submit the login form
-        self.driver.find_element_by_id("form-login-email").send_keys(self.cfg.user)
-        self.driver.find_element_by_id("form-login-password").send_keys(
-            self.cfg.password
-        )
-        self.driver.find_element_by_id("form-login-password").submit()
+        await self._run(self._submit_login)
 
         # Wait for login form to get to 2FA step.
         try:
-            tfa_field = WebDriverWait(self.driver, DEFAULT_TIMEOUT).until(
+            tfa_field = await self._wait_until(
                 EC.element_to_be_clickable((By.ID, "form-login-mfa-code"))
             )
         except TimeoutException as e:
             # If it times out, it's probably due to bad credentials.
-            if self.is_bad_login():
+            if await self._run(self.is_bad_login):
                 raise LoginFailedException
             else:
                 raise e
 
         # Submit 2FA form
         totp = pyotp.TOTP(self.cfg.totp)
-        tfa_field.send_keys(totp.now())
-        tfa_field.submit()
+        await self._run(tfa_field.send_keys, totp.now())
+        await self._run(tfa_field.submit)
 
         # Wait for dashboard to appear
-        WebDriverWait(self.driver, DEFAULT_TIMEOUT).until(
+        await self._wait_until(
             EC.element_to_be_clickable((By.XPATH, "//button[@data-value='overview']"))
         )
 
         # If prompted to select service address, use maid id to resolve
         try:
-            _ = WebDriverWait(self.driver, 2).until(  # noqa: F841
+            await self._wait_until(
                 EC.presence_of_element_located(
                     (
                         By.XPATH,
                         "//div[contains(@class, 'account-focus__accounts-container')]",
                     )
-                )
+                ),
+                timeout=2,
             )
-            account_button = WebDriverWait(self.driver, 5).until(
+            account_button = await self._wait_until(
                 EC.element_to_be_clickable(
                     (By.XPATH, f"//button[@data-maid='{self.cfg.maid}']")
-                )
+                ),
+                timeout=5,
             )
-            account_button.click()
+            await self._run(account_button.click)
         except TimeoutException:
             pass
 
         # If the "What's new?" popup appears, close it
         try:
-            close_popup_button = WebDriverWait(self.driver, 2).until(
+            close_popup_button = await self._wait_until(
                 EC.presence_of_element_located(
                     (
                         By.XPATH,
                         "//a[contains(@class, 'popup__button-cta')]",
                     )
-                )
+                ),
+                timeout=2,
             )
-            close_popup_button.click()
+            await self._run(close_popup_button.click)
         except TimeoutException:
             pass
 
-    @_screenshot_failure
-    async def get_usage(self):
-        self.driver.get(CONED_USAGE_URL)
-
-        # Go to "real time usage"
-        rtu_button = WebDriverWait(self.driver, DEFAULT_TIMEOUT).until(
-            EC.element_to_be_clickable(
-                (By.XPATH, "//button[@data-value='sectionRealTimeData']")
-            )
-        )
-        rtu_button.click()
-
-        # This never takes less than at least 5 seconds.
-        time.sleep(5.0)
-
-        # Select custom element that contains the shadow DOM.
-        # sdom = WebDriverWait(self.driver, DEFAULT_TIMEOUT).until(
-        #     EC.element_to_be_clickable((By.TAG_NAME, "opower-widget-real-time-ami"))
-        # )
-
-        # sroot = self.driver.execute_script("return arguments[0].shadowRoot", sdom)
-        sroot = self.driver.execute_script(
-            'return document.querySelector("opower-widget-real-time-ami").shadowRoot.querySelector("div.usage-export-content").shadowRoot'  # noqa
+    def _submit_login(self):
+        self.driver.find_element_by_id("form-login-email").send_keys(self.cfg.user)
+        self.driver.find_element_by_id("form-login-password").send_keys(
+            self.cfg.password
         )
-        print(sroot)
-
-        for _ in range(3):
-            # This never takes less than 5 seconds.
-            time.sleep(5.0)
-
-            try:
-                linkdiv = sroot.find_element_by_class_name("usage-export-content'")
-                break
-            except NoSuchElementException:
-                pass
-
-        print(linkdiv)
-
-        return
-
-        # Wait for "Download your real-time usage" in the iframe to appear so
-        # that it triggers authentication on the opower side
-        # iframe = WebDriverWait(self.driver, DEFAULT_TIMEOUT).until(
-        #     EC.presence_of_element_located(
-        #         (By.XPATH, "//*[@id='sectionRealTimeData']")
-        #     )
-        # )
+        self.driver.find_element_by_id("form-login-password").submit()
 
-        self.save_screenshot("wait iframe")
+    @_screenshot_failure
+    async def get_usage(
+        self,
+        since: Optional[datetime.datetime] = None,
+        until: Optional[datetime.datetime] = None,
+    ) -> list[Reading]:
+        with self.timer.step("opower.auth"):
+            await self._run(self.driver.get, self.dashboard_url)
+
+            # Go to "real time usage"
+            rtu_button = await self._wait_until(
+                EC.element_to_be_clickable(
+                    (By.XPATH, "//button[@data-value='sectionRealTimeData']")
+                )
+            )
+            await self._run(rtu_button.click)
+
+            # The widget authenticates with Opower as it renders, so wait for
+            # its nested shadow root instead of sleeping; the script returns
+            # null until both custom elements have rendered.
+            await self._wait_until(
+                lambda d: d.execute_script(
+                    'return document.querySelector("opower-widget-real-time-ami")?.shadowRoot?.querySelector("div.usage-export-content")?.shadowRoot'  # noqa
+                )
+            )
 
-        # link = WebDriverWait(self.driver, DEFAULT_TIMEOUT).until(
-        #     EC.element_to_be_clickable(
-        #         (iframe.find_element_by_id("download-link"))
-        #     )
-        # )
+        with self.timer.step("usage.fetch"):
+            # Chrome shows the JSON response as text in a <pre>.
+            await self._run(self.driver.get, self.usage_url(since, until))
+            raw_data = await self._run(
+                lambda: self.driver.find_element_by_tag_name("pre").text
+            )
 
-        # cookies = self.driver.get_cookies()
+        with self.timer.step("usage.parse"):
+            return list(iter_readings(raw_data))
 
-        # url = link.get_attribute("href")
-        # resp = requests.get(url)
+    async def _run(self, f, *args):
+        """
+        Run a blocking driver call in the default executor, so navigations
+        and waits don't block the event loop.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(f, *args))
 
-        # Get the usage from opower
-        self.driver.get(self.opower_usage_url())
-        self.save_screenshot("aaa")
-        # return shadow_root.find_element_by_tag_name("body").text
-        return
+    async def _wait_until(self, condition, timeout=DEFAULT_TIMEOUT):
+        """
+        Poll condition with the driver until it returns something truthy,
+        without blocking the event loop.
+        """
+        wait = WebDriverWait(self.driver, timeout, poll_frequency=POLL_FREQUENCY)
+        return await self._run(wait.until, condition)
 
-    @_screenshot_failure
     def at_login_page(self):
         """
         at_login_page returns whether the driver is at the ConEd login
@@ -207,7 +191,6 @@ class Selenium(Coned):
         except NoSuchElementException:
             return False
 
-    @_screenshot_failure
     def is_bad_login(self):
         """
         is_bad_login returns whether there is a failed login indicator
@@ -0,0 +1,236 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from .reading import ENERGY_UNITS, Reading
+
+# timezone objects are shared between rows, keyed by UTC offset in seconds
+_TZ_CACHE = {}
+
+
+def _tz(offset):
+    tz = _TZ_CACHE.get(offset)
+    if tz is None:
+        tz = timezone(timedelta(seconds=offset))
+        _TZ_CACHE[offset] = tz
+    return tz
+
+
+def _to_datetime(epoch, offset):
+    return datetime.fromtimestamp(int(epoch), _tz(int(offset)))
+
+
+class ReadingSeries:
+    """
+    ReadingSeries is a columnar sequence of Readings. Interval bounds are
+    stored as int64 seconds since the epoch, together with the UTC offset each
+    interval was reported in, and energy is stored as float64 Wh. Rows are
+    materialized on demand as ReadingView objects, and slicing returns a new
+    series over views of the same arrays.
+    """
+
+    __slots__ = ("start", "end", "wh", "offset")
+
+    def __init__(self, start, end, wh, unit="wh", offset=0):
+        start = np.asarray(start, dtype=np.int64)
+        end = np.asarray(end, dtype=np.int64)
+        wh = np.asarray(wh, dtype=np.float64)
+        if start.ndim != 1 or start.shape != end.shape or start.shape != wh.shape:
+            raise ValueError("start, end and wh must be 1-d arrays of equal length.")
+
+        if np.any(start >= end):
+            raise ValueError("end_time must be after start_time.")
+
+        if unit.lower() not in ENERGY_UNITS:
+            raise ValueError("Invalid unit: use only Wh or kWh.")
+
+        if unit.lower() == "kwh":
+            wh = wh * 1000
+
+        offset = np.asarray(offset, dtype=np.int32)
+        if offset.ndim == 0:
+            offset = np.full(start.shape, offset, dtype=np.int32)
+        elif offset.shape != start.shape:
+            raise ValueError("offset must be a scalar or match the length of start.")
+
+        self.start = start
+        self.end = end
+        self.wh = wh
+        self.offset = offset
+
+    @classmethod
+    def _wrap(cls, start, end, wh, offset):
+        """Build a series from already validated arrays without copying."""
+        series = cls.__new__(cls)
+        series.start = start
+        series.end = end
+        series.wh = wh
+        series.offset = offset
+        return series
+
+    @classmethod
+    def empty(cls):
+        return cls._wrap(
+            np.empty(0, dtype=np.int64),
+            np.empty(0, dtype=np.int64),
+            np.empty(0, dtype=np.float64),
+            np.empty(0, dtype=np.int32),
+        )
+
+    @classmethod
+    def from_readings(cls, readings):
+        starts, ends, whs, offsets = [], [], [], []
+        for r in readings:
+            offset = r.start_time.utcoffset()
+            if offset is None:
+                raise ValueError("Reading times must be timezone-aware.")
+            starts.append(r.start)
+            ends.append(r.end)
+            whs.append(r.wh)
+            offsets.append(int(offset.total_seconds()))
+        return cls(starts, ends, whs, offset=offsets)
+
+    @classmethod
+    def concat(cls, series):
+        series = list(series)
+        if not series:
+            return cls.empty()
+        if len(series) == 1:
+            return series[0]
+        return cls._wrap(
+            np.concatenate([s.start for s in series]),
+            np.concatenate([s.end for s in series]),
+            np.concatenate([s.wh for s in series]),
+            np.concatenate([s.offset for s in series]),
+        )
+
+    @property
+    def nbytes(self):
+        return self.start.nbytes + self.end.nbytes + self.wh.nbytes + self.offset.nbytes
+
+    def to_readings(self):
+        """Materialize every row as an independent Reading."""
+        return [
+            Reading._from_epoch(_to_datetime(s, o), _to_datetime(e, o), w, s, e)
+            for s, e, w, o in zip(
+                self.start.tolist(),
+                self.end.tolist(),
+                self.wh.tolist(),
+                self.offset.tolist(),
+            )
+        ]
+
+    def __len__(self):
+        return len(self.start)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield ReadingView(self, i)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return self._wrap(
+                self.start[key], self.end[key], self.wh[key], self.offset[key]
+            )
+
+        i = int(key)
+        n = len(self)
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError("ReadingSeries index out of range")
+        return ReadingView(self, i)
+
+    def __str__(self):
+        return f"ReadingSeries of {len(self)} readings"
+
+    def __repr__(self):
+        return str(self)
+
+
+class ReadingView(Reading):
+    """
+    ReadingView is a Reading backed by one row of a ReadingSeries. It holds
+    only a reference to the series and its row index.
+    """
+
+    __slots__ = ("_series", "_index")
+
+    def __init__(self, series, index):
+        self._series = series
+        self._index = index
+        self._hash = None
+        self._bucket = None
+
+    @property
+    def start(self):
+        return int(self._series.start[self._index])
+
+    @property
+    def end(self):
+        return int(self._series.end[self._index])
+
+    @property
+    def start_time(self):
+        s = self._series
+        return _to_datetime(s.start[self._index], s.offset[self._index])
+
+    @property
+    def end_time(self):
+        s = self._series
+        return _to_datetime(s.end[self._index], s.offset[self._index])
+
+    @property
+    def wh(self):
+        return float(self._series.wh[self._index])
+
+
+def _merge_series(series: ReadingSeries):
+    """
+    Sort a series by start time, keeping the order rows arrived in for
+    equal starts, and drop the ones BucketList.insert_many would:
+    copies of a kept reading are deduplicated, and readings that overlap a
+    kept one are rejected. Returns the kept series and both counts.
+    """
+    order = np.argsort(series.start, kind="stable")
+    start, end, wh = series.start[order], series.end[order], series.wh[order]
+    offset = series.offset[order]
+
+    # Usually the only thing to drop is copies, which sort right after the
+    # reading they copy. Otherwise, walk the series like insert_many does.
+    copy = np.zeros(len(start), dtype=bool)
+    copy[1:] = (start[1:] == start[:-1]) & (end[1:] == end[:-1]) & (wh[1:] == wh[:-1])
+    keep = ~copy
+    deduplicated = int(copy.sum())
+    rejected = 0
+    if np.any(start[keep][1:] < end[keep][:-1]):
+        keep = np.zeros(len(start), dtype=bool)
+        deduplicated = 0
+        last = None
+        for i, (s, e, w) in enumerate(zip(start.tolist(), end.tolist(), wh.tolist())):
+            if last is not None and (s, e, w) == last:
+                deduplicated += 1
+            elif last is not None and (s < last[1] or s == last[0] or e == last[1]):
+                rejected += 1
+            else:
+                keep[i] = True
+                last = (s, e, w)
+
+    start, end, wh, offset = start[keep], end[keep], wh[keep], offset[keep]
+    return ReadingSeries._wrap(start, end, wh, offset), deduplicated, rejected
+
+
+def _hash_buckets(series: ReadingSeries) -> list:
+    """The hash_bucket of every row: the local date of its start."""
+    days = (series.start + series.offset) // 86400
+    return days.astype("datetime64[D]").astype(str).tolist()
+
+
+def _spans(series: ReadingSeries):
+    """The (start, end) of each run of back-to-back rows of a sorted series."""
+    if not len(series):
+        return []
+    breaks = np.flatnonzero(series.start[1:] != series.end[:-1]) + 1
+    firsts = np.concatenate(([0], breaks))
+    lasts = np.concatenate((breaks, [len(series)])) - 1
+    return zip(series.start[firsts].tolist(), series.end[lasts].tolist())
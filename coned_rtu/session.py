@@ -0,0 +1,101 @@
+import base64
+import hashlib
+import json
+import logging
+import os
+from typing import Optional
+
+from cryptography.fernet import Fernet, InvalidToken
+
+# Sessions older than this are not worth validating; ConEd expires them well
+# before then.
+DEFAULT_MAX_AGE = 12 * 60 * 60
+
+
+def derive_key(secret: str) -> bytes:
+    """Derive a Fernet key from a secret such as the account credentials."""
+    digest = hashlib.pbkdf2_hmac(
+        "sha256", secret.encode(), b"coned_rtu session", 100_000
+    )
+    return base64.urlsafe_b64encode(digest)
+
+
+class SessionCache:
+    """
+    SessionCache keeps an authenticated browser session (cookies and local
+    storage) in an encrypted file, so that later runs can skip the login and
+    MFA flow. It counts hits, misses and expired sessions.
+    """
+
+    def __init__(self, path: str, key: bytes, max_age: int = DEFAULT_MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+        self._fernet = Fernet(key)
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+
+    @classmethod
+    def from_config(cls, config) -> Optional["SessionCache"]:
+        """Build the cache a Config asks for, or None if it has no session file."""
+        if not config.session_file:
+            return None
+        key = config.session_key
+        if key is None:
+            key = derive_key(config.user + config.password + config.totp)
+        return cls(config.session_file, key)
+
+    def load(self) -> Optional[dict]:
+        """
+        Return the saved session state, or None if there is no usable one.
+        A missing, unreadable or stale file counts as a miss.
+        """
+        try:
+            with open(self.path, "rb") as f:
+                token = f.read()
+            data = self._fernet.decrypt(token, ttl=self.max_age)
+            return json.loads(data)
+        except FileNotFoundError:
+            pass
+        except (InvalidToken, ValueError):
+            logging.info("Discarding unusable saved session.")
+        self.misses += 1
+        return None
+
+    def save(self, state: dict):
+        token = self._fernet.encrypt(json.dumps(state).encode())
+        tmp_path = self.path + ".tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(token)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def record_hit(self):
+        self.hits += 1
+
+    def record_expired(self):
+        """The saved session loaded fine but the server no longer accepts it."""
+        self.expired += 1
+        self.misses += 1
+        self.clear()
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "saved_at": _mtime(self.path),
+        }
+
+
+def _mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except FileNotFoundError:
+        return None
@@ -0,0 +1,265 @@
+import csv
+import gzip
+import itertools
+import os
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .series import ReadingSeries, _to_datetime
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+DEFAULT_BATCH_SIZE = 10_000
+CSV_HEADER = ("start_time", "end_time", "wh")
+
+
+class Watermark:
+    """
+    Watermark remembers the sequence number of the last store change
+    exported, so repeated exports write only what the store stored after
+    it, however old those readings are. With a path, it is kept in a file
+    between runs, which is only meaningful for a store whose sequence
+    numbers survive restarts, such as DiskStore.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.seq = 0
+        if path is not None and os.path.exists(path):
+            with open(path) as f:
+                text = f.read().strip()
+            if text:
+                self.seq = int(text)
+
+    def advance(self, seq: int):
+        if seq > self.seq:
+            self.seq = seq
+
+    def save(self):
+        if self.path is None:
+            return
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(f"{self.seq}\n")
+        os.replace(tmp_path, self.path)
+
+
+def _batches(parts, batch_size):
+    """
+    Regroup (series, seqs) parts into ReadingSeries of batch_size rows, the
+    last one possibly shorter, each with the sequence number of its last
+    row, or None when the parts have no sequence numbers.
+    """
+    pending, n = [], 0
+    for series, seqs in parts:
+        i = 0
+        while i < len(series):
+            j = min(i + batch_size - n, len(series))
+            pending.append((series[i:j], None if seqs is None else int(seqs[j - 1])))
+            n += j - i
+            i = j
+            if n == batch_size:
+                yield ReadingSeries.concat(s for s, _ in pending), pending[-1][1]
+                pending, n = [], 0
+    if pending:
+        yield ReadingSeries.concat(s for s, _ in pending), pending[-1][1]
+
+
+def _stored(store):
+    """
+    Yield every reading in store in start order, one bucket at a time. A
+    DiskStore's buckets are read as columns; BucketList buckets are
+    converted from their Readings.
+    """
+    columnar = hasattr(store, "bucket_series")
+    for key in store.bucket_keys():
+        if columnar:
+            yield store.bucket_series(key), None
+        else:
+            yield ReadingSeries.from_readings(store.get_bucket(key)), None
+
+
+def _changed(store, seq, batch_size):
+    """
+    Yield the readings stored after seq with their sequence numbers, as
+    columnar journal chunks for a DiskStore, or batch_size changes at a time
+    otherwise.
+    """
+    if hasattr(store, "series_since"):
+        yield from store.series_since(seq)
+        return
+    changes = iter(store.changes_since(seq))
+    while True:
+        batch = list(itertools.islice(changes, batch_size))
+        if not batch:
+            return
+        yield (
+            ReadingSeries.from_readings([c.new for c in batch]),
+            [c.seq for c in batch],
+        )
+
+
+def export(
+    store,
+    sink,
+    watermark: Optional[Watermark] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> int:
+    """
+    Write the store's readings to sink in batches of at most batch_size,
+    reading the store a bucket or a chunk of its change log at a time, and
+    return how many were written. Without a watermark every stored reading
+    is written, in start order. With one, every reading stored after the
+    watermark's sequence number is written in the order it was stored, so
+    filled gaps are written however old they are, and corrections after
+    the values they replace. The watermark is advanced and saved after each
+    batch the sink accepts. A DiskStore is exported straight from its
+    records and journal, without building Readings.
+    """
+    count = 0
+    if watermark is None:
+        for batch, _ in _batches(_stored(store), batch_size):
+            sink.write(batch)
+            count += len(batch)
+        return count
+
+    for batch, seq in _batches(_changed(store, watermark.seq, batch_size), batch_size):
+        sink.write(batch)
+        count += len(batch)
+        watermark.advance(seq)
+        watermark.save()
+    return count
+
+
+def _times(epochs, offsets) -> list:
+    return [_to_datetime(e, o).isoformat() for e, o in zip(epochs, offsets)]
+
+
+class CsvSink:
+    """CsvSink writes readings as CSV rows of ISO 8601 times and Wh."""
+
+    def __init__(self, f, header: bool = True):
+        self.f = f
+        self._writer = csv.writer(f)
+        if header:
+            self._writer.writerow(CSV_HEADER)
+
+    def write(self, batch: ReadingSeries):
+        offsets = batch.offset.tolist()
+        self._writer.writerows(
+            zip(
+                _times(batch.start.tolist(), offsets),
+                _times(batch.end.tolist(), offsets),
+                batch.wh.tolist(),
+            )
+        )
+        self.f.flush()
+
+    def close(self):
+        self.f.close()
+
+
+def to_arrow(batch: ReadingSeries):
+    """Return a batch as a pyarrow Table with UTC timestamps."""
+    return pa.table(
+        {
+            "start_time": pa.array(batch.start, pa.timestamp("s", tz="UTC")),
+            "end_time": pa.array(batch.end, pa.timestamp("s", tz="UTC")),
+            "wh": pa.array(batch.wh, pa.float64()),
+            "utc_offset": pa.array(batch.offset, pa.int32()),
+        }
+    )
+
+
+class ParquetSink:
+    """
+    ParquetSink writes readings to a compressed Parquet file, one row group
+    per batch. The reported UTC offset of each reading is kept alongside its
+    UTC times. Requires pyarrow.
+    """
+
+    def __init__(self, path: str, compression: str = "zstd"):
+        if pa is None:
+            raise ImportError("ParquetSink requires pyarrow")
+        self.path = path
+        self.compression = compression
+        self._writer = None
+
+    def write(self, batch: ReadingSeries):
+        table = to_arrow(batch)
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(
+                self.path, table.schema, compression=self.compression
+            )
+        self._writer.write_table(table)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+def _escape_tag(value: str) -> str:
+    return value.replace(",", r"\,").replace("=", r"\=").replace(" ", r"\ ")
+
+
+class LineProtocolSink:
+    """
+    LineProtocolSink posts readings in InfluxDB line protocol, which
+    InfluxDB and Prometheus-compatible stores such as VictoriaMetrics
+    accept. Each batch is one gzipped request, stamped with the reading's
+    start time in seconds, and requests reuse a pool of keep-alive
+    connections.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        measurement: str = "energy",
+        tags: Optional[dict] = None,
+        token: Optional[str] = None,
+        pool_size: int = 4,
+        timeout: float = 30,
+    ):
+        self.url = url
+        self.timeout = timeout
+        tags = "".join(
+            f",{_escape_tag(k)}={_escape_tag(str(v))}"
+            for k, v in sorted((tags or {}).items())
+        )
+        self._prefix = _escape_tag(measurement) + tags
+
+        self.http = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.http.mount("https://", adapter)
+        self.http.mount("http://", adapter)
+        self.http.headers.update(
+            {"Content-Type": "text/plain; charset=utf-8", "Content-Encoding": "gzip"}
+        )
+        if token is not None:
+            self.http.headers["Authorization"] = f"Token {token}"
+
+    def lines(self, batch: ReadingSeries) -> str:
+        prefix = self._prefix
+        return "".join(
+            f"{prefix} wh={wh!r},seconds={end - start}i {start}\n"
+            for start, end, wh in zip(
+                batch.start.tolist(), batch.end.tolist(), batch.wh.tolist()
+            )
+        )
+
+    def write(self, batch: ReadingSeries):
+        body = gzip.compress(self.lines(batch).encode())
+        response = self.http.post(
+            self.url, params={"precision": "s"}, data=body, timeout=self.timeout
+        )
+        response.raise_for_status()
+
+    def close(self):
+        self.http.close()
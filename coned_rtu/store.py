@@ -1,3 +1,11 @@
+import bisect
+from dataclasses import dataclass
+from datetime import timedelta, timezone
+import itertools
+from typing import Optional
+
+from .coverage import CoverageIndex
+from .metrics import instrumented
 from .reading import Reading
 
 
@@ -5,48 +13,472 @@ class OverlappingReadingError(ValueError):
     pass
 
 
-class BucketList:
+@dataclass
+class InsertResult:
+    """Counts of what happened to each reading in a bulk insert."""
+
+    inserted: int = 0
+    deduplicated: int = 0
+    rejected: int = 0
+    replaced: int = 0
+
+
+@dataclass
+class Revision:
+    """
+    A change to a store: new was stored as its seq'th change, replacing
+    old if an upsert corrected a stored reading, while old is None if new
+    was simply inserted.
+    """
+
+    seq: int
+    old: Optional[Reading]
+    new: Reading
+
+
+class ChangeNotifier:
+    """
+    ChangeNotifier lets a store tell subscribers which buckets changed, and
+    keeps the store's change log. The change log numbers every reading the
+    store has stored, inserted or upserted, in the order they were stored,
+    so readers can pick up where they left off however old the readings
+    they missed are. Its revisions are the changes that replaced a stored
+    reading.
+    """
+
+    def subscribe(self, listener):
+        """
+        Call listener(key, added) whenever the bucket key changes. added is
+        the list of readings inserted into it, or None when the bucket
+        changed some other way, such as being pruned or having a reading
+        revised, and anything derived from it must be recomputed.
+        """
+        self._listeners.append(listener)
+
+    def _notify(self, key: str, added):
+        for listener in self._listeners:
+            listener(key, added)
+
+    def revisions_since(self, seq: int = 0) -> list:
+        """Return the revisions after sequence number seq, oldest first."""
+        return [c for c in self.changes_since(seq) if c.old is not None]
+
+    @property
+    def revisions(self) -> list:
+        """Every revision still in the change log, oldest first."""
+        return self.revisions_since(0)
+
+    @property
+    def seq(self) -> int:
+        """The sequence number of the last change stored, or 0."""
+        return self._changes_base + len(self._changes)
+
+    def changes_since(self, seq: int = 0) -> list:
+        """Return the changes after sequence number seq, oldest first."""
+        base = self._changes_base
+        lo = max(seq - base, 0)
+        replaced = self._replaced
+        return [
+            Revision(i, replaced.get(i), reading)
+            for i, reading in enumerate(self._changes[lo:], base + lo + 1)
+            if reading is not None
+        ]
+
+    def discard_changes(self, seq: int):
+        """
+        Forget the changes up to and including sequence number seq, once
+        every reader of the change log has read them.
+        """
+        n = min(max(seq - self._changes_base, 0), len(self._changes))
+        del self._changes[:n]
+        self._changes_base += n
+        if self._replaced:
+            base = self._changes_base
+            self._replaced = {i: r for i, r in self._replaced.items() if i > base}
+
+    def _log_change(self, new: Reading, old: Optional[Reading] = None):
+        self._changes.append(new)
+        if old is not None:
+            self._replaced[self.seq] = old
+
+
+class BucketList(ChangeNotifier):
     """
     BucketList implements an ordered list using buckets whose keys are
     determined by the Reading's hash_bucket function. When iterating,
     BucketList yields in order of bucket key, then the ordered list in each
     bucket.
+
+    Since stored readings never overlap, ordering them by start time also
+    orders them by end time, so a new reading can only overlap the readings
+    immediately before and after its sorted position. Those neighbors may
+    live in adjacent buckets when a reading spans midnight.
     """
 
     def __init__(self, *args):
         # dict to hold buckets -> ordered lists
         self._dict = {}
+        # dict to hold buckets -> epoch start times of the ordered lists, for
+        # bisect
+        self._starts = {}
         # ordered list of bucket keys, for iteration
         self._keys = []
+        self._listeners = []
+        # the change log: every reading stored, in the order stored, or None
+        # once pruned, numbered from _changes_base + 1, and the readings that
+        # upserts replaced by sequence number
+        self._changes = []
+        self._changes_base = 0
+        self._replaced = {}
+        # spans of time that have readings, for finding gaps
+        self.coverage = CoverageIndex()
+        # number of stored readings
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        for key in self._keys:
+            yield from self._dict[key]
+
+    def __reversed__(self):
+        for key in reversed(self._keys):
+            yield from reversed(self._dict[key])
+
+    def range(self, start, end):
+        """
+        Lazily yield the readings that start in [start, end), in order.
+        Iteration starts at the first bucket that can hold such a reading,
+        and the store must not be modified until it finishes.
+        """
+        # a bucket's key is the local date of its readings, which is within a
+        # day of their UTC date
+        first = str((start - timedelta(days=1)).date())
+        last = str((end + timedelta(days=1)).date())
+        start, end = start.timestamp(), end.timestamp()
+        i = bisect.bisect_left(self._keys, first)
+        while i < len(self._keys) and self._keys[i] <= last:
+            key = self._keys[i]
+            bucket = self._dict[key]
+            j = bisect.bisect_left(self._starts[key], start)
+            while j < len(bucket) and bucket[j].start < end:
+                yield bucket[j]
+                j += 1
+            i += 1
 
     def to_list(self):
-        out = []
-        for bucket in self._keys:
-            for r in self._dict[bucket]:
-                out.append(r)
-        return out
+        return list(self)
+
+    def latest(self):
+        """Return the reading with the latest start time, or None if empty."""
+        return next(reversed(self), None)
+
+    def bucket_keys(self, start: str = None, end: str = None):
+        """Return the bucket keys in [start, end), in order."""
+        lo = 0 if start is None else bisect.bisect_left(self._keys, start)
+        hi = len(self._keys) if end is None else bisect.bisect_left(self._keys, end)
+        return self._keys[lo:hi]
+
+    @instrumented("store.prune", store="BucketList")
+    def prune(self, before):
+        """
+        Drop every bucket for a day before the date of before, taken in the
+        UTC offset the stored readings were reported in, as hash_bucket does,
+        and the changes that stored their readings.
+        """
+        latest = self.latest()
+        if latest is not None and before.tzinfo is not None:
+            before = before.astimezone(latest.start_time.tzinfo)
+        cutoff = str(before.date())
+        i = bisect.bisect_left(self._keys, cutoff)
+        dropped = self._keys[:i]
+        for key in dropped:
+            self._len -= len(self._dict[key])
+            del self._dict[key]
+            del self._starts[key]
+        del self._keys[:i]
+        if dropped:
+            self._prune_changes(cutoff)
+        first = self._first_after("")
+        if first is None:
+            self.coverage.clear()
+        else:
+            self.coverage.discard_before(first.start)
+        for key in dropped:
+            self._notify(key, None)
+
+    def _prune_changes(self, cutoff: str):
+        """Drop the changes that stored readings in buckets before cutoff."""
+        changes = self._changes
+        base = self._changes_base
+        for i, reading in enumerate(changes):
+            if reading is not None and reading.hash_bucket() < cutoff:
+                changes[i] = None
+                self._replaced.pop(base + i + 1, None)
+        # old changes are usually the first ones, so the log shrinks from the
+        # front
+        n = 0
+        while n < len(changes) and changes[n] is None:
+            n += 1
+        self.discard_changes(base + n)
 
     def get_bucket(self, key: str):
         # create the bucket if it doesn't exist already
         if key not in self._dict:
-            self._keys.append(key)
-            self._keys.sort()
+            bisect.insort(self._keys, key)
             self._dict[key] = []
+            self._starts[key] = []
 
         return self._dict[key]
 
+    def _load(self, key: str, readings):
+        """
+        Make readings, sorted and stored elsewhere already, the bucket key,
+        without logging them as changes.
+        """
+        bucket = self.get_bucket(key)
+        self._len += len(readings) - len(bucket)
+        bucket[:] = readings
+        self._starts[key][:] = [r.start for r in readings]
+        for r in readings:
+            self.coverage.add_reading(r)
+
+    def _last_before(self, key: str):
+        """Return the last reading in any bucket before key, if there is one."""
+        i = bisect.bisect_left(self._keys, key)
+        while i > 0:
+            i -= 1
+            bucket = self._dict[self._keys[i]]
+            if bucket:
+                return bucket[-1]
+        return None
+
+    def _first_after(self, key: str):
+        """Return the first reading in any bucket after key, if there is one."""
+        i = bisect.bisect_right(self._keys, key)
+        while i < len(self._keys):
+            bucket = self._dict[self._keys[i]]
+            if bucket:
+                return bucket[0]
+            i += 1
+        return None
+
+    def _find(self, reading: Reading):
+        """
+        Return the key and index of the stored reading with the same interval
+        as reading, or None. A bucket's key is the local date its readings
+        were reported in, so the same interval reported with another UTC
+        offset may be stored in a neighboring bucket, within a day of its
+        UTC date.
+        """
+        key = reading.hash_bucket()
+        keys = [key]
+        day = reading.start_time.astimezone(timezone.utc).date()
+        first = str(day - timedelta(days=1))
+        last = str(day + timedelta(days=1))
+        i = bisect.bisect_left(self._keys, first)
+        while i < len(self._keys) and self._keys[i] <= last:
+            if self._keys[i] != key:
+                keys.append(self._keys[i])
+            i += 1
+        for key in keys:
+            starts = self._starts.get(key)
+            if not starts:
+                continue
+            j = bisect.bisect_left(starts, reading.start)
+            if (
+                j < len(starts)
+                and starts[j] == reading.start
+                and self._dict[key][j].end == reading.end
+            ):
+                return key, j
+        return None
+
+    @instrumented("store.insert", store="BucketList")
     def insert(self, reading: Reading):
-        bucket = self.get_bucket(reading.hash_bucket())
+        key = reading.hash_bucket()
+        bucket = self.get_bucket(key)
+        starts = self._starts[key]
+        i = bisect.bisect_right(starts, reading.start)
 
         # If the new reading is identical to an existing one, deduplicate it
         # and consider it successful. If the new reading overlaps with an
-        # existing reading, disallow it.
-        for r in bucket:
-            if reading == r:
+        # existing reading, disallow it. An identical reading always sorts
+        # right before the insertion point.
+        prev = bucket[i - 1] if i > 0 else self._last_before(key)
+        if prev is not None:
+            if reading == prev:
                 return
-            if reading.overlaps(r):
+            if reading.overlaps(prev):
                 raise OverlappingReadingError
 
-        # incredibly lazy implementation, could insert sorted
-        bucket.append(reading)
-        bucket.sort(key=lambda x: x.start_time)
+        following = bucket[i] if i < len(bucket) else self._first_after(key)
+        if following is not None and reading.overlaps(following):
+            raise OverlappingReadingError
+
+        bucket.insert(i, reading)
+        starts.insert(i, reading.start)
+        self._len += 1
+        self.coverage.add_reading(reading)
+        self._log_change(reading)
+        if self._listeners:
+            self._notify(key, [reading])
+
+    @instrumented("store.upsert", store="BucketList")
+    def upsert(self, reading: Reading):
+        """
+        Insert a reading, or, if a stored reading has the same interval and
+        a different wh, replace it in place and return it. The stored
+        interval is found by its epoch times, so a correction reported in
+        another UTC offset replaces it in the bucket it is stored in.
+        Replacing costs a bisect of a few buckets. Any other overlap still
+        raises OverlappingReadingError.
+        """
+        found = self._find(reading)
+        if found is None:
+            self.insert(reading)
+            return None
+        key, i = found
+        bucket = self._dict[key]
+        old = bucket[i]
+        if old.wh == reading.wh:
+            return None
+        bucket[i] = reading
+        self._log_change(reading, old)
+        self._notify(key, None)
+        return old
+
+    @instrumented("store.insert_many", store="BucketList")
+    def insert_many(self, readings, upsert: bool = False) -> InsertResult:
+        """
+        Insert a batch of readings. The batch is sorted once and merged
+        linearly into each bucket it touches. Readings identical to a stored
+        one are deduplicated and readings that overlap a stored one (or an
+        earlier reading in the batch) are rejected, rather than raising
+        OverlappingReadingError. With upsert, a reading with the same
+        interval as a stored one but a different wh replaces it instead, as
+        does a later one in the batch.
+        """
+        result = InsertResult()
+        incoming = sorted(readings, key=lambda r: r.start)
+        if upsert:
+            # corrections go to the bucket their interval is stored in
+            bucket_key = self._upsert_key
+        else:
+            bucket_key = Reading.hash_bucket
+        for key, group in itertools.groupby(incoming, key=bucket_key):
+            self._merge_bucket(key, group, result, upsert)
+        return result
+
+    @instrumented("store.insert_series", store="BucketList")
+    def insert_series(self, series) -> InsertResult:
+        """
+        Insert a ReadingSeries with the dedup and overlap rules of
+        insert_many, checking the series against itself in start order as a
+        whole. A run of readings for a bucket that is still empty, and that
+        doesn't overlap the readings around it, becomes the bucket in one
+        step; any other run is merged like insert_many does.
+        """
+        from .series import _hash_buckets, _merge_series, _spans
+
+        result = InsertResult()
+        series, result.deduplicated, result.rejected = _merge_series(series)
+        keys = _hash_buckets(series)
+        lo = 0
+        for key, group in itertools.groupby(keys):
+            hi = lo + sum(1 for _ in group)
+            readings = series[lo:hi].to_readings()
+            prev = self._last_before(key)
+            following = self._first_after(key)
+            if (
+                self._dict.get(key)
+                or (prev is not None and prev.end > readings[0].start)
+                or (following is not None and following.start < readings[-1].end)
+            ):
+                self._merge_bucket(key, readings, result)
+            else:
+                self.get_bucket(key)[:] = readings
+                self._starts[key][:] = series.start[lo:hi].tolist()
+                self._len += len(readings)
+                for start, end in _spans(series[lo:hi]):
+                    self.coverage.add(start, end)
+                self._changes.extend(readings)
+                result.inserted += len(readings)
+                self._notify(key, readings)
+            lo = hi
+        return result
+
+    def _upsert_key(self, reading: Reading) -> str:
+        found = self._find(reading)
+        return reading.hash_bucket() if found is None else found[0]
+
+    def missing_ranges(self, start, end) -> list:
+        """Return the (start, end) ranges within [start, end) with no readings."""
+        return self.coverage.missing_ranges(start, end)
+
+    def merge(self, other: "BucketList") -> InsertResult:
+        """Insert every reading of another BucketList into this one."""
+        return self.insert_many(other)
+
+    def _merge_bucket(self, key: str, group, result: InsertResult, upsert=False):
+        bucket = self.get_bucket(key)
+        before = self._last_before(key)
+        merged = []
+        # [old, new] for every reading stored, in bucket order; old is None
+        # for inserts
+        changes = []
+        i = 0
+        for reading in group:
+            # carry over stored readings that sort before the new one
+            while i < len(bucket) and bucket[i].start <= reading.start:
+                merged.append(bucket[i])
+                i += 1
+
+            prev = merged[-1] if merged else before
+            following = bucket[i] if i < len(bucket) else self._first_after(key)
+            if prev is not None and reading == prev:
+                result.deduplicated += 1
+            elif (
+                upsert
+                and merged
+                and prev.start == reading.start
+                and prev.end == reading.end
+            ):
+                # only count replacing a reading stored before this batch
+                merged[-1] = reading
+                if changes and changes[-1][1] is prev:
+                    changes[-1][1] = reading
+                else:
+                    changes.append([prev, reading])
+                    result.replaced += 1
+            elif (prev is not None and reading.overlaps(prev)) or (
+                following is not None and reading.overlaps(following)
+            ):
+                result.rejected += 1
+            else:
+                merged.append(reading)
+                changes.append([None, reading])
+                self.coverage.add_reading(reading)
+                result.inserted += 1
+
+        merged.extend(bucket[i:])
+        bucket[:] = merged
+        self._starts[key][:] = [r.start for r in merged]
+        added = []
+        revised = False
+        for old, new in changes:
+            if old is None:
+                added.append(new)
+                self._changes.append(new)
+            elif new == old:
+                # corrected and then restored within the batch
+                result.replaced -= 1
+            else:
+                revised = True
+                self._log_change(new, old)
+        self._len += len(added)
+        if revised:
+            self._notify(key, None)
+        elif added:
+            self._notify(key, added)
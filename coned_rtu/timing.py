@@ -0,0 +1,43 @@
+from contextlib import contextmanager
+import logging
+import time
+
+from .metrics import METRICS
+
+
+class StepTimer:
+    """
+    StepTimer records how much wall-clock time each named step of a scrape
+    takes, so slow scrapes can be attributed to login, MFA, Opower or
+    parsing.
+    """
+
+    def __init__(self):
+        # step name -> [total seconds, number of times it ran], so a
+        # long-lived timer stays the same size however many steps it times
+        self.steps = {}
+
+    @contextmanager
+    def step(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            total = self.steps.setdefault(name, [0.0, 0])
+            total[0] += elapsed
+            total[1] += 1
+            if METRICS.enabled:
+                METRICS.observe("step_seconds", elapsed, step=name)
+            logging.debug(f"{name} took {elapsed:.3f}s")
+
+    def as_dict(self) -> dict:
+        """Return the total seconds spent in each step."""
+        return {name: seconds for name, (seconds, _) in self.steps.items()}
+
+    def counts(self) -> dict:
+        """Return how many times each step ran."""
+        return {name: count for name, (_, count) in self.steps.items()}
+
+    def reset(self):
+        self.steps = {}
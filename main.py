@@ -1,27 +1,95 @@
 import asyncio
+import json
 import logging
+import os
 import sys
 
 from configobj import ConfigObj
 
-from coned_rtu import Config, Pyppeteer
+from coned_rtu import (
+    BrowserPool,
+    BucketList,
+    Config,
+    CsvSink,
+    Daemon,
+    DiskStore,
+    METRICS,
+    RequestPolicy,
+    Scheduler,
+    Watermark,
+    export,
+    meter_key,
+)
 
 logging.basicConfig(level=logging.INFO)
 
-if len(sys.argv) < 2:
-    print(f"Usage: {sys.argv[0]} <config file>")
+flags = [a for a in sys.argv[1:] if a.startswith("--")]
+args = [a for a in sys.argv[1:] if not a.startswith("--")]
+daemon = "--daemon" in flags
+# --upsert replaces stored values Opower has corrected
+upsert = "--upsert" in flags
+# --policy blocks requests outside the lightweight allowlist
+policy = "--policy" in flags
+# --metrics-port=PORT serves /metrics and /trace, --trace=FILE writes the
+# trace of a single run
+options = dict(f[2:].split("=", 1) for f in flags if "=" in f)
+
+if len(args) < 1:
+    print(
+        f"Usage: {sys.argv[0]} [--daemon] [--upsert] [--policy] "
+        "[--metrics-port=PORT] [--trace=FILE] <config file> [store directory]"
+    )
     sys.exit(1)
 
-cfg_obj = ConfigObj(sys.argv[1])
-config = Config.from_config_obj(cfg_obj)
-coned = Pyppeteer(config)
+if "metrics-port" in options or "trace" in options:
+    METRICS.enable()
+if "metrics-port" in options:
+    METRICS.serve(int(options["metrics-port"]))
+
+# One config section per account/meter, or a single flat config.
+cfg_obj = ConfigObj(args[0])
+configs = Config.all_from_config_obj(cfg_obj)
+coned_options = {"policy": RequestPolicy()} if policy else {}
+
+
+def make_store(config):
+    # With a store directory, later runs only fetch what the store is missing.
+    if len(args) > 1:
+        return DiskStore(os.path.join(args[1], meter_key(config)))
+    return BucketList()
+
+
+def make_watermark(key):
+    # With a store directory, each run writes only what the store got since
+    # the last, including corrections and filled gaps.
+    if len(args) > 1:
+        return Watermark(os.path.join(args[1], key + ".watermark"))
+    return None
+
+
+async def run_once():
+    pool = BrowserPool()
+    scheduler = Scheduler(
+        configs, pool, make_store, coned_options=coned_options, upsert=upsert
+    )
+    try:
+        results = await scheduler.run_once()
+    finally:
+        await pool.close()
+
+    if "trace" in options:
+        with open(options["trace"], "w") as f:
+            json.dump(METRICS.trace_events(), f, indent=2)
+
+    sink = CsvSink(sys.stdout)
+    for key, result in results.items():
+        logging.info(f"{key}: {result}")
+        if key in scheduler.stores:
+            export(scheduler.stores[key], sink, make_watermark(key))
 
 
-async def main():
-    await coned.__ainit__()
-    await coned.login()
-    usage_json = await coned.get_usage()
-    print(usage_json)
+async def run_daemon():
+    await Daemon(configs, make_store, coned_options=coned_options, upsert=upsert).run()
 
 
-asyncio.run(main())
+asyncio.run(run_daemon() if daemon else run_once())
@@ -8,10 +8,13 @@ setup(
     zip_safe=False,
     install_requires=[
         "configobj==5.0.6",
+        "cryptography==43.0.3",
+        "numpy==2.0.2",
         "pre-commit==2.14.1",
         "pyotp==2.3.0",
         "python-dateutil==2.8.1",
         "python-dotenv==0.11.0",
         "selenium==3.141.0",
     ],
+    extras_require={"parquet": ["pyarrow"]},
 )
@@ -0,0 +1,132 @@
+from datetime import date, datetime, timedelta, timezone
+import tempfile
+import unittest
+from zoneinfo import ZoneInfo
+
+from coned_rtu import (
+    BucketList,
+    DiskStore,
+    Reading,
+    ReadingSeries,
+    TouSchedule,
+    resample,
+)
+from coned_rtu.aggregate import OFF_PEAK, PEAK, _resample_python, _window
+
+edt = timezone(timedelta(hours=-4))
+quarter = timedelta(minutes=15)
+
+
+def quarters(start, n, wh=lambda i: 100 + i):
+    return [
+        Reading(start + i * quarter, start + (i + 1) * quarter, "wh", wh(i))
+        for i in range(n)
+    ]
+
+
+class TestResample(unittest.TestCase):
+    def setUp(self):
+        # Friday evening through Saturday morning
+        self.start = datetime(2021, 8, 27, 22, 0, tzinfo=edt)
+        self.readings = quarters(self.start, 16)
+
+    def assertSameAggregates(self, readings, freq, tz=None, tou=None):
+        expected = _resample_python(readings, _window(freq), tz, tou)
+        actual = resample(ReadingSeries.from_readings(readings), freq, tz, tou)
+        self.assertEqual(len(actual), len(expected))
+        for a, e in zip(actual, expected):
+            self.assertEqual(
+                (a.start, a.end, a.count, a.band), (e.start, e.end, e.count, e.band)
+            )
+            self.assertAlmostEqual(a.total, e.total)
+            self.assertAlmostEqual(a.peak, e.peak)
+
+    def test_hourly(self):
+        hours = resample(self.readings, "hour")
+        self.assertEqual(len(hours), 4)
+        first = hours[0]
+        self.assertEqual(first.start, self.start)
+        self.assertEqual(first.end, self.start + timedelta(hours=1))
+        self.assertEqual(first.total, 100 + 101 + 102 + 103)
+        self.assertEqual(first.mean, 101.5)
+        # 103 Wh in 15 minutes
+        self.assertEqual(first.peak, 412)
+        self.assertEqual(first.count, 4)
+
+    def test_daily_uses_local_time(self):
+        days = resample(self.readings, "day")
+        self.assertEqual(
+            [(d.start, d.count) for d in days],
+            [
+                (datetime(2021, 8, 27, tzinfo=edt), 8),
+                (datetime(2021, 8, 28, tzinfo=edt), 8),
+            ],
+        )
+
+    def test_monthly_with_timezone(self):
+        # 03:30 UTC on Sep 1 is still August in New York
+        start = datetime(2021, 9, 1, 3, 30, tzinfo=timezone.utc)
+        months = resample(quarters(start, 4), "month", tz=ZoneInfo("America/New_York"))
+        self.assertEqual([m.count for m in months], [2, 2])
+        self.assertEqual(months[0].start.month, 8)
+        self.assertEqual(
+            months[1].start, datetime(2021, 9, 1, tzinfo=ZoneInfo("America/New_York"))
+        )
+        self.assertEqual(months[1].end.month, 10)
+
+    def test_fixed_window(self):
+        windows = resample(self.readings, timedelta(minutes=30))
+        self.assertEqual(len(windows), 8)
+        self.assertEqual(windows[0].total, 201)
+
+    def test_tou_bands(self):
+        tou = TouSchedule()
+        bands = resample(self.readings, "day", tou=tou)
+        # Friday 10 PM to midnight is peak, Saturday is off-peak
+        self.assertEqual(
+            [(b.start.day, b.band, b.count) for b in bands],
+            [(27, PEAK, 8), (28, OFF_PEAK, 8)],
+        )
+
+        holiday = TouSchedule(holidays=[date(2021, 8, 27)])
+        self.assertEqual(resample(self.readings, "day", tou=holiday)[0].band, OFF_PEAK)
+
+    def test_matches_pure_python(self):
+        readings = quarters(self.start, 96 * 40, wh=lambda i: i % 7 + 0.5)
+        for freq in ("hour", "day", "month", 7200):
+            self.assertSameAggregates(readings, freq)
+            self.assertSameAggregates(readings, freq, tou=TouSchedule())
+            self.assertSameAggregates(readings, freq, ZoneInfo("America/New_York"))
+
+    def test_store(self):
+        store = BucketList()
+        store.insert_many(self.readings)
+        self.assertEqual(resample(store, "hour"), resample(self.readings, "hour"))
+        self.assertEqual(resample([], "hour"), [])
+
+    def test_disk_store(self):
+        with tempfile.TemporaryDirectory() as root:
+            store = DiskStore(root)
+            store.insert_many(self.readings)
+            self.assertEqual(resample(store, "hour"), resample(self.readings, "hour"))
+            self.assertEqual(resample(DiskStore(root + "/empty"), "hour"), [])
+
+    def test_window(self):
+        start = self.start + timedelta(hours=1)
+        end = self.start + timedelta(hours=3)
+        expected = resample(self.readings[4:12], "hour")
+        self.assertEqual(len(expected), 2)
+        store = BucketList()
+        store.insert_many(self.readings)
+        for readings in (
+            self.readings,
+            ReadingSeries.from_readings(self.readings),
+            store,
+        ):
+            self.assertEqual(resample(readings, "hour", start=start, end=end), expected)
+        self.assertEqual(
+            resample(self.readings, "hour", start=end), resample(self.readings[12:])
+        )
+        self.assertEqual(
+            resample(store, "hour", end=start), resample(self.readings[:4])
+        )
@@ -0,0 +1,65 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from benchmarks import suite
+from benchmarks.fixtures import opower_payload, polling_batches
+from coned_rtu import BucketList, json_to_readings
+
+
+class TestBenchmarks(unittest.TestCase):
+    def test_polling_batches(self):
+        readings = json_to_readings(opower_payload(500, null_every=0))
+        batches = polling_batches(readings, window=96, lookback=8, reject_every=100)
+        store = BucketList()
+        results = [store.insert_many(b) for b in batches]
+        self.assertEqual(store.to_list(), readings)
+        self.assertEqual(sum(r.rejected for r in results), 5)
+        self.assertEqual(sum(r.deduplicated for r in results), 8 * (len(batches) - 1))
+
+    def test_suite_writes_results(self):
+        # timings depend on the machine, so only the report's shape is checked
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, "results.json")
+            args = ["--sizes", "200", "--repeat", "1", "--no-scrape", "--output", path]
+            with mock.patch("sys.stderr"):
+                exit_code = suite.main(args)
+            with open(path) as f:
+                report = json.load(f)
+        self.assertEqual(exit_code, 1 if report["regressions"] else 0)
+
+        self.assertEqual(set(report), {"python", "machine", "results", "regressions"})
+        names = {r["name"] for r in report["results"]}
+        self.assertEqual(names, set(suite.THRESHOLDS))
+        for r in report["results"]:
+            self.assertEqual(r["size"], 200)
+            self.assertGreaterEqual(r["seconds"], 0)
+            self.assertIn("us_per_read", r)
+        self.assertIsInstance(report["regressions"], list)
+
+        # a run that got much slower than its baseline regresses
+        baseline = {
+            "results": [
+                dict(r, seconds=1.0, us_per_read=0.0) for r in report["results"]
+            ]
+        }
+        slower = [dict(r, seconds=3.0) for r in baseline["results"]]
+        self.assertEqual(len(suite.check(slower, baseline, 1.25)), len(slower))
+        self.assertEqual(suite.check(baseline["results"], baseline, 1.25), [])
+
+    def test_exit_code_reports_regressions(self):
+        args = ["--sizes", "200", "--repeat", "1", "--no-scrape"]
+        for limit, expected in ((None, 0), (-1.0, 1)):
+            thresholds = {name: limit for name in suite.THRESHOLDS}
+            with tempfile.TemporaryDirectory() as root:
+                path = os.path.join(root, "results.json")
+                with mock.patch.dict(suite.THRESHOLDS, thresholds), mock.patch(
+                    "sys.stderr"
+                ):
+                    exit_code = suite.main(args + ["--output", path])
+                with open(path) as f:
+                    report = json.load(f)
+            self.assertEqual(exit_code, expected)
+            self.assertEqual(bool(report["regressions"]), bool(expected))
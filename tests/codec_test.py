@@ -0,0 +1,87 @@
+from datetime import datetime, timedelta, timezone
+import json
+import unittest
+
+import numpy as np
+
+from coned_rtu import CodecError, Reading, ReadingSeries, decode, encode
+from coned_rtu.codec import decode_varints, encode_varints
+
+edt = timezone(timedelta(hours=-4))
+est = timezone(timedelta(hours=-5))
+
+
+class TestCodec(unittest.TestCase):
+    def setUp(self):
+        sometime = datetime(2021, 11, 7, 0, 0, tzinfo=edt)
+        quarter = timedelta(minutes=15)
+        self.readings = [
+            Reading(
+                sometime + i * quarter,
+                sometime + (i + 1) * quarter,
+                "kwh",
+                round((i + 1) * 0.0125, 4),
+            )
+            for i in range(96)
+        ]
+        # the clocks go back partway through, and an hour is missing
+        self.readings = [
+            Reading(
+                r.start_time.astimezone(est), r.end_time.astimezone(est), "wh", r.wh
+            )
+            if i >= 8
+            else r
+            for i, r in enumerate(self.readings)
+            if not 40 <= i < 44
+        ]
+
+    def test_varints(self):
+        values = np.array([0, 1, 127, 128, 300, 2**63, 2**64 - 1], dtype=np.uint64)
+        data = encode_varints(values)
+        self.assertEqual(data[:5], b"\x00\x01\x7f\x80\x01")
+        np.testing.assert_array_equal(decode_varints(data, len(values)), values)
+
+    def test_round_trip(self):
+        data = encode(self.readings)
+        decoded = decode(data)
+        self.assertEqual(list(decoded), self.readings)
+        self.assertEqual(
+            [r.start_time.utcoffset() for r in decoded],
+            [r.start_time.utcoffset() for r in self.readings],
+        )
+
+        as_json = json.dumps(
+            [
+                [r.start_time.isoformat(), r.end_time.isoformat(), r.wh]
+                for r in self.readings
+            ]
+        )
+        self.assertLess(len(data) * 8, len(as_json))
+
+    def test_large_batch(self):
+        n = 100_000
+        start = np.arange(n, dtype=np.int64) * 900 + 1_630_000_000
+        wh = np.round(np.random.default_rng(1).random(n) * 500, 1)
+        series = ReadingSeries(start, start + 900, wh, offset=-14400)
+        decoded = decode(encode(series))
+        np.testing.assert_array_equal(decoded.start, series.start)
+        np.testing.assert_array_equal(decoded.end, series.end)
+        np.testing.assert_array_equal(decoded.wh, series.wh)
+        np.testing.assert_array_equal(decoded.offset, series.offset)
+
+    def test_unquantizable_values_are_raw(self):
+        wh = [1 / 3, 2 / 3, 1e-12, 123.456]
+        series = ReadingSeries([0, 900, 1800, 2700], [900, 1800, 2700, 3600], wh)
+        decoded = decode(encode(series))
+        self.assertEqual(decoded.wh.tolist(), wh)
+        self.assertFalse(decoded.wh.flags.owndata)
+
+    def test_empty(self):
+        self.assertEqual(len(decode(encode([]))), 0)
+
+    def test_rejects_bad_input(self):
+        data = encode(self.readings)
+        with self.assertRaises(CodecError):
+            decode(data[:-1])
+        with self.assertRaises(CodecError):
+            decode(b"XYZ" + data[3:])
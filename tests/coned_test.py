@@ -1,7 +1,8 @@
+import asyncio
 from datetime import datetime, timedelta, timezone
 import unittest
 
-from coned_rtu import Reading, json_to_readings
+from coned_rtu import BucketList, Coned, Config, Reading, fetch_window, json_to_readings
 
 tz = timezone(timedelta(hours=-4))
 
@@ -26,3 +27,102 @@ class TestConed(unittest.TestCase):
             ),
         ]
         self.assertEqual(got, want)
+
+
+class FakeConed(Coned):
+    def __init__(self, config, readings):
+        super().__init__(config)
+        self.readings = readings
+        self.requests = []
+
+    async def save_screenshot(self, filename):
+        pass
+
+    async def login(self):
+        pass
+
+    async def get_usage(self, since=None, until=None):
+        self.requests.append((since, until))
+        return [
+            r
+            for r in self.readings
+            if (since is None or r.start_time >= since)
+            and (until is None or r.end_time <= until)
+        ]
+
+
+def make_config():
+    return Config(
+        CONED_USER="user",
+        CONED_PASS="pass",
+        CONED_TOTP="JBSWY3DPEHPK3PXP",
+        OPOWER_ACCOUNT_ID="acct",
+        OPOWER_METER=1,
+        CONED_MAID="maid",
+    )
+
+
+class TestIncrementalFetch(unittest.TestCase):
+    def setUp(self):
+        self.sometime = datetime(2021, 8, 29, 0, 0, 0, tzinfo=tz)
+        self.quarter = timedelta(minutes=15)
+        self.readings = [
+            Reading(
+                self.sometime + i * self.quarter,
+                self.sometime + (i + 1) * self.quarter,
+                "wh",
+                i,
+            )
+            for i in range(96)
+        ]
+
+    def test_usage_url(self):
+        coned = FakeConed(make_config(), [])
+        self.assertEqual(coned.usage_url(), coned.opower_usage_url)
+        self.assertEqual(
+            coned.usage_url(self.sometime),
+            coned.opower_usage_url + "?startDate=2021-08-29T00%3A00%3A00-04%3A00",
+        )
+
+    def test_fetch_window(self):
+        now = self.sometime + timedelta(days=1)
+        store = BucketList()
+        self.assertEqual(fetch_window(store, now), (None, now))
+
+        store.insert_many(self.readings[:40])
+        since, until = fetch_window(store, now, lookback=timedelta(hours=1))
+        self.assertEqual(since, self.readings[36].start_time)
+        self.assertEqual(until, now)
+
+    def test_backfill_fetches_only_gaps(self):
+        store = BucketList()
+        store.insert_many(
+            self.readings[:10] + self.readings[12:50] + self.readings[80:]
+        )
+        coned = FakeConed(make_config(), self.readings)
+        start, end = self.readings[0].start_time, self.readings[-1].end_time
+
+        result = asyncio.run(coned.backfill(store, start, end, join=timedelta(0)))
+        self.assertEqual(result.inserted, 32)
+        self.assertEqual(
+            coned.requests,
+            [
+                (self.readings[10].start_time, self.readings[12].start_time),
+                (self.readings[50].start_time, self.readings[80].start_time),
+            ],
+        )
+        self.assertEqual(store.missing_ranges(start, end), [])
+
+    def test_sync_fetches_only_missing_window(self):
+        coned = FakeConed(make_config(), self.readings[:50])
+        store = BucketList()
+        now = self.sometime + timedelta(days=1)
+
+        result = asyncio.run(coned.sync(store, now))
+        self.assertEqual(result.inserted, 50)
+
+        coned.readings = self.readings
+        result = asyncio.run(coned.sync(store, now))
+        self.assertEqual(coned.requests[-1][0], self.readings[42].start_time)
+        self.assertEqual((result.inserted, result.deduplicated), (46, 8))
+        self.assertEqual(store.to_list(), self.readings)
@@ -0,0 +1,87 @@
+from datetime import datetime, timedelta, timezone
+import tempfile
+import unittest
+
+from coned_rtu import BucketList, DiskStore, Reading
+from coned_rtu.coverage import CoverageIndex
+
+tz = timezone(timedelta(hours=-4))
+
+
+class TestCoverageIndex(unittest.TestCase):
+    def test_merges_touching_and_overlapping_ranges(self):
+        index = CoverageIndex()
+        index.add(0, 10)
+        index.add(10, 20)
+        index.add(40, 50)
+        index.add(25, 30)
+        self.assertEqual(index.ranges(), [(0, 20), (25, 30), (40, 50)])
+
+        index.add(20, 25)
+        self.assertEqual(index.ranges(), [(0, 30), (40, 50)])
+        index.add(5, 45)
+        self.assertEqual(index.ranges(), [(0, 50)])
+
+    def test_missing(self):
+        index = CoverageIndex()
+        self.assertEqual(index.missing(0, 10), [(0, 10)])
+
+        for start in (10, 30, 40):
+            index.add(start, start + 5)
+        self.assertEqual(index.missing(0, 50), [(0, 10), (15, 30), (35, 40), (45, 50)])
+        self.assertEqual(index.missing(12, 32), [(15, 30)])
+        self.assertEqual(index.missing(31, 34), [])
+
+    def test_discard_before(self):
+        index = CoverageIndex()
+        index.add(0, 10)
+        index.add(20, 30)
+        index.discard_before(25)
+        self.assertEqual(index.ranges(), [(25, 30)])
+
+
+class TestMissingRanges(unittest.TestCase):
+    def setUp(self):
+        self.sometime = datetime(2021, 8, 29, 0, 0, 0, tzinfo=tz)
+        self.quarter = timedelta(minutes=15)
+        self.readings = [
+            Reading(
+                self.sometime + i * self.quarter,
+                self.sometime + (i + 1) * self.quarter,
+                "wh",
+                i,
+            )
+            for i in range(192)
+        ]
+        # Opower left 01:00-02:00 on the second day null
+        self.present = self.readings[:100] + self.readings[104:]
+
+    def assertGaps(self, store):
+        end = self.sometime + 2 * timedelta(days=1)
+        self.assertEqual(
+            store.missing_ranges(self.sometime - timedelta(hours=1), end),
+            [
+                (self.sometime - timedelta(hours=1), self.sometime),
+                (self.readings[100].start_time, self.readings[104].start_time),
+            ],
+        )
+        self.assertEqual(len(store.coverage), 2)
+
+    def test_bucket_list(self):
+        store = BucketList()
+        for r in reversed(self.present):
+            store.insert(r)
+        self.assertGaps(store)
+
+        store.prune(self.sometime + timedelta(days=1))
+        self.assertEqual(
+            store.coverage.ranges()[0][0], int(self.readings[96].start_time.timestamp())
+        )
+
+    def test_disk_store(self):
+        with tempfile.TemporaryDirectory() as root:
+            DiskStore(root).insert_many(self.present[:150])
+            store = DiskStore(root)
+            self.assertEqual(len(store.coverage), 2)
+            store.insert_many(self.present[150:])
+            self.assertGaps(store)
@@ -0,0 +1,141 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+import unittest
+
+from coned_rtu import BucketList, Daemon, Reading
+from coned_rtu.daemon import meter_jitter, next_poll
+from coned_rtu.timing import StepTimer
+
+from .coned_test import make_config
+
+tz = timezone(timedelta(hours=-4))
+
+
+class FakeContext:
+    async def newPage(self):
+        return object()
+
+    async def close(self):
+        pass
+
+
+class FakeProcess:
+    def __init__(self):
+        self.dead = False
+
+    def poll(self):
+        return 1 if self.dead else None
+
+
+class FakeBrowser:
+    def __init__(self):
+        self.process = FakeProcess()
+        self.closed = False
+
+    async def createIncognitoBrowserContext(self):
+        return FakeContext()
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeConed:
+    """Each poll adds the next interval; the third poll crashes the browser."""
+
+    instances = []
+    crashed = False
+
+    def __init__(self, config, session):
+        self.cfg = config
+        self.timer = StepTimer()
+        self.logins = 0
+        FakeConed.instances.append(self)
+
+    async def __ainit__(self, context):
+        pass
+
+    async def login(self):
+        self.logins += 1
+
+    async def sync(self, store, upsert=False):
+        n = sum(len(c.polled) for c in FakeConed.instances)
+        if n == 2 and not FakeConed.crashed:
+            FakeConed.crashed = True
+            self.daemon._browser.process.dead = True
+            raise ConnectionError("browser went away")
+        start = datetime(2021, 8, 29, tzinfo=tz) + n * timedelta(minutes=15)
+        self.polled.append(n)
+        return store.insert_many(
+            [Reading(start, start + timedelta(minutes=15), "wh", 1)]
+        )
+
+
+class TestDaemon(unittest.TestCase):
+    def test_next_poll(self):
+        boundary = 1630209600.0  # 2021-08-29T04:00:00Z
+        self.assertEqual(next_poll(boundary, lag=300), boundary + 300)
+        self.assertEqual(next_poll(boundary + 300, lag=300), boundary + 1200)
+        self.assertEqual(next_poll(boundary + 299, lag=300, jitter=10), boundary + 310)
+
+    def test_meter_jitter(self):
+        self.assertEqual(meter_jitter("a-1"), meter_jitter("a-1"))
+        self.assertTrue(0 <= meter_jitter("a-1", 60) < 60)
+        self.assertEqual(meter_jitter("a-1", 0), 0)
+
+    def test_run_restarts_crashed_browser(self):
+        FakeConed.instances = []
+        FakeConed.crashed = False
+        browsers = []
+
+        async def launch():
+            browsers.append(FakeBrowser())
+            return browsers[-1]
+
+        def make_coned(config, session):
+            coned = FakeConed(config, session)
+            coned.daemon = daemon
+            coned.polled = []
+            return coned
+
+        daemon = Daemon(
+            [make_config()],
+            coned=make_coned,
+            launch=launch,
+            interval=0.02,
+            lag=0,
+            max_jitter=0,
+            recycle_after=3,
+            retention=None,
+        )
+
+        async def run():
+            task = asyncio.ensure_future(daemon.run())
+            while daemon.polls < 7:
+                await asyncio.sleep(0.01)
+            daemon.stop()
+            await task
+
+        asyncio.run(run())
+        self.assertEqual(daemon.failures, 1)
+        self.assertEqual(daemon.restarts, 1)
+        self.assertEqual(len(browsers), 2)
+        self.assertTrue(all(b.closed for b in browsers))
+
+        # one page before the crash, one after, and one more after recycling
+        self.assertEqual([len(c.polled) for c in FakeConed.instances], [2, 3, 1])
+        self.assertEqual(len(daemon.stores["acct-1"].to_list()), 6)
+
+    def test_prune(self):
+        bl = BucketList()
+        start = datetime(2021, 8, 29, tzinfo=tz)
+        for day in range(5):
+            t = start + timedelta(days=day)
+            bl.insert(Reading(t, t + timedelta(minutes=15), "wh", 1))
+        bl.prune(start + timedelta(days=3, hours=12))
+        self.assertEqual(bl._keys, ["2021-09-01", "2021-09-02"])
+        self.assertEqual(len(bl.to_list()), 2)
+
+        # before is taken in the readings' offset, where 02:00 UTC on
+        # September 2nd is still September 1st
+        bl.prune(datetime(2021, 9, 2, 2, tzinfo=timezone.utc))
+        self.assertEqual(bl._keys, ["2021-09-01", "2021-09-02"])
@@ -0,0 +1,127 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+import gzip
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+import unittest
+
+from coned_rtu import Direct, Reading
+
+from .coned_test import make_config
+
+tz = timezone(timedelta(hours=-4))
+
+USAGE = json.dumps(
+    {
+        "unit": "KWH",
+        "reads": [
+            {
+                "startTime": "2021-08-29T00:30:00.000-04:00",
+                "endTime": "2021-08-29T00:45:00.000-04:00",
+                "value": 0.1105,
+            },
+            {
+                "startTime": "2021-08-29T00:45:00.000-04:00",
+                "endTime": "2021-08-29T01:00:00.000-04:00",
+                "value": None,
+            },
+        ],
+    }
+).encode()
+
+
+class StubOpower(BaseHTTPRequestHandler):
+    """Serves gzipped usage to requests carrying the right token and cookie."""
+
+    protocol_version = "HTTP/1.1"
+    token = "good-token"
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def do_GET(self):
+        self.server.paths.append(self.path)
+        authorized = self.headers.get("Authorization") == f"Bearer {self.token}"
+        if not authorized or "sid=abc" not in self.headers.get("Cookie", ""):
+            self.send_response(401)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        body = gzip.compress(USAGE)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeBrowser:
+    def __init__(self):
+        self.token = "stale-token"
+        self.logins = 0
+
+    async def login(self):
+        self.logins += 1
+
+    async def authorize_opower(self):
+        self.token = StubOpower.token
+
+    async def auth_credentials(self):
+        return {
+            "cookies": [{"name": "sid", "value": "abc", "domain": "", "path": "/"}],
+            "token": self.token,
+        }
+
+    async def save_screenshot(self, filename):
+        pass
+
+
+class TestDirect(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubOpower)
+        self.server.connections = 0
+        self.server.paths = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        self.browser = FakeBrowser()
+        self.direct = Direct(make_config(), self.browser)
+        self.direct.opower_url = "http://127.0.0.1:%d" % self.server.server_port
+
+    def tearDown(self):
+        self.direct.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_fetches_over_one_connection(self):
+        want = [
+            Reading(
+                datetime(2021, 8, 29, 0, 30, 0, tzinfo=tz),
+                datetime(2021, 8, 29, 0, 45, 0, tzinfo=tz),
+                "kwh",
+                0.1105,
+            )
+        ]
+
+        async def run():
+            await self.direct.login()
+            since = datetime(2021, 8, 29, tzinfo=tz)
+            got = [await self.direct.get_usage(since) for _ in range(3)]
+            raw = await self.direct.fetch_usage()
+            return got, raw
+
+        got, raw = asyncio.run(run())
+        self.assertEqual(got, [want] * 3)
+        self.assertEqual(raw, USAGE)
+        self.assertEqual(self.browser.logins, 1)
+
+        # the stale token is refreshed once, then the connection is reused
+        self.assertEqual(len(self.server.paths), 5)
+        self.assertEqual(self.server.connections, 1)
+        self.assertIn("startDate=2021-08-29T00", self.server.paths[0])
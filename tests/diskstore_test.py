@@ -0,0 +1,229 @@
+from datetime import datetime, timedelta, timezone
+import os
+import tempfile
+import unittest
+import zlib
+
+import numpy as np
+
+from coned_rtu import (
+    BucketList,
+    DiskStore,
+    InsertResult,
+    OverlappingReadingError,
+    Reading,
+    ReadingSeries,
+)
+from coned_rtu.diskstore import RECORD, _crcs
+
+tz = timezone(timedelta(hours=-4))
+
+
+class TestDiskStore(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = self._tmp.name
+        self.sometime = datetime(2021, 8, 29, 0, 0, 0, tzinfo=tz)
+        self.quarter = timedelta(minutes=15)
+        self.readings = [
+            Reading(
+                self.sometime + i * self.quarter,
+                self.sometime + (i + 1) * self.quarter,
+                "wh",
+                i,
+            )
+            for i in range(96 * 3)
+        ]
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_persists_across_instances(self):
+        store = DiskStore(self.root)
+        got = store.insert_many(self.readings[:150])
+        self.assertEqual(got, InsertResult(inserted=150))
+
+        store = DiskStore(self.root)
+        got = store.insert_many(self.readings[100:])
+        self.assertEqual(got, InsertResult(inserted=138, deduplicated=50))
+        self.assertEqual(store.to_list(), self.readings)
+        self.assertEqual(sorted(os.listdir(self.root))[0], "2021-08-29.log")
+
+        with self.assertRaises(OverlappingReadingError):
+            store.insert(
+                Reading(self.sometime, self.sometime + self.quarter, "wh", 1000)
+            )
+
+    def test_range_and_compaction(self):
+        store = DiskStore(self.root)
+        store.insert_many(self.readings[::2])
+        store.compact()
+        store.insert_many(self.readings[1::2])
+
+        start = self.sometime + timedelta(hours=20)
+        end = start + timedelta(hours=10)
+        want = self.readings[80:120]
+        self.assertEqual(list(store.range(start, end)), want)
+
+        store.compact()
+        self.assertEqual(
+            sorted(os.listdir(self.root)),
+            ["2021-08-29.dat", "2021-08-30.dat", "2021-08-31.dat", "changes-0.journal"],
+        )
+        self.assertEqual(list(DiskStore(self.root).range(start, end)), want)
+        self.assertEqual(store.to_list(), self.readings)
+
+    def test_overlap_across_midnight(self):
+        store = DiskStore(self.root)
+        store.insert_many(self.readings[:96])
+        midnight = self.sometime + timedelta(days=1)
+        spanning = Reading(midnight - self.quarter, midnight + self.quarter, "wh", 1)
+        with self.assertRaises(OverlappingReadingError):
+            store.insert(spanning)
+
+    def test_insert_series(self):
+        readings = self.readings
+        stored = readings[50:100]
+        batch = readings[80:150] + readings[:60] + [readings[10]] + readings[200:]
+        # overlaps a stored reading, and a reading that spans midnight
+        batch.append(
+            Reading(
+                readings[99].start_time + timedelta(minutes=5),
+                readings[100].end_time,
+                "wh",
+                1,
+            )
+        )
+        batch.append(Reading(readings[190].start_time, readings[193].end_time, "wh", 1))
+
+        expected = BucketList()
+        expected.insert_many(stored)
+        want = expected.insert_many(batch)
+
+        store = DiskStore(self.root)
+        store.insert_many(stored)
+        store.missing_ranges(self.sometime, self.sometime)
+        got = store.insert_series(ReadingSeries.from_readings(batch))
+        self.assertEqual(got, want)
+        self.assertEqual(got.rejected, 1)
+        self.assertEqual(store.to_list(), expected.to_list())
+        self.assertEqual(
+            [c.new for c in store.changes_since(50)],
+            [c.new for c in expected.changes_since(50)],
+        )
+        end = readings[-1].end_time
+        self.assertEqual(
+            store.missing_ranges(self.sometime, end),
+            expected.missing_ranges(self.sometime, end),
+        )
+
+        # the journal and logs survive a restart, and a repeat is all copies
+        store = DiskStore(self.root)
+        self.assertEqual(store.to_list(), expected.to_list())
+        got = store.insert_series(ReadingSeries.from_readings(batch))
+        self.assertEqual(got.inserted, 0)
+
+    def test_torn_append_is_truncated(self):
+        store = DiskStore(self.root)
+        store.insert_many(self.readings[:10])
+        path = os.path.join(self.root, "2021-08-29.log")
+
+        # half of a record, then a full record with a bad checksum
+        with open(path, "ab") as f:
+            f.write(b"\x01" * (RECORD.itemsize // 2))
+        store = DiskStore(self.root)
+        self.assertEqual(os.path.getsize(path), 10 * RECORD.itemsize)
+
+        with open(path, "ab") as f:
+            f.write(b"\x01" * RECORD.itemsize)
+        store = DiskStore(self.root)
+        self.assertEqual(store.to_list(), self.readings[:10])
+
+        records = np.fromfile(path, dtype=RECORD)
+        payload = RECORD.itemsize - 4
+        want = [zlib.crc32(rec.tobytes()[:payload]) for rec in records]
+        self.assertEqual(_crcs(records).tolist(), want)
+
+    def test_upsert(self):
+        store = DiskStore(self.root)
+        store.insert_many(self.readings[:10])
+        old = self.readings[3]
+        fixed = Reading(old.start_time, old.end_time, "wh", 1234)
+        self.assertEqual(store.upsert(fixed), old)
+        self.assertIsNone(store.upsert(fixed))
+        self.assertEqual(len(store.revisions), 1)
+
+        want = self.readings[:3] + [fixed] + self.readings[4:10]
+        self.assertEqual(store.to_list(), want)
+        store = DiskStore(self.root)
+        self.assertEqual(store.to_list(), want)
+
+        # revisions keep their numbers across restarts, and new ones follow
+        revision = store.revisions[0]
+        self.assertEqual((revision.seq, revision.old, revision.new), (11, old, fixed))
+        refixed = Reading(old.start_time, old.end_time, "wh", 4321)
+        self.assertEqual(store.upsert(refixed), fixed)
+        self.assertEqual([r.seq for r in DiskStore(self.root).revisions], [11, 12])
+
+        want[3] = refixed
+        store.compact()
+        self.assertEqual(DiskStore(self.root).to_list(), want)
+
+        # correcting a reading and then restoring it in one batch journals
+        # nothing, like BucketList
+        store = DiskStore(self.root)
+        seq = store.seq
+        got = store.insert_many([fixed, refixed], upsert=True)
+        self.assertEqual(got, InsertResult())
+        self.assertEqual(DiskStore(self.root).seq, seq)
+
+    def test_upsert_in_another_offset(self):
+        # the last quarter of a day in EST, reported again in EDT, which puts
+        # it in the next day's bucket
+        est = timezone(timedelta(hours=-5))
+        edt = timezone(timedelta(hours=-4))
+        start = datetime(2021, 3, 13, 23, 0, tzinfo=est)
+        readings = [
+            Reading(start + i * self.quarter, start + (i + 1) * self.quarter, "wh", 1)
+            for i in range(4)
+        ]
+        old = readings[1]
+        fixed = Reading(
+            old.start_time.astimezone(edt), old.end_time.astimezone(edt), "wh", 2
+        )
+        refixed = Reading(fixed.start_time, fixed.end_time, "wh", 3)
+
+        store = DiskStore(self.root)
+        store.insert_many(readings)
+        self.assertEqual(store.upsert(fixed), old)
+        got = store.insert_many([refixed], upsert=True)
+        self.assertEqual(got, InsertResult(replaced=1))
+
+        want = [readings[0], refixed] + readings[2:]
+        self.assertEqual(store.to_list(), want)
+        store = DiskStore(self.root)
+        self.assertEqual(store.to_list(), want)
+        self.assertEqual(
+            [(r.old, r.new) for r in store.revisions], [(old, fixed), (fixed, refixed)]
+        )
+
+    def test_change_journal(self):
+        store = DiskStore(self.root)
+        store.insert_many(self.readings[10:20])
+        store.insert_many(self.readings[:10])
+        self.assertEqual(store.seq, 20)
+
+        # sequence numbers survive a restart and follow insertion order
+        store = DiskStore(self.root)
+        self.assertEqual(store.seq, 20)
+        changes = list(store.changes_since(15))
+        self.assertEqual([c.seq for c in changes], list(range(16, 21)))
+        self.assertEqual([c.new for c in changes], self.readings[5:10])
+
+        store.discard_changes(15)
+        self.assertEqual(os.listdir(self.root).count("changes-15.journal"), 1)
+        store = DiskStore(self.root)
+        self.assertEqual([c.seq for c in store.changes_since(0)], list(range(16, 21)))
+        store.insert_many(self.readings[20:21])
+        self.assertEqual(store.seq, 21)
+        self.assertEqual(list(store.changes_since(20))[0].new, self.readings[20])
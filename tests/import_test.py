@@ -0,0 +1,32 @@
+import subprocess
+import sys
+import unittest
+
+import coned_rtu
+
+BROWSER_AND_CONFIG = ("selenium", "pyppeteer", "pydantic", "configobj", "dateutil")
+
+
+class TestImport(unittest.TestCase):
+    def test_data_path_skips_browsers(self):
+        code = (
+            "import sys\n"
+            "from coned_rtu import BucketList, DiskStore, Reading, ReadingSeries\n"
+            "from coned_rtu import parse_series, resample\n"
+            f"print(' '.join(m for m in {BROWSER_AND_CONFIG!r} if m in sys.modules))\n"
+        )
+        out = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, check=True
+        )
+        self.assertEqual(out.stdout.strip(), "")
+
+    def test_exports_resolve(self):
+        from coned_rtu.store import BucketList
+
+        self.assertIs(coned_rtu.BucketList, BucketList)
+        self.assertIn("Pyppeteer", dir(coned_rtu))
+        for name in coned_rtu.__all__:
+            if name not in ("Pyppeteer", "Selenium", "LoginFailedException"):
+                self.assertTrue(hasattr(coned_rtu, name), name)
+        with self.assertRaises(AttributeError):
+            coned_rtu.NoSuchThing
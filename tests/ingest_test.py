@@ -0,0 +1,92 @@
+from datetime import datetime, timedelta, timezone
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from coned_rtu import BucketList, DiskStore, InsertResult, backfill_files, parse_series
+from coned_rtu.codec import decode
+from coned_rtu.ingest import _groups, parse_partitions
+
+tz = timezone(timedelta(hours=-4))
+quarter = timedelta(minutes=15)
+
+
+def payload(reads):
+    body = ", ".join(
+        f'{{"startTime": "{s.isoformat()}", "endTime": "{e.isoformat()}", "value": {v}}}'
+        for s, e, v in reads
+    )
+    return ('{"unit": "KWH", "reads": [' + body + "]}").encode()
+
+
+class TestIngest(unittest.TestCase):
+    def setUp(self):
+        start = datetime(2021, 8, 29, 12, 0, tzinfo=tz)
+        self.reads = [
+            (start + i * quarter, start + (i + 1) * quarter, 0.1 * (i % 5))
+            for i in range(300)
+        ]
+
+    def test_parse_partitions(self):
+        parts = parse_partitions(payload(self.reads))
+        self.assertEqual(list(parts), ["2021-08-09"])
+        self.assertEqual(
+            decode(parts["2021-08-09"]).to_readings()[0].start_time, self.reads[0][0]
+        )
+
+        with mock.patch("coned_rtu.ingest.PARTITION_DAYS", 1):
+            parts = parse_partitions(payload(self.reads[::-1]))
+        self.assertEqual(
+            list(parts), ["2021-08-29", "2021-08-30", "2021-08-31", "2021-09-01"]
+        )
+        self.assertEqual(parse_partitions(b'{"unit": "KWH", "reads": []}'), {})
+
+    def test_matches_insert_many(self):
+        # overlapping windows, with a revised read that overlaps a stored one
+        late = self.reads[150]
+        shift = timedelta(minutes=5)
+        sources = [
+            payload(self.reads[:120]),
+            payload(self.reads[100:220]),
+            payload(self.reads[200:] + [(late[0] + shift, late[1] + shift, 1.0)]),
+        ]
+
+        expected = BucketList()
+        want = InsertResult()
+        for source in sources:
+            r = expected.insert_many(parse_series(source).to_readings())
+            want.inserted += r.inserted
+            want.deduplicated += r.deduplicated
+            want.rejected += r.rejected
+
+        store = BucketList()
+        result = backfill_files(store, sources, workers=2)
+        self.assertEqual(store.to_list(), expected.to_list())
+        self.assertEqual(result, want)
+        self.assertEqual(
+            result, InsertResult(inserted=300, deduplicated=40, rejected=1)
+        )
+
+    def test_paths_and_disk_store(self):
+        with tempfile.TemporaryDirectory() as root:
+            paths = []
+            for i, lo in enumerate(range(0, 300, 100)):
+                hi = lo + 100
+                path = os.path.join(root, f"usage-{i}.json")
+                with open(path, "wb") as f:
+                    f.write(payload(self.reads[lo:hi]))
+                paths.append(path)
+
+            store = DiskStore(os.path.join(root, "store"))
+            result = backfill_files(store, reversed(paths), workers=2)
+            self.assertEqual(result, InsertResult(inserted=300))
+            self.assertEqual(len(store.to_list()), 300)
+            # a second backfill finds everything already stored
+            again = backfill_files(store, paths, workers=2)
+            self.assertEqual(again, InsertResult(deduplicated=300))
+
+    def test_groups(self):
+        self.assertEqual(_groups(list(range(5)), 2), [[0, 1, 2], [3, 4]])
+        self.assertEqual(_groups(list(range(2)), 8), [[0], [1]])
+        self.assertEqual(_groups([], 4), [])
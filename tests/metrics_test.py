@@ -0,0 +1,114 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+import os
+import unittest
+import urllib.request
+
+from coned_rtu import METRICS, BucketList, Metrics, Reading, instrumented
+from coned_rtu.metrics import rss_bytes
+from coned_rtu.timing import StepTimer
+
+from .coned_test import FakeConed, make_config
+
+tz = timezone(timedelta(hours=-4))
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        METRICS.reset()
+        METRICS.enable()
+        self.addCleanup(METRICS.disable)
+        self.addCleanup(METRICS.reset)
+
+        sometime = datetime(2021, 8, 29, tzinfo=tz)
+        quarter = timedelta(minutes=15)
+        self.readings = [
+            Reading(sometime + i * quarter, sometime + (i + 1) * quarter, "wh", i)
+            for i in range(10)
+        ]
+
+    def test_disabled_records_nothing(self):
+        METRICS.disable()
+        BucketList().insert_many(self.readings)
+        with StepTimer().step("login.form"):
+            pass
+        self.assertEqual(METRICS.render(), "\n")
+        self.assertEqual(METRICS.trace_events(), [])
+
+    def test_instrumented(self):
+        @instrumented("work", kind="test")
+        def work(fail):
+            if fail:
+                raise ValueError
+
+        work(False)
+        with self.assertRaises(ValueError):
+            work(True)
+
+        histogram = METRICS.histogram("call_seconds", op="work", kind="test")
+        self.assertEqual(histogram.count, 2)
+        self.assertEqual(METRICS.value("call_errors_total", op="work", kind="test"), 1)
+        self.assertEqual([e["ok"] for e in METRICS.trace_events()], [True, False])
+
+    def test_sync_records_backend_calls_and_counts(self):
+        store = BucketList()
+        store.insert_many(self.readings[:4])
+        coned = FakeConed(make_config(), self.readings[2:])
+        asyncio.run(coned.sync(store, self.readings[-1].end_time))
+
+        self.assertEqual(
+            METRICS.histogram(
+                "call_seconds", op="coned.get_usage", backend="FakeConed"
+            ).count,
+            1,
+        )
+        self.assertEqual(METRICS.value("readings_total", result="inserted"), 6)
+        self.assertEqual(METRICS.value("readings_total", result="deduplicated"), 2)
+        self.assertEqual(
+            METRICS.histogram("step_seconds", step="store.insert").count, 1
+        )
+        ops = [e["op"] for e in METRICS.trace_events()]
+        self.assertEqual(
+            ops, ["store.insert_many", "coned.get_usage", "store.insert_many"]
+        )
+
+    def test_render(self):
+        metrics = Metrics(buckets=(0.1, 1.0))
+        metrics.inc("polls_total", result="ok")
+        metrics.set("browser_rss_bytes", 1024)
+        metrics.observe("step_seconds", 0.5, step='say "hi"')
+        self.assertEqual(
+            metrics.render().splitlines(),
+            [
+                "# TYPE coned_rtu_polls_total counter",
+                'coned_rtu_polls_total{result="ok"} 1',
+                "# TYPE coned_rtu_browser_rss_bytes gauge",
+                "coned_rtu_browser_rss_bytes 1024",
+                "# TYPE coned_rtu_step_seconds histogram",
+                'coned_rtu_step_seconds_bucket{step="say \\"hi\\"",le="0.1"} 0',
+                'coned_rtu_step_seconds_bucket{step="say \\"hi\\"",le="1.0"} 1',
+                'coned_rtu_step_seconds_bucket{step="say \\"hi\\"",le="+Inf"} 1',
+                'coned_rtu_step_seconds_sum{step="say \\"hi\\""} 0.5',
+                'coned_rtu_step_seconds_count{step="say \\"hi\\""} 1',
+            ],
+        )
+
+    def test_endpoint(self):
+        BucketList().insert_many(self.readings)
+        server = METRICS.serve(0)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        url = f"http://127.0.0.1:{server.server_port}"
+        with urllib.request.urlopen(url + "/metrics") as resp:
+            body = resp.read().decode()
+        self.assertIn(
+            'coned_rtu_call_seconds_count{op="store.insert_many",store="BucketList"} 1',
+            body,
+        )
+        with urllib.request.urlopen(url + "/trace") as resp:
+            self.assertIn(b"store.insert_many", resp.read())
+
+    @unittest.skipUnless(os.path.exists("/proc/self/statm"), "needs /proc")
+    def test_rss_bytes(self):
+        self.assertGreater(rss_bytes(os.getpid()), 0)
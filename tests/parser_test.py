@@ -0,0 +1,102 @@
+from datetime import datetime, timedelta, timezone
+import io
+import json
+import unittest
+
+from coned_rtu import (
+    Reading,
+    UsageParseError,
+    iter_readings,
+    json_to_readings,
+    parse_series,
+)
+from coned_rtu.parser import parse_time, parse_times
+
+tz = timezone(timedelta(hours=-4))
+
+USAGE = json.dumps(
+    {
+        "reads": [
+            {
+                "startTime": "2021-08-29T00:30:00.000-04:00",
+                "endTime": "2021-08-29T00:45:00.000-04:00",
+                "value": 0.1105,
+            },
+            {
+                "startTime": "2021-08-29T00:45:00.000-04:00",
+                "endTime": "2021-08-29T01:00:00.000-04:00",
+                "value": 0.1215,
+            },
+            {
+                "startTime": "2021-08-29T01:00:00.000-04:00",
+                "endTime": "2021-08-29T01:15:00.000-04:00",
+                "value": None,
+            },
+        ],
+        "unit": "KWH",
+    },
+    indent=2,
+).encode()
+
+
+class TestParser(unittest.TestCase):
+    def setUp(self):
+        self.want = [
+            Reading(
+                datetime(2021, 8, 29, 0, 30, 0, tzinfo=tz),
+                datetime(2021, 8, 29, 0, 45, 0, tzinfo=tz),
+                "kwh",
+                0.1105,
+            ),
+            Reading(
+                datetime(2021, 8, 29, 0, 45, 0, tzinfo=tz),
+                datetime(2021, 8, 29, 1, 0, 0, tzinfo=tz),
+                "kwh",
+                0.1215,
+            ),
+        ]
+
+    def test_matches_json_to_readings(self):
+        self.assertEqual(list(iter_readings(USAGE)), json_to_readings(USAGE))
+        self.assertEqual(list(parse_series(USAGE)), json_to_readings(USAGE))
+
+    def test_unit_after_reads_and_tiny_chunks(self):
+        # one byte at a time, with the unit only arriving at the very end
+        got = list(iter_readings(io.BytesIO(USAGE), chunk_size=1))
+        self.assertEqual(got, self.want)
+
+        got = parse_series(io.BytesIO(USAGE), chunk_size=7)
+        self.assertEqual(list(got), self.want)
+
+    def test_iterable_of_chunks(self):
+        stream = io.BytesIO(USAGE)
+        chunks = iter(lambda: stream.read(10), b"")
+        self.assertEqual(list(iter_readings(chunks)), self.want)
+
+    def test_fallback_timestamps(self):
+        self.assertEqual(
+            parse_time("2021-08-29T00:30:00.000-04:00"), (1630211400, -14400)
+        )
+        # not Opower's layout, parsed by dateutil
+        self.assertEqual(parse_time("2021-08-29T04:30:00.5Z"), (1630211400, 0))
+
+        epochs, offsets = parse_times(
+            ["2021-08-29T00:30:00-04:00", "2021-08-29T04:30:00+00:00"]
+        )
+        self.assertEqual(epochs.tolist(), [1630211400, 1630211400])
+        self.assertEqual(offsets.tolist(), [-14400, 0])
+
+        epochs, offsets = parse_times(["2021-08-29T00:30-04:00", "2021-08-29T04:30Z"])
+        self.assertEqual(epochs.tolist(), [1630211400, 1630211400])
+
+    def test_errors(self):
+        with self.assertRaises(UsageParseError):
+            list(iter_readings(USAGE[:-20]))
+
+        with self.assertRaises(UsageParseError):
+            parse_series(
+                b'{"reads": [{"startTime": "2021-08-29T00:30:00Z", '
+                b'"endTime": "2021-08-29T00:45:00Z", "value": 1}]}'
+            )
+
+        self.assertEqual(len(parse_series(b'{"unit": "WH", "reads": []}')), 0)
@@ -0,0 +1,35 @@
+import unittest
+
+from coned_rtu import RequestPolicy
+
+
+class TestRequestPolicy(unittest.TestCase):
+    def test_allows(self):
+        policy = RequestPolicy()
+        self.assertTrue(policy.allows("https://www.coned.com/en/login", "document"))
+        self.assertTrue(policy.allows("https://cned.opower.com/ei/edge/apis/x", "xhr"))
+        self.assertTrue(policy.allows("data:image/png;base64,AAAA", "image"))
+
+        # third parties and unneeded resource types are blocked
+        self.assertFalse(
+            policy.allows("https://www.google-analytics.com/a.js", "script")
+        )
+        self.assertFalse(policy.allows("https://notconed.com/", "document"))
+        self.assertFalse(policy.allows("https://www.coned.com/logo.png", "image"))
+        self.assertFalse(policy.allows("https://www.coned.com/font.woff2", "font"))
+
+    def test_check_counts(self):
+        policy = RequestPolicy(allowed_hosts=["example.com"], blocked_types=[])
+        policy.check("https://example.com/a.png", "image")
+        policy.check("https://cdn.example.net/a.js", "script")
+        self.assertEqual((policy.allowed, policy.blocked), (1, 1))
+
+    def test_chrome_args(self):
+        args = RequestPolicy(allowed_hosts=["coned.com"]).chrome_args()
+        self.assertEqual(
+            args,
+            [
+                "--host-resolver-rules=MAP * ~NOTFOUND, EXCLUDE coned.com, EXCLUDE *.coned.com",
+                "--blink-settings=imagesEnabled=false",
+            ],
+        )
@@ -0,0 +1,206 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+import unittest
+
+import pyppeteer.errors
+
+from coned_rtu import BucketList, Pyppeteer, Reading
+from coned_rtu.coned import CONED_USAGE_URL
+from coned_rtu.pyppeteer import FETCH_USAGE_JS, LoginFailedException
+
+from .coned_test import make_config
+from .direct_test import USAGE
+
+tz = timezone(timedelta(hours=-4))
+
+
+class FakeResponse:
+    def __init__(self, url, body=b""):
+        self.url = url
+        self.ok = True
+        self.body = body
+
+    async def buffer(self):
+        return self.body
+
+
+class FakePage:
+    """Loads the dashboard by answering the widget's Opower usage request."""
+
+    def __init__(self, usage_url):
+        self.usage_url = usage_url
+        self.waiters = []
+        self.visited = []
+        self.fetched = []
+        self.url = "about:blank"
+
+    async def goto(self, url, options=None):
+        self.visited.append(url)
+        self.url = url
+        if url == CONED_USAGE_URL:
+            response = FakeResponse(self.usage_url, USAGE)
+            for predicate, fut in self.waiters:
+                if predicate(response) and not fut.done():
+                    fut.set_result(response)
+        return FakeResponse(url)
+
+    async def waitForResponse(self, predicate, options):
+        fut = asyncio.get_running_loop().create_future()
+        self.waiters.append((predicate, fut))
+        return await fut
+
+    async def waitForSelector(self, selector, options):
+        raise pyppeteer.errors.TimeoutError
+
+    async def querySelector(self, selector):
+        return object()
+
+    async def evaluate(self, js, *args):
+        if js == FETCH_USAGE_JS:
+            self.fetched.append(args[0])
+        return USAGE.decode()
+
+    async def screenshot(self, path):
+        pass
+
+
+class FakeClient:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, method, params=None):
+        self.sent.append(method)
+        return {"identifier": "1"}
+
+
+class ExpiredPage(FakePage):
+    """Rejects the saved session's usage request."""
+
+    def __init__(self, usage_url):
+        super().__init__(usage_url)
+        self._client = FakeClient()
+        self.cookies = []
+
+    async def setCookie(self, *cookies):
+        self.cookies.extend(cookies)
+
+    async def goto(self, url, options=None):
+        response = await super().goto(url, options)
+        response.ok = False
+        return response
+
+    async def evaluate(self, js, *args):
+        if js == "() => window.localStorage.clear()":
+            self.fetched.append("cleared")
+        return await super().evaluate(js, *args)
+
+
+class NoMfaPage(ExpiredPage):
+    """Shows the login form but never the MFA prompt."""
+
+    async def waitForSelector(self, selector, options):
+        if selector == "#form-login-email":
+            return object()
+        return await super().waitForSelector(selector, options)
+
+    async def type(self, selector, text):
+        pass
+
+    async def click(self, selector):
+        pass
+
+
+class FakeSession:
+    def __init__(self):
+        self.expired = 0
+        self.saved = []
+
+    def load(self):
+        return {"cookies": [{"name": "a", "value": "b"}], "local_storage": {"x": {}}}
+
+    def record_expired(self):
+        self.expired += 1
+
+    def save(self, state):
+        self.saved.append(state)
+
+
+class TestPyppeteer(unittest.TestCase):
+    def setUp(self):
+        self.want = [
+            Reading(
+                datetime(2021, 8, 29, 0, 30, 0, tzinfo=tz),
+                datetime(2021, 8, 29, 0, 45, 0, tzinfo=tz),
+                "kwh",
+                0.1105,
+            )
+        ]
+
+    def run_mode(self, mode, since=None, until=None, want=None):
+        coned = Pyppeteer(make_config(), usage_mode=mode)
+        coned.page = FakePage(coned.opower_usage_url)
+        got = asyncio.run(coned.get_usage(since, until))
+        self.assertEqual(got, self.want if want is None else want)
+        return coned.page
+
+    def test_intercept_needs_no_extra_request(self):
+        page = self.run_mode("intercept")
+        self.assertEqual(page.visited, [CONED_USAGE_URL])
+        self.assertEqual(page.fetched, [])
+
+    def test_fetch_from_page(self):
+        page = self.run_mode("fetch")
+        self.assertEqual(page.visited, [CONED_USAGE_URL])
+        self.assertEqual(len(page.fetched), 1)
+
+        # a window starting before the widget's can't come from it, so it is
+        # fetched
+        page = self.run_mode("intercept", since=datetime(2021, 8, 29, tzinfo=tz))
+        self.assertIn("startDate=", page.fetched[0])
+
+    def test_intercept_limits_to_window(self):
+        since = datetime(2021, 8, 29, 0, 30, tzinfo=tz)
+        page = self.run_mode("intercept", since, since + timedelta(minutes=5))
+        self.assertEqual(page.fetched, [])
+        page = self.run_mode("intercept", since, since, want=[])
+        self.assertEqual(page.fetched, [])
+
+    def test_sync_intercepts(self):
+        coned = Pyppeteer(make_config(), usage_mode="intercept")
+        coned.page = FakePage(coned.opower_usage_url)
+        store = BucketList()
+        result = asyncio.run(coned.sync(store))
+        self.assertEqual(result.inserted, 1)
+        self.assertEqual(coned.page.fetched, [])
+        self.assertEqual(list(store), self.want)
+
+    def test_navigate(self):
+        page = self.run_mode("navigate")
+        self.assertEqual(len(page.visited), 2)
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            Pyppeteer(make_config(), usage_mode="teleport")
+
+    def test_expired_session_is_cleared(self):
+        coned = Pyppeteer(make_config(), session=FakeSession())
+        coned.page = ExpiredPage(coned.opower_usage_url)
+        self.assertFalse(asyncio.run(coned.restore_session()))
+        self.assertEqual(coned.session.expired, 1)
+        self.assertEqual(
+            coned.page._client.sent,
+            [
+                "Page.addScriptToEvaluateOnNewDocument",
+                "Page.removeScriptToEvaluateOnNewDocument",
+                "Network.clearBrowserCookies",
+            ],
+        )
+        self.assertEqual(coned.page.fetched, ["cleared"])
+        self.assertEqual(coned._local_storage, {})
+
+    def test_missing_mfa_prompt_fails_login(self):
+        coned = Pyppeteer(make_config(), session=FakeSession())
+        coned.page = NoMfaPage(coned.opower_usage_url)
+        with self.assertRaises(LoginFailedException):
+            asyncio.run(coned.login())
+        self.assertEqual(coned.session.saved, [])
@@ -18,6 +18,15 @@ class TestReading(unittest.TestCase):
         with self.assertRaises(ValueError):
             Reading(self.later, self.sometime, "wh", 1)
 
+    def test_times_must_be_aware_whole_seconds(self):
+        # naive times would depend on the host's timezone
+        with self.assertRaises(ValueError):
+            Reading(self.sometime.replace(tzinfo=None), self.later, "wh", 1)
+
+        # epoch bounds are whole seconds, so fractions would be truncated
+        with self.assertRaises(ValueError):
+            Reading(self.sometime, self.later.replace(microsecond=500), "wh", 1)
+
     def test_enforces_units(self):
         # only wh or kwh supported
         with self.assertRaises(ValueError):
@@ -107,3 +116,23 @@ class TestReading(unittest.TestCase):
         # equal
         b = Reading(self.sometime, self.later, "wh", 1)
         self.assertEqual(hash(a), hash(b))
+
+    def test_epoch_bounds(self):
+        r = Reading(self.sometime, self.later, "kwh", 1)
+        self.assertEqual(r.start, int(self.sometime.timestamp()))
+        self.assertEqual(r.end, r.start + 86400)
+        self.assertEqual(r.wh, 1000)
+
+        # the same interval in another timezone
+        eastern = timezone(timedelta(hours=-5))
+        other = Reading(
+            self.sometime.astimezone(eastern),
+            self.later.astimezone(eastern),
+            "wh",
+            1000,
+        )
+        self.assertEqual(r, other)
+        self.assertEqual(hash(r), hash(other))
+        self.assertEqual(r.hash_bucket(), "2010-12-25")
+        self.assertEqual(other.hash_bucket(), "2010-12-25")
+        self.assertEqual(hash(r), hash(r))
@@ -0,0 +1,91 @@
+from datetime import datetime, timedelta, timezone
+import tempfile
+import unittest
+
+from coned_rtu import BucketList, DiskStore, Reading, RollupCache, resample
+
+tz = timezone(timedelta(hours=-4))
+quarter = timedelta(minutes=15)
+
+
+def quarters(start, n, wh=100):
+    return [
+        Reading(start + i * quarter, start + (i + 1) * quarter, "wh", wh)
+        for i in range(n)
+    ]
+
+
+class TestRollupCache(unittest.TestCase):
+    def setUp(self):
+        self.start = datetime(2021, 8, 30, tzinfo=tz)
+        # Aug 30 through Sep 1, with 10 AM on Aug 31 not yet reported
+        self.readings = quarters(self.start, 96 * 3)
+        self.missing = self.readings[96 + 40]
+        self.store = BucketList()
+        self.store.insert_many(r for r in self.readings if r is not self.missing)
+        self.rollups = RollupCache(self.store)
+
+    def test_daily_and_monthly(self):
+        days = self.rollups.daily("2021-08")
+        self.assertEqual([d.start.day for d in days], [30, 31])
+        self.assertEqual([d.count for d in days], [96, 95])
+        self.assertEqual(days[0].total, 9600)
+        self.assertEqual(days[0].peak, 400)
+
+        month = self.rollups.monthly("2021-08")
+        self.assertEqual(month.start, datetime(2021, 8, 1, tzinfo=tz))
+        self.assertEqual(month.end, datetime(2021, 9, 1, tzinfo=tz))
+        self.assertEqual(month.total, 19100)
+        self.assertIsNone(self.rollups.monthly("2021-07"))
+
+    def test_hourly_matches_resample(self):
+        key = "2021-08-30"
+        self.assertEqual(
+            self.rollups.hourly(key), resample(self.store.get_bucket(key), "hour")
+        )
+        self.assertEqual(self.rollups.hourly("2020-01-01"), [])
+        self.assertNotIn("2020-01-01", self.store.bucket_keys())
+
+    def test_updates_on_insert(self):
+        self.rollups.daily("2021-08")
+        hour = self.rollups.hourly("2021-08-31")[10]
+        self.assertEqual(hour.count, 3)
+
+        # Opower fills in the interval it had reported as null
+        self.store.insert(self.missing)
+        self.assertEqual(self.rollups.day("2021-08-31").total, 9600)
+        self.assertEqual(self.rollups.hourly("2021-08-31")[10].count, 4)
+        self.assertEqual(self.rollups.stats()["misses"], 2)
+
+    def test_prune_invalidates(self):
+        self.rollups.daily("2021-08")
+        self.store.prune(datetime(2021, 8, 31, tzinfo=tz))
+        self.assertIsNone(self.rollups.day("2021-08-30"))
+        self.assertEqual(len(self.rollups.daily("2021-08")), 1)
+
+    def test_lru_eviction(self):
+        rollups = RollupCache(self.store, max_days=2)
+        rollups.day("2021-08-30")
+        rollups.day("2021-08-31")
+        rollups.day("2021-08-30")
+        rollups.day("2021-09-01")
+        self.assertEqual(list(rollups._days), ["2021-08-30", "2021-09-01"])
+
+    def test_disk_store(self):
+        with tempfile.TemporaryDirectory() as root:
+            store = DiskStore(root)
+            rollups = RollupCache(store)
+            store.insert_many(self.readings[:96])
+            self.assertEqual(rollups.day("2021-08-30").total, 9600)
+            store.insert_many(self.readings[96:])
+            self.assertEqual(rollups.monthly("2021-08").total, 19200)
+
+    def test_revision_invalidates_day(self):
+        self.rollups.daily("2021-08")
+        old = self.readings[10]
+        self.store.upsert(Reading(old.start_time, old.end_time, "wh", 300))
+        self.assertEqual(self.rollups.day("2021-08-30").total, 9800)
+        self.assertEqual(self.rollups.day("2021-08-30").peak, 1200)
+        # the other day is still cached
+        self.assertEqual(self.rollups.day("2021-08-31").total, 9500)
+        self.assertEqual(self.rollups.stats()["misses"], 3)
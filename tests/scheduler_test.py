@@ -0,0 +1,105 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+import unittest
+
+from configobj import ConfigObj
+
+from coned_rtu import BrowserPool, Config, Reading, Scheduler
+from coned_rtu.timing import StepTimer
+
+tz = timezone(timedelta(hours=-4))
+
+
+class FakeContext:
+    def __init__(self, browser):
+        self.browser = browser
+        browser.open += 1
+        browser.peak = max(browser.peak, browser.open)
+
+    async def newPage(self):
+        return object()
+
+    async def close(self):
+        self.browser.open -= 1
+
+
+class FakeBrowser:
+    def __init__(self):
+        self.open = 0
+        self.peak = 0
+        self.closed = False
+
+    async def createIncognitoBrowserContext(self):
+        return FakeContext(self)
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeConed:
+    def __init__(self, config, session):
+        self.cfg = config
+        self.timer = StepTimer()
+
+    async def __ainit__(self, context):
+        self.page = await context.newPage()
+
+    async def login(self):
+        if self.cfg.account_id == "bad":
+            raise RuntimeError("login failed")
+        await asyncio.sleep(0.01)
+
+    async def sync(self, store, upsert=False):
+        start = datetime(2021, 8, 29, tzinfo=tz) + timedelta(minutes=self.cfg.meter)
+        return store.insert_many(
+            [Reading(start, start + timedelta(minutes=15), "wh", 1)], upsert=upsert
+        )
+
+
+CONFIG = """
+CONED_USER = user
+CONED_PASS = pass
+CONED_TOTP = JBSWY3DPEHPK3PXP
+CONED_MAID = maid
+[home]
+OPOWER_ACCOUNT_ID = a
+OPOWER_METER = 1
+[shop]
+OPOWER_ACCOUNT_ID = b
+OPOWER_METER = 2
+CONED_USER = other
+"""
+
+
+class TestScheduler(unittest.TestCase):
+    def test_configs_from_sections(self):
+        configs = Config.all_from_config_obj(ConfigObj(CONFIG.splitlines()))
+        self.assertEqual([c.account_id for c in configs], ["a", "b"])
+        self.assertEqual([c.user for c in configs], ["user", "other"])
+        self.assertEqual(configs[1].meter, 2)
+
+    def test_run_once(self):
+        configs = Config.all_from_config_obj(ConfigObj(CONFIG.splitlines()))
+        for i in range(6):
+            configs.append(configs[0].copy(update={"meter": 10 + i}))
+        configs.append(configs[0].copy(update={"account_id": "bad"}))
+        browser = FakeBrowser()
+
+        async def launch():
+            return browser
+
+        async def run():
+            pool = BrowserPool(size=3, launch=launch)
+            scheduler = Scheduler(configs, pool, coned=FakeConed)
+            results = await scheduler.run_once()
+            await pool.close()
+            return scheduler, results
+
+        scheduler, results = asyncio.run(run())
+        self.assertEqual(len(results), 9)
+        self.assertIsInstance(results.pop("bad-1"), RuntimeError)
+        self.assertTrue(all(r.inserted == 1 for r in results.values()))
+        self.assertEqual(len(scheduler.stores["a-1"].to_list()), 1)
+        self.assertEqual(browser.peak, 3)
+        self.assertEqual(browser.open, 0)
+        self.assertTrue(browser.closed)
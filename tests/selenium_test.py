@@ -0,0 +1,111 @@
+import asyncio
+import time
+import unittest
+
+from coned_rtu import BucketList, Selenium
+from coned_rtu.coned import Coned
+
+from .coned_test import make_config
+from .direct_test import USAGE
+
+
+class FakeElement:
+    def __init__(self, text=""):
+        self.text = text
+        self.clicked = False
+
+    def is_displayed(self):
+        return True
+
+    def is_enabled(self):
+        return True
+
+    def click(self):
+        self.clicked = True
+
+
+class FakeDriver:
+    """Renders the dashboard at once and shows Opower's JSON in a <pre>."""
+
+    def __init__(self):
+        self.visited = []
+        self.screenshots = []
+
+    def get(self, url):
+        self.visited.append(url)
+
+    def find_element(self, by, value):
+        return FakeElement()
+
+    def execute_script(self, script):
+        return object()
+
+    def find_element_by_tag_name(self, name):
+        return FakeElement(USAGE.decode())
+
+    def set_window_size(self, width, height):
+        pass
+
+    def save_screenshot(self, path):
+        self.screenshots.append(path)
+
+
+class SlowDriver(FakeDriver):
+    """Takes a while to navigate, like a real page load."""
+
+    def get(self, url):
+        time.sleep(0.1)
+        super().get(url)
+
+
+class BrokenDriver(FakeDriver):
+    def find_element_by_tag_name(self, name):
+        raise RuntimeError("no usage")
+
+
+def make_selenium():
+    # skip __init__, which launches Chrome
+    coned = Selenium.__new__(Selenium)
+    Coned.__init__(coned, make_config())
+    coned.driver = FakeDriver()
+    return coned
+
+
+class TestSelenium(unittest.TestCase):
+    def test_sync(self):
+        coned = make_selenium()
+        store = BucketList()
+        result = asyncio.run(coned.sync(store))
+        self.assertEqual(result.inserted, len(store))
+        self.assertGreater(len(store), 0)
+        self.assertEqual(coned.driver.visited[0], coned.dashboard_url)
+        self.assertTrue(coned.driver.visited[1].startswith(coned.opower_url))
+        self.assertIn("usage.parse", coned.timer.as_dict())
+
+    def test_failure_screenshot(self):
+        coned = make_selenium()
+        coned.driver = BrokenDriver()
+        with self.assertRaises(RuntimeError):
+            asyncio.run(coned.get_usage())
+        self.assertEqual(len(coned.driver.screenshots), 1)
+        self.assertTrue(coned.driver.screenshots[0].startswith("screenshots/error-"))
+
+    def test_navigation_does_not_block_the_loop(self):
+        coned = make_selenium()
+        coned.driver = SlowDriver()
+        ticks = []
+
+        async def tick():
+            while True:
+                ticks.append(time.perf_counter())
+                await asyncio.sleep(0.01)
+
+        async def run():
+            ticker = asyncio.ensure_future(tick())
+            try:
+                return await coned.get_usage()
+            finally:
+                ticker.cancel()
+
+        self.assertGreater(len(asyncio.run(run())), 0)
+        self.assertGreater(len(ticks), 10)
@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta, timezone
+import unittest
+
+import numpy as np
+
+from coned_rtu import Reading, ReadingSeries
+
+tz = timezone(timedelta(hours=-4))
+
+
+class TestReadingSeries(unittest.TestCase):
+    def setUp(self):
+        self.sometime = datetime(2021, 8, 29, 0, 30, 0, tzinfo=tz)
+        self.quarter = timedelta(minutes=15)
+        self.readings = [
+            Reading(
+                self.sometime + i * self.quarter,
+                self.sometime + (i + 1) * self.quarter,
+                "wh",
+                100 + i,
+            )
+            for i in range(4)
+        ]
+
+    def test_start_time_must_be_before_end_time(self):
+        with self.assertRaises(ValueError):
+            ReadingSeries([0, 10], [10, 10], [1, 1])
+
+    def test_enforces_units(self):
+        with self.assertRaises(ValueError):
+            ReadingSeries([0], [10], [1], unit="mwh")
+
+        series = ReadingSeries([0], [10], [0.1105], unit="KWh")
+        self.assertAlmostEqual(series.wh[0], 110.5)
+
+    def test_round_trip(self):
+        series = ReadingSeries.from_readings(self.readings)
+        self.assertEqual(len(series), 4)
+        self.assertEqual(list(series), self.readings)
+        self.assertEqual(series.to_readings(), self.readings)
+
+        # rows keep the offset they were reported in
+        self.assertEqual(series[0].start_time.utcoffset(), timedelta(hours=-4))
+        self.assertEqual(series[0].hash_bucket(), "2021-08-29")
+
+    def test_views_compare_with_readings(self):
+        series = ReadingSeries.from_readings(self.readings)
+        self.assertEqual(series[-1], self.readings[-1])
+        self.assertEqual(self.readings[-1], series[-1])
+        self.assertEqual(hash(series[1]), hash(self.readings[1]))
+        self.assertEqual(series[1].start, self.readings[1].start)
+        self.assertTrue(series[0].overlaps(self.readings[0]))
+        with self.assertRaises(IndexError):
+            series[4]
+        with self.assertRaises(AttributeError):
+            series[0].__dict__
+
+    def test_slicing_does_not_copy(self):
+        series = ReadingSeries.from_readings(self.readings)
+        tail = series[1:3]
+        self.assertEqual(list(tail), self.readings[1:3])
+        self.assertTrue(np.shares_memory(tail.wh, series.wh))
+        self.assertTrue(np.shares_memory(tail.start, series.start))
+
+    def test_concat(self):
+        series = ReadingSeries.from_readings(self.readings)
+        got = ReadingSeries.concat([series[:1], series[2:]])
+        self.assertEqual(list(got), [self.readings[0]] + self.readings[2:])
+        self.assertEqual(len(ReadingSeries.concat([])), 0)
@@ -0,0 +1,56 @@
+import os
+import tempfile
+import unittest
+
+from cryptography.fernet import Fernet
+
+from coned_rtu import SessionCache
+from coned_rtu.session import derive_key
+
+
+class TestSessionCache(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._tmp.name, "session")
+        self.key = Fernet.generate_key()
+        self.state = {
+            "cookies": [{"name": "sid", "value": "abc", "domain": ".coned.com"}],
+            "local_storage": {"https://www.coned.com": {"token": "xyz"}},
+        }
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_round_trip(self):
+        cache = SessionCache(self.path, self.key)
+        self.assertIsNone(cache.load())
+        cache.save(self.state)
+
+        # encrypted at rest and private to the user
+        with open(self.path, "rb") as f:
+            self.assertNotIn(b"sid", f.read())
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o600)
+
+        self.assertEqual(cache.load(), self.state)
+        cache.record_hit()
+        self.assertEqual(cache.stats()["hits"], 1)
+        self.assertEqual(cache.stats()["misses"], 1)
+
+    def test_wrong_key_or_stale_is_a_miss(self):
+        SessionCache(self.path, self.key).save(self.state)
+
+        cache = SessionCache(self.path, derive_key("someone else"))
+        self.assertIsNone(cache.load())
+
+        cache = SessionCache(self.path, self.key, max_age=-1)
+        self.assertIsNone(cache.load())
+        self.assertEqual(cache.misses, 1)
+
+    def test_expired(self):
+        cache = SessionCache(self.path, self.key)
+        cache.save(self.state)
+        cache.record_expired()
+        self.assertFalse(os.path.exists(self.path))
+        self.assertEqual(
+            cache.stats(), {"hits": 0, "misses": 1, "expired": 1, "saved_at": None}
+        )
@@ -0,0 +1,214 @@
+from datetime import datetime, timedelta, timezone
+import gzip
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import io
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from coned_rtu import (
+    BucketList,
+    CsvSink,
+    DiskStore,
+    LineProtocolSink,
+    ParquetSink,
+    Reading,
+    Watermark,
+    export,
+)
+from coned_rtu.sinks import pa
+
+tz = timezone(timedelta(hours=-4))
+
+
+class StubWriteApi(BaseHTTPRequestHandler):
+    """Accepts gzipped line protocol writes and keeps the lines."""
+
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.requests.append((self.path, gzip.decompress(body).decode()))
+        self.send_response(204)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class TestExport(unittest.TestCase):
+    def setUp(self):
+        self.sometime = datetime(2021, 8, 29, 0, 0, 0, tzinfo=tz)
+        self.quarter = timedelta(minutes=15)
+        self.readings = [
+            Reading(
+                self.sometime + i * self.quarter,
+                self.sometime + (i + 1) * self.quarter,
+                "wh",
+                i + 0.5,
+            )
+            for i in range(10)
+        ]
+        self.store = BucketList()
+        self.store.insert_many(self.readings[:6])
+
+    def test_csv_with_watermark(self):
+        out = io.StringIO()
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, "watermark")
+            self.assertEqual(
+                export(self.store, CsvSink(out), Watermark(path), batch_size=4), 6
+            )
+
+            # a new run picks up where the last left off
+            self.store.insert_many(self.readings)
+            watermark = Watermark(path)
+            self.assertEqual(watermark.seq, 6)
+            self.assertEqual(
+                export(self.store, CsvSink(out, header=False), watermark), 4
+            )
+            self.assertEqual(
+                export(self.store, CsvSink(out, header=False), watermark), 0
+            )
+
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 11)
+        self.assertEqual(lines[0], "start_time,end_time,wh")
+        self.assertEqual(
+            lines[1], "2021-08-29T00:00:00-04:00,2021-08-29T00:15:00-04:00,0.5"
+        )
+
+    def test_revisions_are_exported_again(self):
+        out = io.StringIO()
+        watermark = Watermark()
+        export(self.store, CsvSink(out), watermark)
+
+        # corrections to exported readings are written once more, in order
+        old = self.readings[1]
+        self.store.upsert(Reading(old.start_time, old.end_time, "wh", 7))
+        self.store.upsert(Reading(old.start_time, old.end_time, "wh", 8))
+        self.store.insert_many(self.readings)
+        self.assertEqual(export(self.store, CsvSink(out, header=False), watermark), 6)
+        self.assertEqual(watermark.seq, 12)
+        self.assertEqual(export(self.store, CsvSink(out, header=False), watermark), 0)
+
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 13)
+        self.assertEqual(
+            lines[8], "2021-08-29T00:15:00-04:00,2021-08-29T00:30:00-04:00,8.0"
+        )
+
+    def test_gap_filled_after_export(self):
+        store = BucketList()
+        store.insert_many(self.readings[:3] + self.readings[6:])
+        out = io.StringIO()
+        watermark = Watermark()
+        self.assertEqual(export(store, CsvSink(out), watermark), 7)
+
+        # readings older than ones already exported are still new to the sink
+        store.insert_many(self.readings[3:6])
+        self.assertEqual(export(store, CsvSink(out, header=False), watermark), 3)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(
+            lines[-3], "2021-08-29T00:45:00-04:00,2021-08-29T01:00:00-04:00,3.5"
+        )
+
+    def test_disk_store_source(self):
+        with tempfile.TemporaryDirectory() as root:
+            store = DiskStore(root)
+            store.insert_many(self.readings[:3] + self.readings[6:])
+            out = io.StringIO()
+            watermark = Watermark(os.path.join(root, "watermark"))
+            self.assertEqual(export(store, CsvSink(out), watermark, batch_size=3), 7)
+            self.assertEqual(len(out.getvalue().splitlines()), 8)
+
+            # filling a gap after a restart exports just the gap
+            DiskStore(root).insert_many(self.readings)
+            store = DiskStore(root)
+            watermark = Watermark(watermark.path)
+            self.assertEqual(export(store, CsvSink(out), watermark), 3)
+            self.assertEqual(export(store, CsvSink(out), watermark), 0)
+            self.assertEqual(export(store, CsvSink(io.StringIO())), 10)
+
+    def test_disk_store_exports_columns(self):
+        class Batches:
+            def __init__(self, watermark=None):
+                self.watermark = watermark
+                self.batches = []
+
+            def write(self, batch):
+                seq = None if self.watermark is None else self.watermark.seq
+                self.batches.append((len(batch), batch.wh.tolist(), seq))
+
+        with tempfile.TemporaryDirectory() as root:
+            disk = DiskStore(root)
+            disk.insert_many(self.readings)
+            memory = BucketList()
+            memory.insert_many(self.readings)
+
+            # batches cross bucket and journal chunk boundaries the same
+            # way, and no Readings are built from the DiskStore
+            chunk = mock.patch("coned_rtu.diskstore._JOURNAL_CHUNK", 4)
+            no_buckets = mock.patch.object(
+                DiskStore, "get_bucket", side_effect=AssertionError
+            )
+            no_changes = mock.patch.object(
+                DiskStore, "changes_since", side_effect=AssertionError
+            )
+            with chunk, no_buckets, no_changes:
+                for batch_size in (3, 4, 20):
+                    sinks = [Batches(), Batches()]
+                    for store, sink in zip((disk, memory), sinks):
+                        export(store, sink, batch_size=batch_size)
+                    self.assertEqual(sinks[0].batches, sinks[1].batches)
+
+                    watermarks = [Watermark(), Watermark()]
+                    sinks = [Batches(w) for w in watermarks]
+                    for store, sink, watermark in zip(
+                        (disk, memory), sinks, watermarks
+                    ):
+                        export(store, sink, watermark, batch_size=batch_size)
+                    self.assertEqual(sinks[0].batches, sinks[1].batches)
+                    self.assertEqual(watermarks[0].seq, 10)
+
+    def test_line_protocol(self):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), StubWriteApi)
+        server.requests = []
+        server.connections = 0
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        url = f"http://127.0.0.1:{server.server_port}/api/v2/write"
+        sink = LineProtocolSink(url, tags={"meter": "acct 1"})
+        self.addCleanup(sink.close)
+        self.assertEqual(export(self.store, sink, batch_size=2), 6)
+
+        self.assertEqual(len(server.requests), 3)
+        self.assertEqual(server.connections, 1)
+        path, body = server.requests[0]
+        self.assertEqual(path, "/api/v2/write?precision=s")
+        start = int(self.sometime.timestamp())
+        self.assertEqual(
+            body.splitlines()[0], f"energy,meter=acct\\ 1 wh=0.5,seconds=900i {start}"
+        )
+
+    @unittest.skipIf(pa is None, "pyarrow is not installed")
+    def test_parquet(self):
+        import pyarrow.parquet as pq
+
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, "readings.parquet")
+            sink = ParquetSink(path)
+            export(self.store, sink, batch_size=4)
+            sink.close()
+            table = pq.read_table(path)
+            self.assertEqual(table.num_rows, 6)
+            self.assertEqual(table.column("wh").to_pylist()[0], 0.5)
@@ -1,7 +1,13 @@
 from datetime import datetime, timedelta, timezone
 import unittest
 
-from coned_rtu import Reading, BucketList, OverlappingReadingError
+from coned_rtu import (
+    Reading,
+    BucketList,
+    InsertResult,
+    OverlappingReadingError,
+    ReadingSeries,
+)
 
 
 class TestStore(unittest.TestCase):
@@ -50,3 +56,293 @@ class TestStore(unittest.TestCase):
         _ = bl.get_bucket(day)
         self.assertEqual(len(bl._dict), 1)
         self.assertEqual(list(bl._dict.keys())[0], day)
+
+    def test_insert_out_of_order(self):
+        bl = BucketList()
+        readings = [
+            Reading(
+                self.sometime + i * self.hour,
+                self.sometime + (i + 1) * self.hour,
+                "wh",
+                i,
+            )
+            for i in range(30)
+        ]
+        for r in reversed(readings):
+            bl.insert(r)
+        for r in readings[::3]:
+            bl.insert(r)
+        self.assertEqual(bl.to_list(), readings)
+        self.assertEqual(bl._keys, sorted(bl._keys))
+
+    def test_overlap_across_midnight(self):
+        bl = BucketList()
+        midnight = datetime(2010, 12, 26, tzinfo=timezone.utc)
+        quarter = timedelta(minutes=15)
+
+        # spans midnight, so it lands in the bucket of the previous day
+        spanning = Reading(midnight - quarter, midnight + quarter, "wh", 1)
+        bl.insert(spanning)
+
+        with self.assertRaises(OverlappingReadingError):
+            bl.insert(Reading(midnight, midnight + quarter, "wh", 1))
+
+        # the same check works from the other side
+        bl = BucketList()
+        bl.insert(Reading(midnight, midnight + quarter, "wh", 1))
+        with self.assertRaises(OverlappingReadingError):
+            bl.insert(spanning)
+
+        # adjacent readings in different buckets are fine
+        before = Reading(midnight - quarter, midnight, "wh", 1)
+        bl.insert(before)
+        self.assertEqual(len(bl.to_list()), 2)
+
+    def test_insert_many(self):
+        quarter = timedelta(minutes=15)
+        readings = [
+            Reading(
+                self.sometime + i * quarter, self.sometime + (i + 1) * quarter, "wh", i
+            )
+            for i in range(200)
+        ]
+
+        bl = BucketList()
+        for r in readings[50:100]:
+            bl.insert(r)
+
+        # an overlapping fetch window, shuffled, with a duplicate and two
+        # readings that overlap stored or earlier ones
+        batch = readings[80:150] + readings[:60] + [readings[10]]
+        batch.append(Reading(readings[120].start_time, readings[121].end_time, "wh", 1))
+        batch.append(
+            Reading(
+                readings[99].start_time + timedelta(minutes=5),
+                readings[100].end_time,
+                "wh",
+                1,
+            )
+        )
+
+        got = bl.insert_many(batch)
+        self.assertEqual(got, InsertResult(inserted=100, deduplicated=31, rejected=2))
+        self.assertEqual(bl.to_list(), readings[:150])
+
+        other = BucketList()
+        other.insert_many(readings[140:])
+        got = bl.merge(other)
+        self.assertEqual(got, InsertResult(inserted=50, deduplicated=10, rejected=0))
+        self.assertEqual(bl.to_list(), readings)
+
+        # inserting one at a time agrees with the bulk result
+        for r in readings[::7]:
+            bl.insert(r)
+        self.assertEqual(bl.to_list(), readings)
+
+    def test_insert_series(self):
+        quarter = timedelta(minutes=15)
+        readings = [
+            Reading(
+                self.sometime + i * quarter, self.sometime + (i + 1) * quarter, "wh", i
+            )
+            for i in range(300)
+        ]
+        batch = readings[80:150] + readings[:60] + [readings[10]] + readings[200:]
+        batch.append(
+            Reading(
+                readings[99].start_time + timedelta(minutes=5),
+                readings[100].end_time,
+                "wh",
+                1,
+            )
+        )
+
+        stores = [BucketList(), BucketList()]
+        events = [[], []]
+        for store, seen in zip(stores, events):
+            store.insert_many(readings[50:100])
+            store.subscribe(lambda key, added, seen=seen: seen.append((key, added)))
+        want = stores[0].insert_many(batch)
+        got = stores[1].insert_series(ReadingSeries.from_readings(batch))
+        self.assertEqual(got, want)
+        self.assertEqual(got, InsertResult(inserted=200, deduplicated=31, rejected=1))
+        self.assertEqual(stores[1].to_list(), stores[0].to_list())
+        self.assertEqual(len(stores[1]), len(stores[0]))
+        self.assertEqual(
+            [c.new for c in stores[1].changes_since(50)],
+            readings[:50] + readings[100:150] + readings[200:],
+        )
+        end = self.sometime + 300 * quarter
+        self.assertEqual(
+            stores[1].missing_ranges(self.sometime, end),
+            stores[0].missing_ranges(self.sometime, end),
+        )
+        self.assertEqual(
+            [r for _, added in events[1] for r in added],
+            [r for _, added in events[0] for r in added],
+        )
+
+    def test_iteration_and_range(self):
+        quarter = timedelta(minutes=15)
+        readings = [
+            Reading(
+                self.sometime + i * quarter, self.sometime + (i + 1) * quarter, "wh", i
+            )
+            for i in range(300)
+        ]
+        bl = BucketList()
+        self.assertEqual(len(bl), 0)
+        self.assertIsNone(bl.latest())
+        bl.insert_many(readings[100:])
+        for r in readings[:100]:
+            bl.insert(r)
+
+        self.assertEqual(len(bl), 300)
+        self.assertEqual(list(bl), readings)
+        self.assertEqual(list(reversed(bl)), readings[::-1])
+        self.assertEqual(bl.latest(), readings[-1])
+
+        window = bl.range(readings[10].start_time, readings[250].start_time)
+        self.assertEqual(next(window), readings[10])
+        self.assertEqual(list(window), readings[11:250])
+        self.assertEqual(list(bl.range(self.later, self.later)), [])
+        self.assertEqual(
+            list(bl.range(self.sometime - self.day, readings[-1].end_time)), readings
+        )
+
+        bl.prune(self.later)
+        self.assertEqual(len(bl), len(list(bl)))
+
+    def test_change_log(self):
+        bl = BucketList()
+        t1 = self.sometime
+        readings = [
+            Reading(t1 + i * self.hour, t1 + (i + 1) * self.hour, "wh", 1)
+            for i in range(72)
+        ]
+        bl.insert_many(readings[24:])
+        bl.insert(readings[0])
+        fixed = Reading(readings[30].start_time, readings[30].end_time, "wh", 5)
+        bl.upsert(fixed)
+        self.assertEqual(bl.seq, 50)
+
+        # changes come back in the order they were stored, however old
+        changes = bl.changes_since(47)
+        self.assertEqual([c.seq for c in changes], [48, 49, 50])
+        self.assertEqual([c.new for c in changes], [readings[71], readings[0], fixed])
+        self.assertEqual([c.old for c in changes], [None, None, readings[30]])
+
+        # pruning drops the changes of pruned readings, keeping the numbers
+        bl.prune(t1 + self.day)
+        self.assertEqual(bl.seq, 50)
+        self.assertEqual([c.seq for c in bl.changes_since(47)], [48, 50])
+
+        bl.discard_changes(48)
+        self.assertEqual([c.seq for c in bl.changes_since(0)], [50])
+        bl.insert(Reading(t1 + 72 * self.hour, t1 + 73 * self.hour, "wh", 1))
+        self.assertEqual(bl.seq, 51)
+
+    def test_upsert(self):
+        bl = BucketList()
+        t1 = self.sometime
+        readings = [
+            Reading(t1 + i * self.hour, t1 + (i + 1) * self.hour, "wh", 1)
+            for i in range(3)
+        ]
+        bl.insert_many(readings)
+        events = []
+        bl.subscribe(lambda key, added: events.append((key, added)))
+
+        # a correction replaces the stored reading in place
+        fixed = Reading(readings[1].start_time, readings[1].end_time, "wh", 5)
+        self.assertIs(bl.upsert(fixed), readings[1])
+        self.assertEqual(bl.to_list(), [readings[0], fixed, readings[2]])
+        self.assertEqual(events, [(fixed.hash_bucket(), None)])
+        revision = bl.revisions_since(0)[0]
+        self.assertEqual(
+            (revision.seq, revision.old, revision.new), (4, readings[1], fixed)
+        )
+
+        # an identical reading changes nothing; new ones are inserted
+        self.assertIsNone(bl.upsert(fixed))
+        later = Reading(t1 + 3 * self.hour, t1 + 4 * self.hour, "wh", 1)
+        self.assertIsNone(bl.upsert(later))
+        self.assertEqual(len(bl), 4)
+        self.assertEqual(len(bl.revisions), 1)
+
+        # a different interval that overlaps is still an error
+        with self.assertRaises(OverlappingReadingError):
+            bl.upsert(Reading(t1, t1 + 2 * self.hour, "wh", 2))
+
+    def test_insert_many_upsert(self):
+        bl = BucketList()
+        t1 = self.sometime
+        readings = [
+            Reading(t1 + i * self.hour, t1 + (i + 1) * self.hour, "wh", 1)
+            for i in range(3)
+        ]
+        bl.insert_many(readings)
+
+        fixed = Reading(readings[0].start_time, readings[0].end_time, "wh", 2)
+        self.assertEqual(bl.insert_many([fixed]), InsertResult(rejected=1))
+        self.assertEqual(bl.to_list(), readings)
+
+        # the last value for an interval wins, within a batch too, and only
+        # replacing a reading stored before the batch counts
+        new = Reading(t1 + 3 * self.hour, t1 + 4 * self.hour, "wh", 1)
+        newer = Reading(new.start_time, new.end_time, "wh", 3)
+        got = bl.insert_many([fixed, readings[1], new, newer], upsert=True)
+        self.assertEqual(got, InsertResult(inserted=1, deduplicated=1, replaced=1))
+        self.assertEqual(bl.to_list(), [fixed, readings[1], readings[2], newer])
+        # changes are numbered in bucket order, as DiskStore journals them
+        self.assertEqual(
+            [(r.seq, r.old, r.new) for r in bl.revisions], [(4, readings[0], fixed)]
+        )
+        self.assertEqual([c.new for c in bl.changes_since(3)], [fixed, newer])
+        self.assertEqual(bl.revisions_since(5), [])
+
+        fixed_again = Reading(fixed.start_time, fixed.end_time, "wh", 4)
+        fixed_last = Reading(fixed.start_time, fixed.end_time, "wh", 6)
+        got = bl.insert_many([fixed_again, fixed_last], upsert=True)
+        self.assertEqual(got, InsertResult(replaced=1))
+        self.assertEqual(
+            [(r.old, r.new) for r in bl.revisions_since(5)], [(fixed, fixed_last)]
+        )
+
+        # correcting a reading and then restoring it in one batch is no change
+        seq = bl.seq
+        fixed_back = Reading(fixed.start_time, fixed.end_time, "wh", 6)
+        got = bl.insert_many([fixed_again, fixed_back], upsert=True)
+        self.assertEqual(got, InsertResult())
+        self.assertEqual(bl.seq, seq)
+        self.assertEqual(bl.to_list()[0], fixed_last)
+
+    def test_upsert_in_another_offset(self):
+        # the last quarter of a day in EST, reported again in EDT, which puts
+        # it in the next day's bucket
+        est = timezone(timedelta(hours=-5))
+        edt = timezone(timedelta(hours=-4))
+        quarter = timedelta(minutes=15)
+        start = datetime(2021, 3, 13, 23, 0, tzinfo=est)
+        readings = [
+            Reading(start + i * quarter, start + (i + 1) * quarter, "wh", 1)
+            for i in range(4)
+        ]
+        old = readings[1]
+        fixed = Reading(
+            old.start_time.astimezone(edt), old.end_time.astimezone(edt), "wh", 2
+        )
+        self.assertNotEqual(fixed.hash_bucket(), old.hash_bucket())
+
+        bl = BucketList()
+        bl.insert_many(readings)
+        self.assertIs(bl.upsert(fixed), old)
+        self.assertEqual(len(bl), 4)
+        self.assertEqual(bl.to_list(), [readings[0], fixed] + readings[2:])
+
+        bl = BucketList()
+        bl.insert_many(readings)
+        got = bl.insert_many([fixed, readings[2]], upsert=True)
+        self.assertEqual(got, InsertResult(deduplicated=1, replaced=1))
+        self.assertEqual(bl.to_list(), [readings[0], fixed] + readings[2:])
+        self.assertEqual([(r.old, r.new) for r in bl.revisions], [(old, fixed)])
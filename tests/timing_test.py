@@ -0,0 +1,42 @@
+import asyncio
+import unittest
+
+import pyppeteer.errors
+
+from coned_rtu.pyppeteer import ElementNotFound, fetch_element
+from coned_rtu.timing import StepTimer
+
+
+class FakePage:
+    def __init__(self, elements):
+        self.elements = elements
+        self.waits = []
+
+    async def waitForSelector(self, selector, options):
+        self.waits.append((selector, options["timeout"]))
+        if selector not in self.elements:
+            raise pyppeteer.errors.TimeoutError
+        return self.elements[selector]
+
+
+class TestTiming(unittest.TestCase):
+    def test_step_timer(self):
+        timer = StepTimer()
+        for _ in range(2):
+            with timer.step("login"):
+                pass
+        with self.assertRaises(RuntimeError):
+            with timer.step("usage.fetch"):
+                raise RuntimeError
+
+        self.assertEqual(timer.counts(), {"login": 2, "usage.fetch": 1})
+        self.assertEqual(sorted(timer.as_dict()), ["login", "usage.fetch"])
+        timer.reset()
+        self.assertEqual(timer.as_dict(), {})
+
+    def test_fetch_element_times_out(self):
+        page = FakePage({"#found": "element"})
+        self.assertEqual(asyncio.run(fetch_element(page, "#found")), "element")
+        with self.assertRaises(ElementNotFound):
+            asyncio.run(fetch_element(page, "#missing", timeout=10))
+        self.assertEqual(page.waits[-1], ("#missing", 10))